@@ -1,34 +1,52 @@
 import os
+import re
+import glob
 from dotenv import load_dotenv
 import json
 import logging
+import math
+import queue
 import sys
+import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import TYPE_CHECKING, List, Dict, Any, Iterator, Callable, Optional
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.chains import LLMChain, ConversationChain
-from langchain.agents import AgentExecutor, create_structured_chat_agent
+# langchain_openai、langchain agents/chains、HuggingFace、Chroma、pandas、年报下载与解析、选股策略等
+# 较重的依赖在首次使用时才导入，import 本模块（以及 streamlit 启动、测试收集）不再为其付出导入时间，
+# 启动耗时见 benchmarks/bench_startup.py
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import SystemMessage
-from langchain.tools import Tool
-from langchain_community.docstore.wikipedia import Wikipedia
-from langchain_huggingface  import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain.memory import ConversationBufferMemory
-from langchain_community.chat_message_histories import StreamlitChatMessageHistory
-from langchain.callbacks.streamlit import StreamlitCallbackHandler
-import pandas as pd
+from langchain_core.tools import Tool
+from langchain_core.chat_history import InMemoryChatMessageHistory
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
 # 添加项目根目录到Python路径
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.insert(0, root_dir)
 
-from reports.download_reports import ensure_stock_reports
-from reports.pdf_parser import process_pdf
-from analyze.strategies_buffett import analyze_stock, screen_stocks
+from LLM.llm_cache import ResponseCache
+from LLM.section_router import SectionRouter, load_section_records, find_section_json
+from LLM.section_chunker import SectionChunker, chunk_stats
+from LLM.section_diff import diff_sections
+from LLM.token_utils import build_token_counter, truncate_to_tokens
+from LLM.usage_tracker import UsageTracker, TIER_TAG_PREFIX
+from LLM.model_tiers import ModelTiers, TIERS
+from LLM.intent_classifier import IntentClassifier
+from LLM.report_store import ReportStore, parse_report_filename
+from LLM.checkpoint_store import CheckpointStore, file_digest
+from LLM.chat_stream import StreamEventHandler
+from LLM.chat_store import SQLiteChatMessageHistory
+from LLM.tool_cache import ToolResultCache, DEFAULT_TOOL_TTLS, parse_ttl_spec, is_error_result
+from LLM.answer_cache import SemanticAnswerCache, is_context_dependent
+from LLM.prefetcher import ReportPrefetcher, resolve_stock_mentions
+from LLM.profile_store import (ProfileStore, build_profile_source, profile_from_report, format_profile,
+                               has_profile_details)
+from LLM.year_records import (parse_year_record, fallback_year_record, format_year_record,
+                              merge_pairwise, MAX_ITEMS_PER_FIELD, MAX_ITEM_CHARS)
 
 # 加载 .env 文件中的环境变量
 load_dotenv()
@@ -36,79 +54,199 @@ load_dotenv()
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# 提示词模板版本，修改 setup_agents / chat 中的提示词后需同步更新，使旧的LLM缓存失效
+PROMPT_TEMPLATE_VERSION = "1"
+
 class ReportAnalyzer:
-    def __init__(self, txt_dir: str, results_dir: str, message_history=None, callback_handler=None):
+    def __init__(self, txt_dir: str, results_dir: str, message_history=None, callback_handler=None,
+                 use_llm_cache: bool = True, json_dir: str = None):
         """
         初始化分析器
         :param txt_dir: 存放年报txt文件的目录
         :param results_dir: 存放分析结果的目录
+        :param json_dir: 存放 pdf_parser 章节JSON的目录，用于章节路由，默认 reports/json_reports
         :param message_history: Streamlit消息历史记录对象
         :param callback_handler: Streamlit回调处理器
+        :param use_llm_cache: 是否启用LLM响应缓存（环境变量 LLM_CACHE_BYPASS=1 时强制跳过）
         """
         self.txt_dir = txt_dir
         self.results_dir = results_dir
-        self.vector_store = None
+        self.json_dir = json_dir or os.path.join(root_dir, 'reports', 'json_reports')
+        self.report_store = None
         self.message_history = message_history
         self.callback_handler = callback_handler
-        
-        # 初始化对话记忆
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            chat_memory=message_history if message_history else None,
-            return_messages=True
+        self.llm_cache = self._init_llm_cache() if use_llm_cache else None
+        # 模型档位：意图回退、逐块分析等高频步骤使用 fast 模型，多年对比与最终建议使用 heavy 模型
+        self.model_tiers = ModelTiers.from_env()
+        self.usage_tracker = UsageTracker(prices=self.model_tiers.prices)
+        self.checkpoints = CheckpointStore(os.path.join(results_dir, 'checkpoints'))
+        # 公司与行业资料库：wiki_search 优先查询，外部来源可通过 PROFILE_SOURCE=offline:路径 切换为本地JSON
+        self.profile_store = ProfileStore(
+            os.path.join(results_dir, 'profiles.sqlite'),
+            max_age_days=float(os.getenv("PROFILE_MAX_AGE_DAYS", "30"))
         )
-        
-        # 初始化LLM
-        self.llm = ChatOpenAI(
-            openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-            openai_api_base=os.getenv("OPENROUTER_BASE_URL"),
-            model="deepseek/deepseek-chat-v3-0324:free",
-            default_headers={
-                "HTTP-Referer": os.getenv("YOUR_SITE_URL"),
-                "X-Title": os.getenv("YOUR_SITE_NAME"),
-                "OpenRouter-Provider": "chutes/fp8"
-            },
-            temperature=0,
-            streaming=True  # 启用流式输出
+        self.profile_source = build_profile_source(os.getenv("PROFILE_SOURCE", "live"))
+        # 工具结果缓存：各工具的有效期可通过 TOOL_CACHE_TTLS 覆盖，如 "wiki_search=86400,stock_screening=0"
+        self.tool_cache = ToolResultCache(
+            ttls={**DEFAULT_TOOL_TTLS, **parse_ttl_spec(os.getenv("TOOL_CACHE_TTLS", ""))}
         )
+        # 对话回答的语义缓存：同一公司/年份下相似的问题直接返回已有回答，入库新年报时失效
+        self.answer_cache = None if os.getenv("ANSWER_CACHE_BYPASS") == "1" else SemanticAnswerCache(
+            os.path.join(results_dir, 'answer_cache.sqlite'),
+            embed_fn=lambda text: self.report_store.cache.embed_query(text, self.embeddings.embed_query),
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92")),
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+        )
+        # 对话中提到公司时后台预取：已入库的公司预热向量分片，未入库的下载并入库；PREFETCH=0 关闭
+        self.prefetcher = None if os.getenv("PREFETCH") == "0" else ReportPrefetcher(
+            is_ready=lambda code: bool(self.report_store.index.get(code, {}).get('years')),
+            ingest=self.ingest_company_reports,
+            warm=lambda code: self.report_store.get_collection(code),
+            wait_timeout=float(os.getenv("PREFETCH_WAIT_SECONDS", "30"))
+        )
+        self._chat_turn = 0
         
-        # 初始化文本分割器
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=4000,  # 增加chunk大小以获取更多上下文
-            chunk_overlap=400,
-            length_function=len,
-            separators=["\n\n", "\n", "。", "！", "？", ".", "!", "?"]  # 优化中文分割
+        # 初始化各档位的LLM，两档模型相同时共用一个实例
+        llms_by_model = {}
+        self.llms = {}
+        for tier in TIERS:
+            model = self.model_tiers.models[tier]
+            if model not in llms_by_model:
+                llms_by_model[model] = self._create_llm(model)
+            self.llms[tier] = llms_by_model[model]
+        logging.info(f"模型档位: fast={self.model_tiers.models['fast']}, heavy={self.model_tiers.models['heavy']}")
+        
+        # token 计数：默认使用估算器，可通过 CHUNK_TOKENIZER 切换为真实分词器或校准后的估算器
+        self.token_counter = build_token_counter(os.getenv("CHUNK_TOKENIZER", "estimate"))
+        self.chunk_token_budget = int(os.getenv("CHUNK_TOKEN_BUDGET", "6000"))
+        # 多年对比输入（各年结构化记录）的 token 预算，超出时按相邻年份两两合并
+        self.comparison_token_budget = int(os.getenv("COMPARISON_TOKEN_BUDGET", "4000"))
+
+        # 初始化对话记忆：注入提示词的历史为滚动摘要 + 最近几轮原文，总 token 数不超过预算
+        from LLM.conversation_memory import TokenBudgetMemory
+
+        self.memory = TokenBudgetMemory(
+            chat_memory=message_history if message_history is not None else InMemoryChatMessageHistory(),
+            max_tokens=int(os.getenv("CHAT_MEMORY_TOKEN_BUDGET", "2000")),
+            summary_batch_tokens=int(os.getenv("CHAT_MEMORY_SUMMARY_BATCH", "500")),
+            max_summary_tokens=int(os.getenv("CHAT_MEMORY_SUMMARY_TOKENS", "500")),
+            summarize_fn=self._summarize_history,
+            token_counter=self.token_counter
+        )
+        # 持久化的对话历史在后台把较早消息压缩为会话摘要，保留的原文与摘要合计不超过记忆预算
+        if isinstance(self.memory.chat_memory, SQLiteChatMessageHistory):
+            self.memory.chat_memory.configure_compaction(
+                summarize_fn=self._summarize_history,
+                keep_tokens=self.memory.max_tokens - self.memory.max_summary_tokens,
+                batch_tokens=self.memory.summary_batch_tokens,
+                max_summary_tokens=self.memory.max_summary_tokens
+            )
+
+        # 入库时按章节切分，文本块不跨章节，仅超长章节按句子切分
+        self.section_chunker = SectionChunker(chunk_size=4000, max_overlap=100)
+
+        # 初始化章节路由器，只将相关章节送入单年报分析
+        self.section_router = SectionRouter(
+            token_budget=int(os.getenv("SECTION_ROUTER_TOKEN_BUDGET", "12000")),
+            token_counter=self.token_counter
         )
+        # 跨年差异：公司分析中第二年起只分析相对上一年新增或变化的段落，SECTION_DIFF=0 时关闭
+        self.section_diff = os.getenv("SECTION_DIFF", "1").lower() not in ("0", "false", "no")
+        # 各公司最近一次分析的跨年差异节省统计，{公司代码: {...}}
+        self.diff_savings: Dict[str, Dict[str, Any]] = {}
         
         # 初始化向量化模型
+        from langchain_huggingface import HuggingFaceEmbeddings
+
         self.embeddings = HuggingFaceEmbeddings(
             model_name="shibing624/text2vec-base-chinese",
             model_kwargs={'device': 'cpu'},
             encode_kwargs={'normalize_embeddings': True}
         )
         
+        # 初始化本地意图分类器，置信度不足时回退到LLM
+        self.intent_classifier = IntentClassifier(
+            embeddings=self.embeddings,
+            llm_fallback=self._classify_intent_with_llm
+        )
+
         # 初始化或加载向量存储
         self._init_vector_store()
         
         # 初始化Agent
         self.setup_agents()
 
+    def _init_llm_cache(self):
+        """初始化LLM响应缓存，设置 LLM_CACHE_BYPASS=1 时返回 None"""
+        if os.getenv("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes"):
+            logging.info("已通过 LLM_CACHE_BYPASS 跳过LLM响应缓存")
+            return None
+
+        ttl = os.getenv("LLM_CACHE_TTL_SECONDS")
+        max_entries = os.getenv("LLM_CACHE_MAX_ENTRIES")
+        return ResponseCache(
+            database_path=os.path.join(self.results_dir, 'llm_cache.sqlite'),
+            prompt_version=PROMPT_TEMPLATE_VERSION,
+            ttl_seconds=float(ttl) if ttl else 7 * 24 * 3600,
+            max_entries=int(max_entries) if max_entries else 10000
+        )
+
+    def _create_llm(self, model: str) -> "ChatOpenAI":
+        """
+        创建 OpenRouter 上的对话模型
+        :param model: 模型名
+        """
+        from langchain_openai import ChatOpenAI
+        from openai import DefaultHttpxClient
+
+        return ChatOpenAI(
+            openai_api_key=os.getenv("OPENROUTER_API_KEY"),
+            openai_api_base=os.getenv("OPENROUTER_BASE_URL"),
+            model=model,
+            default_headers={
+                "HTTP-Referer": os.getenv("YOUR_SITE_URL"),
+                "X-Title": os.getenv("YOUR_SITE_NAME"),
+                "OpenRouter-Provider": "chutes/fp8"
+            },
+            temperature=0,
+            streaming=True,  # 启用流式输出
+            stream_usage=True,  # 流式输出时同样返回token用量
+            cache=self.llm_cache if self.llm_cache else False,
+            # SDK 内部的重试不会触发 langchain 回调，通过请求钩子统计实际请求数
+            http_client=DefaultHttpxClient(event_hooks=self.usage_tracker.http_event_hooks())
+        )
+
+    def _llm_for(self, component: str) -> "ChatOpenAI":
+        """组件所属档位的LLM"""
+        return self.llms[self.model_tiers.tier_for(component)]
+
+    def _run_config(self, component: str, callbacks: List[Any] = None) -> Dict[str, Any]:
+        """
+        生成调用配置，为调用打上组件与模型档位标签并挂载用量统计回调
+        :param component: 组件名称，如 single_report_executor
+        :param callbacks: 额外的回调处理器，如流式输出的 StreamEventHandler
+        """
+        return {"callbacks": [self.usage_tracker] + list(callbacks or []),
+                "tags": [component, TIER_TAG_PREFIX + self.model_tiers.tier_for(component)]}
+
     def _init_vector_store(self):
-        """初始化或加载向量存储"""
-        persist_directory = os.path.join(self.results_dir, 'vector_store')
-        
-        # 如果向量存储目录存在，加载现有的存储
-        if os.path.exists(persist_directory):
-            self.vector_store = Chroma(
-                persist_directory=persist_directory,
-                embedding_function=self.embeddings
-            )
+        """初始化或加载按公司分片的向量存储，VECTOR_BACKEND=mmap 时使用内存映射 IVF 索引"""
+        backend = os.getenv("VECTOR_BACKEND", "chroma")
+        # 两种后端的文本块ID不同，各自使用独立的目录与 BM25 索引
+        if backend == "mmap":
+            persist_directory = os.path.join(self.results_dir, 'vector_mmap')
+            lexical_index_path = os.path.join(persist_directory, 'lexical_index.sqlite')
         else:
-            # 创建新的向量存储
-            self.vector_store = Chroma(
-                persist_directory=persist_directory,
-                embedding_function=self.embeddings
-            )
+            persist_directory = os.path.join(self.results_dir, 'vector_store')
+            lexical_index_path = None
+        self.report_store = ReportStore(
+            persist_directory=persist_directory,
+            lexical_index_path=lexical_index_path,
+            embeddings=self.embeddings,
+            cache_size=int(os.getenv("RETRIEVAL_CACHE_SIZE", "256")),
+            backend=backend,
+            vector_dtype=os.getenv("VECTOR_DTYPE", "float16")
+        )
 
     def process_and_store_pdf(self, pdf_path: str):
         """
@@ -117,43 +255,76 @@ class ReportAnalyzer:
         """
         try:
             # 处理PDF文件，获取章节内容
+            from reports.pdf_parser import process_pdf
+
             chapters = process_pdf(pdf_path)
             if not chapters:
                 logging.warning(f"未能从 {pdf_path} 提取到任何章节内容")
                 return
-            
-            # 准备文档列表
-            texts = []
-            metadatas = []
-            
-            # 处理每个章节
-            for chapter in chapters:
-                # 分割章节内容
-                chunks = self.text_splitter.split_text(chapter['content'])
-                
-                # 为每个文本块添加元数据
-                for chunk in chunks:
-                    texts.append(chunk)
-                    metadatas.append({
-                        'title': chapter['title'],
-                        'source': pdf_path,
-                        'chunk_size': len(chunk)
-                    })
-            
-            # 添加到向量存储
-            self.vector_store.add_texts(
-                texts=texts,
-                metadatas=metadatas
-            )
-            
-            # 持久化存储
-            self.vector_store.persist()
-            
-            logging.info(f"成功处理并存储 {pdf_path} 的内容，共 {len(texts)} 个文本块")
+
+            self.store_sections(pdf_path, chapters)
             
         except Exception as e:
             logging.error(f"处理PDF文件 {pdf_path} 时出错: {str(e)}")
 
+    def ingest_company_reports(self, stock_code: str) -> int:
+        """
+        下载公司年报并把尚未入库的年份写入向量数据库
+        下载经过工具结果缓存，与 agent 对 download_stock_reports 的调用共享同一次执行
+        :param stock_code: 股票代码
+        :return: 新入库的年报数量
+        """
+        message = self.tool_cache.call('download_stock_reports', stock_code, self.create_download_tool().func)
+        if is_error_result(message):
+            raise RuntimeError(message)
+
+        stored_years = set(self.report_store.index.get(stock_code, {}).get('years', []))
+        pdf_paths = sorted(glob.glob(os.path.join(self.results_dir, 'pdf_reports', f"{stock_code}_*.pdf")))
+        new_paths = [path for path in pdf_paths if parse_report_filename(path)['year'] not in stored_years]
+        for pdf_path in new_paths:
+            self.process_and_store_pdf(pdf_path)
+        logging.info(f"{stock_code} 的年报入库完成，新增 {len(new_paths)} 份")
+        return len(new_paths)
+
+    def store_sections(self, pdf_path: str, chapters: List[Dict[str, Any]]) -> int:
+        """
+        将已解析的章节切分后写入向量数据库
+        :param pdf_path: PDF文件路径，用于解析报告信息和记录来源
+        :param chapters: process_pdf 返回的章节列表
+        :return: 写入的文本块数量
+        """
+        # 从文件名解析股票代码、公司简称、年份
+        report_info = parse_report_filename(pdf_path)
+
+        # 按章节切分，文本块不跨越章节边界
+        chunks = self.section_chunker.chunk_sections(chapters)
+        texts = [chunk['text'] for chunk in chunks]
+        metadatas = [{
+            **report_info,
+            'title': chunk['metadata']['section_path'][-1],
+            'section_path': " > ".join(chunk['metadata']['section_path']),
+            'page': chunk['metadata'].get('page') or 0,
+            'source': pdf_path,
+            'chunk_size': len(chunk['text'])
+        } for chunk in chunks]
+
+        # 添加到对应公司的向量分片（Chroma 自动持久化）
+        self.report_store.add_chunks(texts=texts, metadatas=metadatas)
+
+        # 年报中的公司简介/业务概要写入本地资料库，供 wiki_search 直接使用
+        profile = profile_from_report(report_info, chapters)
+        if profile:
+            self.profile_store.upsert_company(profile, 'report')
+
+        # 该公司该年份的已缓存回答可能已过时
+        if self.answer_cache and report_info['stock_code']:
+            self.answer_cache.invalidate(report_info['stock_code'], report_info['year'])
+
+        stats = chunk_stats(chunks)
+        logging.info(f"成功处理并存储 {pdf_path} 的内容，共 {stats['chunks']} 个文本块，"
+                     f"{stats['total_bytes']} 字节，其中重叠 {stats['overlap_bytes']} 字节")
+        return stats['chunks']
+
     def create_download_tool(self) -> Tool:
         """
         创建一个用于下载和转换年报的工具
@@ -165,6 +336,8 @@ class ReportAnalyzer:
             :param stock_code: 股票代码
             :return: 处理结果信息
             """
+            from reports.download_reports import ensure_stock_reports
+
             return ensure_stock_reports(stock_code, self.results_dir, delete_pdf=False)
         
         return Tool(
@@ -187,6 +360,8 @@ class ReportAnalyzer:
             :return: 分析结果或筛选结果的描述
             """
             try:
+                from analyze.strategies_buffett import analyze_stock, screen_stocks
+
                 parts = query.split(':')
                 action = parts[0].lower()
 
@@ -215,6 +390,8 @@ class ReportAnalyzer:
                     
                     # 读取结果并返回摘要
                     if os.path.exists(output_file):
+                        import pandas as pd
+
                         df = pd.read_csv(output_file)
                         return f"筛选完成！共找到 {len(df)} 只符合巴菲特投资策略的股票。\n" + \
                                f"结果已保存至：{output_file}"
@@ -240,27 +417,39 @@ class ReportAnalyzer:
 
     def create_wiki_search_tool(self) -> Tool:
         """
-        创建一个用于维基百科搜索的工具
+        创建一个用于查询公司与行业资料的工具：优先查本地资料库，未命中时再查询外部来源并写回本地
         :return: Langchain Tool对象
         """
-        wiki = Wikipedia()
-
         def search_wiki(query: str) -> str:
             """
-            在维基百科中搜索信息
+            查询公司或行业资料
             :param query: 搜索关键词
             :return: 搜索结果
             """
             try:
-                # 尝试搜索维基百科
-                result = wiki.search(query)
-                
-                # 如果结果是字符串，说明没有找到精确匹配，返回相似条目提示
-                if isinstance(result, str):
-                    return f"未找到精确匹配的条目。{result}"
-                
-                # 如果找到了文档，返回其内容
-                return f"找到相关信息：\n\n{result.page_content}"
+                # 1. 本地资料库：股票代码、公司全称/简称、行业名称的模糊查找；
+                #    只有代码和名称的公司资料（年报没有概况章节）不算命中，继续查询股票详细信息
+                profile = self.profile_store.lookup(query)
+                if profile and has_profile_details(profile):
+                    return f"找到相关信息（本地资料）：\n\n{format_profile(profile)}"
+
+                # 2. 查询中有股票代码或命中了本地公司时获取股票详细信息，与本地资料合并
+                code_match = re.search(r'(?<!\d)(\d{6})(?!\d)', query)
+                stock_code = profile['code'] if profile else (code_match.group(1) if code_match else None)
+                if stock_code:
+                    detail = self.profile_source.stock_detail(stock_code)
+                    if detail:
+                        profile = self.profile_store.upsert_company(detail, 'stock_detail')
+                        return f"找到相关信息：\n\n{format_profile(profile)}"
+
+                # 3. 外部条目查询（维基百科），结果写入本地资料库
+                content = self.profile_source.search(query)
+                if not content:
+                    if profile:
+                        return f"找到相关信息（本地资料）：\n\n{format_profile(profile)}"
+                    return f"未找到“{query}”的精确匹配条目。"
+                self.profile_store.upsert_entry(query, content, 'wiki')
+                return f"找到相关信息：\n\n{content}"
                 
             except Exception as e:
                 return f"维基百科搜索出错：{str(e)}"
@@ -269,13 +458,13 @@ class ReportAnalyzer:
             name="wiki_search",
             func=search_wiki,
             description="""
-            维基百科搜索工具，用于查找公司、行业或其他相关信息。
-            输入：搜索关键词（如公司名称、行业名称等）
-            输出：相关的维基百科内容摘要
+            公司与行业资料查询工具，优先查询本地资料库（已入库年报的公司简介、股票详细信息），未命中时查询维基百科。
+            输入：搜索关键词（如公司名称、股票代码、行业名称等）
+            输出：公司概况（行业、上市时间、市值、主营业务等）或相关条目内容
             示例：
             - "贵州茅台"
+            - "000001"
             - "白酒行业"
-            - "证券交易所"
             """
         )
 
@@ -287,14 +476,19 @@ class ReportAnalyzer:
         def retrieve_content(query: str) -> str:
             """
             检索年报内容
-            :param query: 查询字符串
+            :param query: 查询字符串，可包含 code=、year=、type=、section= 过滤条件
             :return: 相关内容
             """
             try:
-                # 使用向量存储进行相似度搜索
-                docs = self.vector_store.similarity_search_with_score(
-                    query=query,
-                    k=3  # 返回前3个最相关的结果
+                # 解析公司、年份、章节等过滤条件，只在相关分片中检索
+                query_text, filters = self.report_store.parse_query_filters(query)
+                # 该公司的预取仍在进行时等待其完成，避免检索到不完整的数据
+                if self.prefetcher and filters.get('stock_code'):
+                    self.prefetcher.wait(filters['stock_code'])
+                docs = self.report_store.hybrid_search(
+                    query=query_text,
+                    k=3,  # 返回前3个最相关的结果
+                    **filters
                 )
                 
                 if not docs:
@@ -303,7 +497,10 @@ class ReportAnalyzer:
                 # 格式化结果
                 results = []
                 for doc, score in docs:
-                    results.append(f"来源: {doc.metadata['title']}\n相关度: {1 - score:.2%}\n内容:\n{doc.page_content}\n")
+                    metadata = doc.metadata
+                    source = f"{metadata.get('company_name', '')} {metadata.get('year', '')}年报 " \
+                             f"{metadata.get('section_path') or metadata.get('title', '')}"
+                    results.append(f"来源: {source}\n融合得分: {score:.4f}\n内容:\n{doc.page_content}\n")
                 
                 return "\n---\n".join(results)
                 
@@ -315,23 +512,30 @@ class ReportAnalyzer:
             func=retrieve_content,
             description="""
             年报内容检索工具，用于查找特定主题或关键词在年报中的相关内容。
-            输入：查询关键词或问题
+            输入：查询关键词或问题，可在开头加过滤条件缩小范围：
+                  code=股票代码 year=年份 type=annual section=章节关键词
+                  查询中出现的股票代码、公司简称和年份也会自动作为过滤条件
             输出：相关的年报内容片段
             示例查询：
             - "公司的主营业务是什么"
-            - "近年来的营收情况"
-            - "未来发展战略"
+            - "code=000001 year=2023 近年来的营收情况"
+            - "平安银行 section=风险 主要面临哪些风险"
             """
         )
 
     def setup_agents(self):
         """设置不同任务的agents"""
+        from langchain.agents import AgentExecutor, create_structured_chat_agent
+        from langchain_core.tools.render import render_text_description_and_args
+
         # 创建工具
         download_tool = self.create_download_tool()
         screening_tool = self.create_stock_screening_tool()
         wiki_tool = self.create_wiki_search_tool()
         retriever_tool = self.create_retriever_tool()
-        final_tools = [download_tool, screening_tool, wiki_tool, retriever_tool]
+        # 工具结果经缓存：同一输入在有效期内不重复执行，并发的相同调用只执行一次
+        final_tools = [self.tool_cache.wrap(tool) for tool in
+                       (download_tool, screening_tool, wiki_tool, retriever_tool)]
         
         # 年报分析agent
         system_message = """你是一个专业的财务分析师，擅长分析企业年报。你的分析应该：
@@ -375,14 +579,18 @@ class ReportAnalyzer:
         ])
         
         self.single_report_agent = create_structured_chat_agent(
-            llm=self.llm,
+            llm=self._llm_for("single_report_executor"),
             tools=final_tools,
             prompt=prompt
         )
+        rendered_tools = render_text_description_and_args(final_tools)
+        tool_names = ", ".join(tool.name for tool in final_tools)
+        self._init_analysis_splitters(lambda text_chunk: prompt.format(
+            text_chunk=text_chunk, agent_scratchpad="", tools=rendered_tools, tool_names=tool_names
+        ))
         self.single_report_executor = AgentExecutor(
             agent=self.single_report_agent,
             tools=final_tools,
-            memory=self.memory,
             verbose=True
         )
 
@@ -426,14 +634,13 @@ class ReportAnalyzer:
         ])
         
         self.comparison_agent = create_structured_chat_agent(
-            llm=self.llm,
+            llm=self._llm_for("comparison_executor"),
             tools=final_tools,
             prompt=comparison_prompt
         )
         self.comparison_executor = AgentExecutor(
             agent=self.comparison_agent,
             tools=final_tools,
-            memory=self.memory,
             verbose=True
         )
 
@@ -488,67 +695,294 @@ class ReportAnalyzer:
         ])
         
         self.final_agent = create_structured_chat_agent(
-            llm=self.llm,
+            llm=self._llm_for("final_executor"),
             tools=final_tools,
             prompt=final_prompt
         )
         self.final_executor = AgentExecutor(
             agent=self.final_agent,
             tools=final_tools,
-            memory=self.memory,
             callbacks=[self.callback_handler] if self.callback_handler else None,
             verbose=True
         )
 
-    def analyze_single_report(self, file_path: str) -> Dict[str, Any]:
+        # 以上 executor 用于公司分析，不带记忆，各文本块、各公司的分析互不影响；
+        # 对话使用相同的 agent，另建带对话记忆的 executor，键为 _run_config 的组件名
+        self.chat_executors = {
+            name: AgentExecutor(
+                agent=executor.agent,
+                tools=final_tools,
+                memory=self.memory,
+                callbacks=executor.callbacks,
+                verbose=True
+            )
+            for name, executor in (("single_report_executor", self.single_report_executor),
+                                   ("comparison_executor", self.comparison_executor),
+                                   ("final_executor", self.final_executor))
+        }
+
+    def _init_analysis_splitters(self, render_prompt: Callable[[str], str]):
+        """
+        按 token 预算初始化单年报分析的切分器：每个文本块的 token 数 = 提示词预算 - 提示词模板本身的 token 数。
+        模板按实际发送的完整提示词计量（单年报分析的 executor 不带对话记忆，chat_history 为空）；
+        章节标题、段间分隔符与跨年差异说明由 pack_sections 在文本块预算内扣除
+        :param render_prompt: 输入年报内容、返回完整提示词的函数
+        """
+        self.render_single_report_prompt = render_prompt
+        prompt_tokens = self.token_counter(render_prompt(""))
+        chunk_tokens = max(self.chunk_token_budget - prompt_tokens, 500)
+        logging.info(f"单年报分析提示词预算 {self.chunk_token_budget} token，模板占用 {prompt_tokens}，"
+                     f"每个文本块最多 {chunk_tokens} token")
+
+        # 无章节JSON时对全文切分
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_tokens,
+            chunk_overlap=min(200, chunk_tokens // 10),
+            length_function=self.token_counter,
+            separators=["\n\n", "\n", "。", "！", "？", ".", "!", "?"]  # 优化中文分割
+        )
+        # 有章节JSON时按章节装箱
+        self.analysis_chunker = SectionChunker(chunk_size=chunk_tokens, max_overlap=60,
+                                               length_function=self.token_counter)
+
+    def analyze_single_report(self, file_path: str, previous_file_path: str = None) -> Dict[str, Any]:
         """
         分析单个年报文件
         :param file_path: txt格式年报文件路径
-        :return: 年报分析结果字典
+        :param previous_file_path: 同一公司上一年的年报文件路径，两年都有章节JSON时只分析新增或变化的段落
+        :return: 年报分析结果字典，按差异分析时 diff 为相对上一年的段落与 token 统计
         """
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 text = f.read()
 
-            # 切分文本
-            chunks = self.text_splitter.split_text(text)
+            # 章节路由：有章节JSON时只保留相关章节，并按章节装箱，不在章节中间切断
+            route = self._route_report_sections(file_path)
+            changes = self._route_section_changes(file_path, previous_file_path, route) \
+                if route and previous_file_path else None
+            if changes:
+                chunks = changes['chunks']
+            elif route:
+                chunks = self.analysis_chunker.pack_sections(route['sections'])
+            else:
+                chunks = self.text_splitter.split_text(text)
             
             # 分析每个文本块并合并结果
+            start_time = time.perf_counter()
             all_analyses = []
             for chunk in chunks:
                 result = self.single_report_executor.invoke({
                     "text_chunk": chunk
-                })
+                }, config=self._run_config("single_report_executor"))
                 all_analyses.append(result['output'])
+            elapsed = time.perf_counter() - start_time
+
+            if route and not changes:
+                self._log_routing_savings(file_path, route, len(chunks), elapsed)
             
             # 合并所有分析结果
             combined_analysis = "\n\n".join(all_analyses)
+            if changes and not chunks:
+                combined_analysis = f"与{changes['diff']['baseline_year']}年年报相比，相关章节没有新增或变化的内容。"
             
             # 提取年份和公司信息
             filename = os.path.basename(file_path)
             code, name, year = filename.replace('.txt', '').split('_')
             
-            return {
+            analysis = {
                 'code': code,
                 'name': name,
                 'year': year,
                 'analysis': combined_analysis
             }
+            if changes:
+                analysis['diff'] = changes['diff']
+            return analysis
             
         except Exception as e:
             logging.error(f"分析年报时出错 {file_path}: {str(e)}")
             return None
 
-    def compare_multiple_years(self, company_analyses: List[Dict[str, Any]]) -> str:
+    def _route_report_sections(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        根据章节JSON选择与单年报分析相关的章节
+        :param file_path: txt格式年报文件路径
+        :return: SectionRouter.route 的结果，无章节JSON或未命中相关章节时返回 None
+        """
+        json_path = find_section_json(file_path, self.json_dir)
+        if not json_path:
+            logging.info(f"未找到 {os.path.basename(file_path)} 的章节JSON，使用全文分析")
+            return None
+
+        route = self.section_router.route(load_section_records(json_path))
+        if not route['selected_paths']:
+            logging.warning(f"{os.path.basename(file_path)} 未命中相关章节，使用全文分析")
+            return None
+
+        logging.info(f"章节路由选中 {len(route['selected_paths'])} 个章节: "
+                     + "; ".join(" > ".join(path) for path in route['selected_paths']))
+        return route
+
+    def _route_section_changes(self, file_path: str, previous_file_path: str,
+                               route: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        计算相对上一年年报新增或变化的段落，并在路由预算内选择相关章节
+        :param file_path: 本年txt年报路径
+        :param previous_file_path: 上一年txt年报路径
+        :param route: 本年全文的章节路由结果，用于统计节省
+        :return: {'chunks': 差异内容装箱后的LLM输入, 'diff': 段落与 token 统计}，上一年没有章节JSON时返回 None
+        """
+        previous_json = find_section_json(previous_file_path, self.json_dir)
+        if not previous_json:
+            return None
+        year = parse_report_filename(file_path)['year']
+        baseline_year = parse_report_filename(previous_file_path)['year']
+        result = diff_sections(load_section_records(find_section_json(file_path, self.json_dir)),
+                               load_section_records(previous_json), year, baseline_year,
+                               token_counter=self.token_counter)
+        changed_route = self.section_router.route(result['sections'])
+
+        header = (f"以下是{year}年年报相对{baseline_year}年年报新增或变化的段落，未变化的内容已省略，"
+                  f"段落前标注（新增）或（变化）：\n")
+        chunks = self.analysis_chunker.pack_sections(changed_route['sections'], prefix=header)
+        diff = {
+            'baseline_year': baseline_year,
+            'full_tokens': route['selected_tokens'],
+            'sent_tokens': sum(self.token_counter(chunk) for chunk in chunks),
+            # 全文路由时的调用次数按预算估算，不为统计再装箱一次
+            'full_calls': math.ceil(route['selected_tokens'] / self.analysis_chunker.chunk_size),
+            'sent_calls': len(chunks),
+            **{name: result['stats'][name] for name in ('new', 'changed', 'unchanged', 'removed')}
+        }
+        logging.info(
+            f"跨年差异 {os.path.basename(file_path)} 相对 {baseline_year} 年：新增 {diff['new']} 段，"
+            f"变化 {diff['changed']} 段，未变 {diff['unchanged']} 段；单年报分析输入 token "
+            f"{diff['full_tokens']} -> {diff['sent_tokens']}，LLM调用 {diff['full_calls']} -> {diff['sent_calls']} 次"
+        )
+        return {'chunks': chunks, 'diff': diff}
+
+    def _log_diff_savings(self, company_code: str, analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        汇总并记录公司各年按差异分析节省的 token 与 LLM 调用
+        :param company_code: 公司代码
+        :param analyses: 各年分析结果
+        :return: 汇总统计，同时保存到 self.diff_savings
+        """
+        diffs = [analysis['diff'] for analysis in analyses if analysis.get('diff')]
+        savings = {'reports': len(analyses), 'diffed_reports': len(diffs)}
+        for name in ('full_tokens', 'sent_tokens', 'full_calls', 'sent_calls', 'new', 'changed', 'unchanged'):
+            savings[name] = sum(diff[name] for diff in diffs)
+        savings['saved_ratio'] = 1 - savings['sent_tokens'] / savings['full_tokens'] if savings['full_tokens'] else 0.0
+        if diffs:
+            logging.info(
+                f"跨年差异节省 {company_code}: {len(diffs)}/{len(analyses)} 份年报按差异分析，单年报分析输入 token "
+                f"{savings['full_tokens']} -> {savings['sent_tokens']}（节省 {savings['saved_ratio']:.1%}），"
+                f"LLM调用 {savings['full_calls']} -> {savings['sent_calls']} 次"
+            )
+        self.diff_savings[company_code] = savings
+        return savings
+
+    def _log_routing_savings(self, file_path: str, route: Dict[str, Any], routed_chunks: int,
+                             elapsed: float) -> None:
+        """
+        记录章节路由节省的 token 数与预估耗时
+        :param file_path: txt格式年报文件路径
+        :param route: SectionRouter.route 的结果，token 数由路由器按 self.token_counter 计算
+        :param routed_chunks: 路由后的LLM调用次数
+        :param elapsed: 路由后分析的实际耗时
+        """
+        full_tokens = route['total_tokens']
+        routed_tokens = route['selected_tokens']
+        # 全文分析的调用次数按预算估算，不为记录日志再对全文分词切分
+        full_chunks = math.ceil(full_tokens / self.analysis_chunker.chunk_size)
+        per_chunk = elapsed / routed_chunks if routed_chunks else 0.0
+        saved_seconds = per_chunk * max(full_chunks - routed_chunks, 0)
+        saved_ratio = 1 - routed_tokens / full_tokens if full_tokens else 0.0
+        logging.info(
+            f"章节路由节省 {os.path.basename(file_path)}: token {full_tokens} -> {routed_tokens}"
+            f"（节省 {saved_ratio:.1%}），LLM调用 {full_chunks} -> {routed_chunks} 次，"
+            f"实际耗时 {elapsed:.1f}s，预计节省 {saved_seconds:.1f}s"
+        )
+
+    def extract_year_record(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将单年报分析抽取为紧凑的结构化记录（关键指标、业务要点、下一年计划、主要风险）
+        :param analysis: analyze_single_report 的结果
+        :return: 记录字典，抽取失败时回退为分析原文的前几句
+        """
+        record_prompt = ChatPromptTemplate.from_messages([
+            ("system", """你负责把年报分析整理为紧凑的结构化记录，只输出一个JSON对象，不要输出其他内容：
+            {{"metrics": {{"指标名": "数值及同比变化"}}, "business": ["业务要点"],
+              "plans": ["下一年计划"], "risks": ["主要风险"]}}
+            每个字段最多{max_items}条，每条不超过{max_chars}字，保留具体数字，没有的信息留空。"""),
+            ("human", "{year}年分析：\n{analysis}")
+        ])
+        try:
+            result = (record_prompt | self._llm_for("year_record")).invoke({
+                "year": analysis['year'],
+                "analysis": analysis['analysis'],
+                "max_items": MAX_ITEMS_PER_FIELD,
+                "max_chars": MAX_ITEM_CHARS
+            }, config=self._run_config("year_record"))
+            record = parse_year_record(result.content, analysis['year'])
+            if not record:
+                logging.warning(f"{analysis['year']}年分析的结构化抽取结果无法解析，使用分析原文摘录")
+        except Exception as e:
+            logging.error(f"抽取{analysis['year']}年结构化记录时出错: {str(e)}")
+            record = None
+        record = record or fallback_year_record(analysis['analysis'], analysis['year'])
+        if analysis.get('diff'):
+            # 按差异分析的年份只包含相对上一年的变化，多年对比时据此区分
+            record['baseline_year'] = analysis['diff']['baseline_year']
+        return record
+
+    def _merge_year_summaries(self, earlier: str, later: str) -> str:
+        """
+        合并相邻两段年份记录或小结，保留计划与实际的对照
+        :param earlier: 较早年份的记录或小结
+        :param later: 较晚年份的记录或小结
+        :return: 合并后的小结
+        """
+        max_tokens = max(self.comparison_token_budget // 4, 200)
+        merge_prompt = ChatPromptTemplate.from_messages([
+            ("system", """你负责把公司相邻两个时期的年报记录合并为一段小结，供后续多年对比使用。
+            保留：每年的关键指标及变化、较早时期计划在较晚时期的完成情况、战略方向变化、新出现或消除的风险。
+            以【起始年-结束年】开头，不超过{max_chars}字。"""),
+            ("human", "较早时期：\n{earlier}\n\n较晚时期：\n{later}")
+        ])
+        try:
+            result = (merge_prompt | self._llm_for("comparison_merge")).invoke({
+                "earlier": earlier, "later": later, "max_chars": max_tokens
+            }, config=self._run_config("comparison_merge"))
+            return truncate_to_tokens(result.content.strip(), max_tokens, self.token_counter)
+        except Exception as e:
+            logging.error(f"合并年份小结时出错: {str(e)}")
+            return truncate_to_tokens(earlier, max_tokens // 2, self.token_counter) + "\n" + \
+                truncate_to_tokens(later, max_tokens // 2, self.token_counter)
+
+    def compare_multiple_years(self, company_analyses: List[Dict[str, Any]],
+                               year_records: List[Dict[str, Any]] = None) -> str:
         """
-        对比多年的年报分析
+        对比多年的年报分析：使用各年的结构化记录而非分析原文，记录总量超出预算时先按相邻年份两两合并
         :param company_analyses: 按年份排序的公司年报分析列表
+        :param year_records: 与 company_analyses 对应的结构化记录，为 None 时现场抽取
         :return: 多年对比分析结果
         """
         try:
+            if year_records is None:
+                year_records = [self.extract_year_record(analysis) for analysis in company_analyses]
+            texts = merge_pairwise([format_year_record(record) for record in year_records],
+                                   self._merge_year_summaries, self.comparison_token_budget, self.token_counter)
+            yearly_analyses = "\n\n".join(texts)
+            logging.info(f"多年对比输入：{len(year_records)} 年，{len(texts)} 段，"
+                         f"{self.token_counter(yearly_analyses)} tokens（分析原文 "
+                         f"{sum(self.token_counter(a['analysis']) for a in company_analyses)} tokens）")
+
             result = self.comparison_executor.invoke({
-                "yearly_analyses": json.dumps(company_analyses, ensure_ascii=False)
-            })
+                "yearly_analyses": yearly_analyses
+            }, config=self._run_config("comparison_executor"))
             return result['output']
         except Exception as e:
             logging.error(f"多年对比分析时出错: {str(e)}")
@@ -565,17 +999,18 @@ class ReportAnalyzer:
             result = self.final_executor.invoke({
                 "company_info": json.dumps(company_info, ensure_ascii=False),
                 "multi_year_analysis": multi_year_analysis
-            })
+            }, config=self._run_config("final_executor"))
             return result['output']
         except Exception as e:
             logging.error(f"生成最终报告时出错: {str(e)}")
             return ""
 
-    def save_analysis(self, company_code: str, final_report: str) -> None:
+    def save_analysis(self, company_code: str, final_report: str) -> str:
         """
-        保存分析报告
+        保存分析报告，并在同目录导出本次公司分析的用量记录（*_usage.jsonl）
         :param company_code: 公司代码
         :param final_report: 最终报告内容
+        :return: 报告文件路径
         """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{company_code}_analysis_{timestamp}.txt"
@@ -586,98 +1021,313 @@ class ReportAnalyzer:
         
         logging.info(f"分析报告已保存到: {output_path}")
 
-    def process_company(self, company_code: str) -> None:
+        scope = f"company:{company_code}"
+        self.usage_tracker.log_summary(scope)
+        usage_path = os.path.join(self.results_dir, f"{company_code}_analysis_{timestamp}_usage.jsonl")
+        self.usage_tracker.export_jsonl(usage_path, scope=scope)
+        logging.info(f"用量记录已保存到: {usage_path}")
+        return output_path
+
+    def _checkpointed(self, scope: str, stage: str, key: str, compute):
         """
-        处理单个公司的所有年报
+        读取阶段检查点，不存在时执行 compute 并保存非空结果
+        :param scope: 检查点作用域（公司代码）
+        :param stage: 阶段名称
+        :param key: 阶段输入哈希
+        :param compute: 计算该阶段结果的函数
+        :return: 阶段结果
+        """
+        result = self.checkpoints.load(scope, stage, key)
+        if result is not None:
+            logging.info(f"使用检查点 {scope}/{stage}，跳过该阶段")
+            return result
+        result = compute()
+        if result:
+            self.checkpoints.save(scope, stage, key, result)
+        return result
+
+    def _analysis_fingerprint(self) -> List[Any]:
+        """影响分析结果的配置：提示词版本、各分析阶段的模型、切分与路由预算"""
+        return [PROMPT_TEMPLATE_VERSION,
+                [self.model_tiers.model_for(component) for component in
+                 ("single_report_executor", "year_record", "comparison_merge", "comparison_executor", "final_executor")],
+                self.chunk_token_budget, self.section_router.token_budget]
+
+    def process_company(self, company_code: str, resume: bool = True,
+                        progress: Callable[[float, str], None] = None) -> Optional[str]:
+        """
+        处理单个公司的所有年报，各阶段结果保存到 results/checkpoints/{公司代码}，
+        重新运行时输入未变的阶段直接使用检查点
         :param company_code: 公司代码
+        :param resume: 是否使用已有检查点，False 时清除该公司的检查点后重新分析
+        :param progress: 进度回调，参数为完成比例（0~1）与当前阶段说明，供后台任务队列展示
+        :return: 报告文件路径，失败时返回 None
         """
-        try:
-            # 获取该公司的所有年报文件
-            company_files = [f for f in os.listdir(self.txt_dir) 
-                           if f.startswith(f"{company_code}_") and f.endswith('.txt')]
+        notify = progress or (lambda fraction, message: None)
+        if not resume:
+            self.checkpoints.clear(company_code)
+
+        with self.usage_tracker.scope(f"company:{company_code}"):
+            try:
+                # 获取该公司的所有年报文件
+                company_files = [f for f in os.listdir(self.txt_dir) 
+                               if f.startswith(f"{company_code}_") and f.endswith('.txt')]
             
-            if not company_files:
-                logging.error(f"未找到公司 {company_code} 的年报文件")
-                return
+                if not company_files:
+                    logging.error(f"未找到公司 {company_code} 的年报文件")
+                    return None
             
-            # 按年份排序
-            company_files.sort(key=lambda x: x.split('_')[2].replace('.txt', ''))
+                # 按年份排序
+                company_files.sort(key=lambda x: x.split('_')[2].replace('.txt', ''))
+                fingerprint = self._analysis_fingerprint()
             
-            # 分析每个年报
-            yearly_analyses = []
-            for file_name in company_files:
-                logging.info(f"正在分析年报: {file_name}")
-                file_path = os.path.join(self.txt_dir, file_name)
-                analysis = self.analyze_single_report(file_path)
-                if analysis:
-                    yearly_analyses.append(analysis)
+                # 分析每个年报，键包含年报与章节JSON的内容哈希；按差异分析时还包含上一年章节JSON的哈希
+                # 进度：每份年报一步，结构化记录、多年对比、最终报告各一步
+                total_steps = len(company_files) + 3
+                yearly_analyses = []
+                for index, file_name in enumerate(company_files):
+                    notify(index / total_steps, f"正在分析年报 {file_name}")
+                    logging.info(f"正在分析年报: {file_name}")
+                    file_path = os.path.join(self.txt_dir, file_name)
+                    previous_path = os.path.join(self.txt_dir, company_files[index - 1]) \
+                        if self.section_diff and index > 0 else None
+                    key = self.checkpoints.make_key(
+                        "single_report", fingerprint, file_digest(file_path),
+                        file_digest(find_section_json(file_path, self.json_dir)),
+                        file_digest(find_section_json(previous_path, self.json_dir)) if previous_path else None
+                    )
+                    analysis = self._checkpointed(
+                        company_code, f"year_{parse_report_filename(file_name)['year']}", key,
+                        lambda: self.analyze_single_report(file_path, previous_file_path=previous_path)
+                    )
+                    if analysis:
+                        yearly_analyses.append(analysis)
+                self._log_diff_savings(company_code, yearly_analyses)
             
-            # 多年对比分析
-            logging.info("开始多年对比分析...")
-            multi_year_analysis = self.compare_multiple_years(yearly_analyses)
+                # 各年分析抽取为结构化记录，按分析内容缓存
+                notify(len(company_files) / total_steps, "正在整理各年结构化记录")
+                year_records = [
+                    self._checkpointed(
+                        company_code, f"record_{analysis['year']}",
+                        self.checkpoints.make_key("year_record", fingerprint, analysis),
+                        lambda analysis=analysis: self.extract_year_record(analysis)
+                    )
+                    for analysis in yearly_analyses
+                ]
+
+                # 多年对比分析
+                notify((len(company_files) + 1) / total_steps, "正在进行多年对比分析")
+                logging.info("开始多年对比分析...")
+                multi_year_analysis = self._checkpointed(
+                    company_code, "comparison",
+                    self.checkpoints.make_key("comparison", fingerprint, self.comparison_token_budget, year_records),
+                    lambda: self.compare_multiple_years(yearly_analyses, year_records)
+                )
             
-            # 生成最终报告
-            logging.info("生成最终综合报告...")
-            company_info = {
-                'code': company_code,
-                'name': yearly_analyses[0]['name'],
-                'years_analyzed': [a['year'] for a in yearly_analyses]
-            }
-            final_report = self.generate_final_summary(company_info, multi_year_analysis)
+                # 生成最终报告
+                notify((len(company_files) + 2) / total_steps, "正在生成最终综合报告")
+                logging.info("生成最终综合报告...")
+                company_info = {
+                    'code': company_code,
+                    'name': yearly_analyses[0]['name'],
+                    'years_analyzed': [a['year'] for a in yearly_analyses]
+                }
+                final_report = self._checkpointed(
+                    company_code, "final",
+                    self.checkpoints.make_key("final", fingerprint, company_info, multi_year_analysis),
+                    lambda: self.generate_final_summary(company_info, multi_year_analysis)
+                )
             
-            # 保存分析结果
-            self.save_analysis(company_code, final_report)
+                # 保存分析结果
+                output_path = self.save_analysis(company_code, final_report)
+                notify(1.0, "分析完成")
+                return output_path
             
+            except Exception as e:
+                logging.error(f"处理公司 {company_code} 时出错: {str(e)}")
+                return None
+
+    def _classify_intent_with_llm(self, message: str) -> str:
+        """
+        使用 LLM 进行意图识别（本地分类器置信度不足时的回退）
+        :param message: 用户消息
+        :return: LLM 输出的第一行
+        """
+        intent_prompt = ChatPromptTemplate.from_messages([
+            ("system", """你是一个金融分析助手，需要理解用户的意图并选择合适的处理方式。
+            可能的意图类别：
+            1. SINGLE_REPORT - 分析单个年报（例如：分析平安银行2023年报）
+            2. COMPARE_REPORTS - 对比多年报表（例如：对比平安银行近3年业绩）
+            3. INVESTMENT_ADVICE - 请求投资建议（例如：平安银行值得投资吗）
+            4. DOWNLOAD_REPORT - 下载年报（例如：下载平安银行的年报）
+            5. STOCK_SCREENING - 股票筛选（例如：筛选白酒板块股票）
+            6. GENERAL_QUERY - 一般查询（例如：什么是ROE）
+            """),
+            ("human", "{message}")
+        ])
+
+        from langchain.chains import LLMChain
+
+        intent_chain = LLMChain(llm=self._llm_for("intent_chain"), prompt=intent_prompt)
+        intent_result = intent_chain.invoke({"message": message}, config=self._run_config("intent_chain"))
+        return intent_result['text'].strip().split('\n')[0]  # 获取第一行作为意图
+
+    def _summarize_history(self, summary: str, messages: List[Any]) -> str:
+        """
+        把滑出记忆窗口的一批消息合并进已有摘要
+        :param summary: 已有摘要
+        :param messages: 待合并的消息
+        :return: 新摘要
+        """
+        summary_prompt = ChatPromptTemplate.from_messages([
+            ("system", """你负责维护一段对话摘要。请把新增对话中的关键信息合并进已有摘要，
+            保留涉及的公司、股票代码、年份、用户关注的问题和已得出的结论，删除寒暄与重复内容。
+            摘要不超过{max_chars}字，只输出摘要正文。"""),
+            ("human", "已有摘要：\n{summary}\n\n新增对话：\n{new_lines}")
+        ])
+        new_lines = "\n".join(
+            f"{'用户' if message.type == 'human' else '助手'}：{message.content}" for message in messages
+        )
+        result = (summary_prompt | self._llm_for("memory_summary")).invoke({
+            "summary": summary or "无",
+            "new_lines": new_lines,
+            "max_chars": self.memory.max_summary_tokens
+        }, config=self._run_config("memory_summary"))
+        return result.content
+
+    def chat(self, message: str, callbacks: List[Any] = None) -> str:
+        """
+        处理用户消息并返回回复，每轮对话的用量记录追加到 results/chat_usage.jsonl
+        :param message: 用户消息
+        :param callbacks: 额外的回调处理器，随 agent 调用传递
+        :return: AI回复
+        """
+        self._chat_turn += 1
+        scope = f"chat:{self._chat_turn}"
+        self._prefetch_mentions(message)
+        answer_scope = self._answer_cache_scope(message)
+        with self.usage_tracker.scope(scope):
+            cached = self.answer_cache.lookup(message, *answer_scope) if answer_scope else None
+            if cached:
+                reply = cached['answer']
+                self.memory.save_context({"input": message}, {"output": reply})
+            else:
+                reply = self._handle_message(message, callbacks)
+                self._store_answer(message, reply, answer_scope)
+
+        self.usage_tracker.log_summary(scope)
+        self.usage_tracker.export_jsonl(os.path.join(self.results_dir, 'chat_usage.jsonl'), scope=scope)
+        return reply
+
+    def _prefetch_mentions(self, message: str) -> None:
+        """在本地解析消息中提到的公司，后台预取其年报数据，不阻塞本轮对话"""
+        if self.prefetcher is None:
+            return
+        try:
+            codes = resolve_stock_mentions(message, self.report_store.index, self.profile_store)
+            if codes:
+                logging.info(f"预取消息中提到的公司: {', '.join(codes)}")
+                self.prefetcher.prefetch(codes)
         except Exception as e:
-            logging.error(f"处理公司 {company_code} 时出错: {str(e)}")
+            logging.error(f"预取消息中提到的公司时出错: {str(e)}")
 
-    def chat(self, message: str) -> str:
+    def _answer_cache_scope(self, message: str):
         """
-        处理用户消息并返回回复
+        确定消息在回答缓存中的分区
         :param message: 用户消息
+        :return: (股票代码, 年份)，不应使用缓存（未启用、依赖上下文的追问或未识别出公司）时返回 None
+        """
+        if self.answer_cache is None or is_context_dependent(message):
+            return None
+        try:
+            _, filters = self.report_store.parse_query_filters(message)
+            # 未识别出公司的问题不缓存：不同公司的相似问题（如“X值得投资吗”）会共用一个分区，入库也不会使其失效
+            if not filters.get('stock_code'):
+                return None
+            return filters['stock_code'], filters.get('year')
+        except Exception as e:
+            logging.error(f"解析回答缓存分区时出错: {str(e)}")
+            return None
+
+    def _store_answer(self, message: str, reply: str, answer_scope) -> None:
+        """缓存回答；出错的回复以及下载、选股这类依赖实时数据的意图不缓存"""
+        if answer_scope is None or not reply or reply.startswith("抱歉"):
+            return
+        try:
+            intent = self.intent_classifier.classify(message)['intent']
+            if intent in ("DOWNLOAD_REPORT", "STOCK_SCREENING"):
+                return
+            self.answer_cache.store(message, reply, *answer_scope)
+        except Exception as e:
+            logging.error(f"缓存回答时出错: {str(e)}")
+
+    def chat_stream(self, message: str, prepare_thread=None) -> Iterator[Dict[str, Any]]:
+        """
+        流式处理用户消息：agent 在后台线程运行，逐个产出 token 与工具调用事件，最后产出完整回复
+        事件格式见 LLM/chat_stream.py，首 token 延迟（从收到消息到第一个答案 token）写入日志
+        :param message: 用户消息
+        :param prepare_thread: 启动后台线程前对其调用的函数，如 Streamlit 的 add_script_run_ctx
+        :return: 事件生成器
+        """
+        events: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        handler = StreamEventHandler(events.put)
+        result: Dict[str, str] = {}
+        done = object()
+        start = time.perf_counter()
+
+        def run():
+            try:
+                result['reply'] = self.chat(message, callbacks=[handler])
+            except Exception as e:
+                logging.error(f"流式处理消息时出错: {str(e)}")
+                result['reply'] = f"抱歉，处理您的消息时出现错误：{str(e)}"
+            finally:
+                events.put(done)
+
+        worker = threading.Thread(target=run, name="chat-stream", daemon=True)
+        if prepare_thread:
+            prepare_thread(worker)
+        worker.start()
+
+        ttft = None
+        while True:
+            event = events.get()
+            if event is done:
+                break
+            if event['type'] == 'token' and ttft is None:
+                ttft = time.perf_counter() - start
+                logging.info(f"首 token 延迟: {ttft:.2f}s")
+            yield event
+
+        elapsed = time.perf_counter() - start
+        logging.info(f"对话回复完成，总耗时 {elapsed:.2f}s，首 token 延迟 "
+                     f"{f'{ttft:.2f}s' if ttft is not None else '无（未流式输出）'}")
+        yield {'type': 'final', 'text': result.get('reply', ""), 'ttft': ttft, 'elapsed': elapsed}
+
+    def _handle_message(self, message: str, callbacks: List[Any] = None) -> str:
+        """
+        识别意图并调用对应的agent
+        :param message: 用户消息
+        :param callbacks: 额外的回调处理器
         :return: AI回复
         """
         try:
-            # 1. 意图识别系统提示
-            intent_prompt = ChatPromptTemplate.from_messages([
-                ("system", """你是一个金融分析助手，需要理解用户的意图并选择合适的处理方式。
-                可能的意图类别：
-                1. SINGLE_REPORT - 分析单个年报（例如：分析平安银行2023年报）
-                2. COMPARE_REPORTS - 对比多年报表（例如：对比平安银行近3年业绩）
-                3. INVESTMENT_ADVICE - 请求投资建议（例如：平安银行值得投资吗）
-                4. DOWNLOAD_REPORT - 下载年报（例如：下载平安银行的年报）
-                5. STOCK_SCREENING - 股票筛选（例如：筛选白酒板块股票）
-                6. GENERAL_QUERY - 一般查询（例如：什么是ROE）
-                """),
-                ("human", "{message}")
-            ])
-
-            # 2. 使用 LLM 进行意图识别
-            intent_chain = LLMChain(llm=self.llm, prompt=intent_prompt)
-            intent_result = intent_chain.invoke({"message": message})
-            intent = intent_result['text'].strip().split('\n')[0]  # 获取第一行作为意图
-
-            # 3. 根据意图选择处理方式
+            # 1. 意图识别：优先本地规则与向量匹配，置信度不足时回退到LLM
+            intent = self.intent_classifier.classify(message)['intent']
+
+            # 2. 根据意图选择处理方式，对话使用带记忆的 executor
             if "SINGLE_REPORT" in intent:
                 # 使用单报表分析 agent
-                response = self.single_report_executor.invoke({
-                    "input": message
-                })
+                component, inputs = "single_report_executor", {"text_chunk": message}
             elif "COMPARE_REPORTS" in intent:
                 # 使用报表对比 agent
-                response = self.comparison_executor.invoke({
-                    "input": message
-                })
-            elif "INVESTMENT_ADVICE" in intent:
-                # 使用投资建议 agent
-                response = self.final_executor.invoke({
-                    "input": message
-                })
+                component, inputs = "comparison_executor", {"yearly_analyses": message}
             else:
-                # 默认使用通用 agent 处理其他查询
-                response = self.final_executor.invoke({
-                    "input": message
-                })
+                # 投资建议与其他查询使用投资建议 agent
+                component, inputs = "final_executor", {"company_info": message, "multi_year_analysis": ""}
+            response = self.chat_executors[component].invoke(
+                inputs, config=self._run_config(component, callbacks)
+            )
 
             return response["output"]
 
@@ -1,5 +1,9 @@
-from .LLM_reports import ReportAnalyzer
-
 __all__ = ["ReportAnalyzer"]
 
 
+def __getattr__(name):
+    # 按需导入：import LLM.chat_store 等轻量模块时不加载 LLM_reports 及其依赖
+    if name == "ReportAnalyzer":
+        from .LLM_reports import ReportAnalyzer
+        return ReportAnalyzer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,166 @@
+"""
+answer_cache.py
+
+对话回答的语义缓存：
+1. 按问题涉及的（股票代码、年份）分区，分区内先按规范化问题精确匹配，再按问题向量的余弦相似度匹配，
+   相似度超过阈值时直接返回已保存的回答，跳过意图识别、agent 循环与检索
+2. 入库某公司某年的年报时，删除该公司该年份及不限年份分区内的回答；没有识别出公司的问题放在公共分区，只按有效期过期
+3. 使用 SQLite 持久化（results/answer_cache.sqlite），同一台机器上的多个会话共享
+4. 依赖上下文的追问（"它""刚才""继续"等）不查缓存也不写入
+"""
+
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from LLM.intent_classifier import normalize_message
+
+# 指代前文的追问，回答依赖对话历史
+# “其”只在作代词时匹配，排除“其他”“其余”“其次”“其实”“尤其”“极其”“与其”“及其”等普通词
+_CONTEXT_DEPENDENT_PATTERN = re.compile(
+    r"它|(?<![尤极与及何])其(?![他它余次实])|该公司|这家|那家|上面|上述|刚才|之前|前面|继续|还有呢|那么|换成"
+)
+
+
+def is_context_dependent(message: str) -> bool:
+    """判断消息是否依赖对话上下文"""
+    return bool(_CONTEXT_DEPENDENT_PATTERN.search(message or ""))
+
+
+class SemanticAnswerCache:
+    """按公司、年份分区的语义回答缓存"""
+
+    def __init__(self, database_path: str, embed_fn: Callable[[str], List[float]], threshold: float = 0.92,
+                 ttl_seconds: float = 24 * 3600, max_entries_per_scope: int = 200):
+        """
+        初始化缓存
+        :param database_path: SQLite 文件路径
+        :param embed_fn: 向量计算函数
+        :param threshold: 命中所需的最低余弦相似度
+        :param ttl_seconds: 回答有效期（秒）
+        :param max_entries_per_scope: 每个分区保留的最大条目数，超出时删除最早的回答
+        """
+        self.database_path = database_path
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_scope = max_entries_per_scope
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    stock_code TEXT, year INTEGER, question TEXT, normalized TEXT,
+                    embedding BLOB, answer TEXT, created_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_scope ON answers (stock_code, year)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.database_path)
+
+    def _embed(self, normalized: str) -> np.ndarray:
+        vector = np.asarray(self.embed_fn(normalized), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, question: str, stock_code: Optional[str] = None, year: Optional[int] = None) -> Optional[Dict]:
+        """
+        查找相似问题的回答
+        :param question: 用户问题
+        :param stock_code: 问题涉及的股票代码
+        :param year: 问题涉及的年份
+        :return: {'answer', 'question', 'similarity'}，未命中时返回 None
+        """
+        normalized = normalize_message(question)
+        if not normalized:
+            return None
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT question, normalized, embedding, answer FROM answers "
+                "WHERE stock_code = ? AND year = ? AND created_at > ?",
+                (stock_code or "", year or 0, time.time() - self.ttl_seconds)
+            ).fetchall()
+
+        result = None
+        for cached_question, cached_normalized, _, answer in rows:
+            if cached_normalized == normalized:
+                result = {'answer': answer, 'question': cached_question, 'similarity': 1.0}
+                break
+        if result is None and rows:
+            vector = self._embed(normalized)
+            matrix = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                result = {'answer': rows[best][3], 'question': rows[best][0], 'similarity': float(similarities[best])}
+
+        with self._lock:
+            if result:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if result:
+            logging.info(f"回答缓存命中（相似度 {result['similarity']:.3f}）：{question} ≈ {result['question']}")
+        return result
+
+    def store(self, question: str, answer: str, stock_code: Optional[str] = None, year: Optional[int] = None) -> None:
+        """
+        保存回答
+        :param question: 用户问题
+        :param answer: 回答
+        :param stock_code: 问题涉及的股票代码
+        :param year: 问题涉及的年份
+        """
+        normalized = normalize_message(question)
+        if not normalized or not answer:
+            return
+        embedding = self._embed(normalized).tobytes()
+        scope = (stock_code or "", year or 0)
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM answers WHERE stock_code = ? AND year = ? AND normalized = ?",
+                         (*scope, normalized))
+            conn.execute(
+                "INSERT INTO answers (stock_code, year, question, normalized, embedding, answer, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*scope, question, normalized, embedding, answer, time.time())
+            )
+            conn.execute(
+                "DELETE FROM answers WHERE stock_code = ? AND year = ? AND id NOT IN "
+                "(SELECT id FROM answers WHERE stock_code = ? AND year = ? ORDER BY id DESC LIMIT ?)",
+                (*scope, *scope, self.max_entries_per_scope)
+            )
+
+    def invalidate(self, stock_code: str, year: Optional[int] = None) -> int:
+        """
+        删除某公司（某年份及不限年份）分区内的回答，在入库新年报时调用
+        :param stock_code: 股票代码
+        :param year: 年份，为 None 时删除该公司全部回答
+        :return: 删除的条目数
+        """
+        with self._lock, self._connect() as conn:
+            if year:
+                cursor = conn.execute("DELETE FROM answers WHERE stock_code = ? AND year IN (?, 0)",
+                                      (stock_code, year))
+            else:
+                cursor = conn.execute("DELETE FROM answers WHERE stock_code = ?", (stock_code,))
+            removed = cursor.rowcount
+        if removed:
+            logging.info(f"年报入库，清除 {stock_code} {year or ''} 的 {removed} 条缓存回答")
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
@@ -23,16 +23,16 @@ streamlit run app.py 启动streamlit应用
 
 import os
 import sys
+import uuid
 import streamlit as st
-from langchain_community.chat_message_histories import StreamlitChatMessageHistory
-from langchain.callbacks.streamlit import StreamlitCallbackHandler
 
 # 添加项目根目录到Python路径
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_dir not in sys.path:
     sys.path.insert(0, root_dir)
 
-from LLM.LLM_reports import ReportAnalyzer
+from LLM.job_queue import JobQueue, build_default_handlers
+from LLM.chat_store import ChatStore, SQLiteChatMessageHistory
 
 # 设置页面配置
 st.set_page_config(
@@ -41,24 +41,59 @@ st.set_page_config(
     layout="wide"
 )
 
-# 初始化会话状态
-if "analyzer" not in st.session_state:
-    # 设置目录路径
-    base_dir = os.path.dirname(os.path.dirname(__file__))
-    txt_dir = os.path.join(base_dir, 'results', 'txt_reports')
-    results_dir = os.path.join(base_dir, 'results')
-    
-    # 初始化消息历史和回调处理器
-    messages = StreamlitChatMessageHistory()
-    callback_handler = StreamlitCallbackHandler(st.container())
-    
-    # 初始化分析器
-    st.session_state.analyzer = ReportAnalyzer(
-        txt_dir=txt_dir,
-        results_dir=results_dir,
-        message_history=messages,
-        callback_handler=callback_handler
-    )
+# 设置目录路径
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+txt_dir = os.path.join(base_dir, 'results', 'txt_reports')
+results_dir = os.path.join(base_dir, 'results')
+
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """
+    进程内共享的后台任务队列：公司完整分析、股票筛选等长任务在工作线程中执行，不阻塞会话；
+    JOB_WORKERS=0 时只提交任务，由独立进程 python -m LLM.job_queue 执行
+    """
+    def create_analyzer():
+        from LLM.LLM_reports import ReportAnalyzer
+        return ReportAnalyzer(txt_dir=txt_dir, results_dir=results_dir)
+
+    handlers = build_default_handlers(create_analyzer)
+    return JobQueue(os.path.join(results_dir, 'jobs.sqlite'), handlers,
+                    workers=int(os.getenv("JOB_WORKERS", "2"))).start()
+
+
+@st.cache_resource
+def get_chat_store() -> ChatStore:
+    """进程内共享的对话存储，消息持久化到 results/chat_history.sqlite"""
+    return ChatStore(os.path.join(results_dir, 'chat_history.sqlite'))
+
+
+job_queue = get_job_queue()
+# 会话ID写入页面地址，刷新页面后对话历史与之前提交的任务仍在
+if "session_id" not in st.session_state:
+    st.session_state.session_id = st.query_params.get("session") or uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.session_id
+
+# 初始化消息历史（工具调用进度改由 chat_stream 的事件渲染）
+if "chat_history" not in st.session_state:
+    st.session_state.chat_history = SQLiteChatMessageHistory(get_chat_store(), st.session_state.session_id)
+
+
+def get_analyzer():
+    """
+    首次提问时才导入并创建分析器（加载向量模型、向量库与 agent），页面与对话历史无需等待
+    """
+    if "analyzer" not in st.session_state:
+        from LLM.LLM_reports import ReportAnalyzer
+
+        with st.spinner("正在加载分析模型..."):
+            st.session_state.analyzer = ReportAnalyzer(
+                txt_dir=txt_dir,
+                results_dir=results_dir,
+                message_history=st.session_state.chat_history
+            )
+    return st.session_state.analyzer
+
 
 # 创建侧边栏
 with st.sidebar:
@@ -76,11 +111,44 @@ with st.sidebar:
     - 支持多轮对话和上下文理解
     """)
 
+    # 后台任务：提交后立即返回，进度与结果保存在 results/jobs.sqlite，页面刷新后仍可查看
+    st.markdown("### 后台任务")
+    with st.form("submit_job", clear_on_submit=True):
+        job_kind = st.selectbox("任务类型", ["公司完整分析", "股票筛选"])
+        job_input = st.text_input("股票代码 / 筛选条件", placeholder="000001 或 screen:白酒")
+        if st.form_submit_button("提交任务") and job_input.strip():
+            if job_kind == "公司完整分析":
+                job_id = job_queue.submit("process_company", {'stock_code': job_input.strip()},
+                                          owner=st.session_state.session_id)
+            else:
+                job_id = job_queue.submit("screen", {'query': job_input.strip()}, owner=st.session_state.session_id)
+            st.success(f"已提交任务 {job_id}")
+
+    @st.fragment(run_every=3)
+    def show_jobs():
+        """定期轮询并显示本会话提交的任务"""
+        status_labels = {'queued': "排队中", 'running': "运行中", 'done': "已完成", 'failed': "失败", 'cancelled': "已取消"}
+        for job in job_queue.list_jobs(owner=st.session_state.session_id, limit=10):
+            title = job['params'].get('stock_code') or job['params'].get('query', "")
+            with st.expander(f"{status_labels[job['status']]} · {job['kind']} {title}",
+                             expanded=job['status'] == 'running'):
+                if job['status'] == 'running':
+                    st.progress(job['progress'], text=job['message'])
+                elif job['status'] == 'queued':
+                    if st.button("取消", key=f"cancel_{job['id']}"):
+                        job_queue.cancel(job['id'])
+                elif job['status'] == 'failed':
+                    st.error(job['error'])
+                elif job['status'] == 'done' and job['result']:
+                    st.markdown(job['result'].get('report') or job['result'].get('text', ""))
+
+    show_jobs()
+
 # 主聊天界面
 st.title("💬 与AI助手对话")
 
-# 显示聊天历史
-for message in st.session_state.analyzer.memory.chat_memory.messages:
+# 显示聊天历史（包含已压缩进摘要的较早消息）
+for message in st.session_state.chat_history.display_messages():
     with st.chat_message(message.type):
         st.markdown(message.content)
 
@@ -90,14 +158,33 @@ if prompt := st.chat_input("请输入您的问题"):
     with st.chat_message("human"):
         st.markdown(prompt)
     
-    # 显示助手回复
+    # 显示助手回复：逐 token 渲染，工具调用进度显示在状态框中
     with st.chat_message("assistant"):
+        status = st.status("思考中...", expanded=False)
         response_container = st.empty()
-        with st.spinner("思考中..."):
-            response = st.session_state.analyzer.chat(prompt)
-            response_container.markdown(response)
+        response = ""
+        # agent 在后台线程中只产出事件，页面元素都在这里（脚本线程）更新，后台线程无需绑定会话上下文
+        for event in get_analyzer().chat_stream(prompt):
+            if event['type'] == 'token':
+                response += event['text']
+                response_container.markdown(response + "▌")
+            elif event['type'] == 'tool_start':
+                status.update(label=f"正在调用工具：{event['name']}")
+                status.write(f"🔧 {event['name']}：{event['input']}")
+            elif event['type'] == 'tool_end':
+                status.write(f"✅ {event['name']} 完成")
+            elif event['type'] == 'tool_error':
+                status.write(f"❌ {event['name']} 出错：{event['error']}")
+            elif event['type'] == 'final':
+                response = event['text']
+                ttft = f"，首字 {event['ttft']:.1f}s" if event['ttft'] is not None else ""
+                status.update(label=f"完成（耗时 {event['elapsed']:.1f}s{ttft}）", state="complete")
+        response_container.markdown(response)
 
 # 添加清除对话按钮
 if st.button("清除对话历史"):
-    st.session_state.analyzer.memory.clear()
+    if "analyzer" in st.session_state:
+        st.session_state.analyzer.memory.clear()
+    else:
+        st.session_state.chat_history.clear()
     st.rerun() 
\ No newline at end of file
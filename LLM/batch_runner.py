@@ -0,0 +1,342 @@
+"""
+batch_runner.py
+
+多公司批量分析的流水线：
+1. download：下载年报（网络 IO），每家公司产出若干 PDF
+2. parse：解析 PDF 目录与章节（CPU 密集，默认在子进程中运行），保存章节JSON与txt
+3. embed：按章节切分并写入向量库
+4. analyze：某家公司的全部年报入库后，执行 process_company（LLM 调用）；
+   多个分析线程时每个线程使用 analyzer_factory 创建的独立分析器，不共用一个 ReportAnalyzer
+各阶段之间使用有界队列连接、各自设置并发数，使下载、解析、向量化与 LLM 分析重叠执行；
+运行结束后输出各阶段的处理数量、吞吐量、忙碌时间与队列深度。
+
+用法：
+python -m LLM.batch_runner 000001 600519 002594 --download-workers 2 --parse-workers 4
+python -m LLM.batch_runner 000001 600519 --analyze-workers 2   # 每个分析线程各自创建 ReportAnalyzer
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import time
+import queue
+import logging
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# 添加项目根目录到Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from reports.download_reports import ensure_stock_reports
+from reports.pdf_parser import process_pdf
+from LLM.report_store import parse_report_filename
+
+STAGES = ("download", "parse", "embed", "analyze")
+
+
+class _Stage:
+    """流水线中的一个阶段：一个有界输入队列和若干工作线程"""
+
+    def __init__(self, name: str, func: Callable[[Any, Callable[[Any], None]], None], workers: int,
+                 queue_size: int):
+        """
+        :param name: 阶段名称
+        :param func: 处理函数 func(item, emit)，通过 emit 把结果交给下一阶段
+        :param workers: 工作线程数
+        :param queue_size: 输入队列容量，队列满时上游阻塞
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(workers, 1)
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.emit: Callable[[Any], None] = lambda item: None
+        self.threads: List[threading.Thread] = []
+        self.lock = threading.Lock()
+        self.stats = {'processed': 0, 'errors': 0, 'busy_time': 0.0,
+                      'max_queue_depth': 0, 'queue_depth_total': 0, 'queue_samples': 0}
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, item: Any) -> None:
+        self.queue.put(item)
+
+    def close(self) -> None:
+        """发送结束标记并等待全部工作线程退出"""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def sample_queue(self) -> int:
+        depth = self.queue.qsize()
+        with self.lock:
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], depth)
+            self.stats['queue_depth_total'] += depth
+            self.stats['queue_samples'] += 1
+        return depth
+
+    def _work(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            start = time.perf_counter()
+            failed = False
+            try:
+                self.func(item, self.emit)
+            except Exception as e:
+                failed = True
+                logging.error(f"[{self.name}] 处理 {item!r} 时出错: {str(e)}")
+            with self.lock:
+                self.stats['processed'] += 1
+                self.stats['errors'] += 1 if failed else 0
+                self.stats['busy_time'] += time.perf_counter() - start
+
+
+class BatchRunner:
+    """多公司年报分析的流水线执行器"""
+
+    def __init__(self, analyzer, download_workers: int = 2, parse_workers: int = 2, embed_workers: int = 1,
+                 analyze_workers: int = 1, queue_size: int = 8, parse_in_processes: bool = True,
+                 analyzer_factory: Optional[Callable[[], Any]] = None,
+                 downloader: Optional[Callable[[str], Any]] = None,
+                 parser: Optional[Callable[[str], List[Dict[str, Any]]]] = None,
+                 pdf_dir: Optional[str] = None, monitor_interval: float = 5.0):
+        """
+        初始化执行器
+        :param analyzer: ReportAnalyzer 实例
+        :param download_workers: 下载并发数
+        :param parse_workers: 解析并发数
+        :param embed_workers: 向量化并发数
+        :param analyze_workers: LLM 分析并发数，大于 1 时需提供 analyzer_factory
+        :param queue_size: 各阶段输入队列容量
+        :param parse_in_processes: 是否在子进程中解析 PDF（解析受 GIL 限制）
+        :param analyzer_factory: 创建 ReportAnalyzer 的函数，每个分析线程首次分析时各创建一个
+        :param downloader: 下载函数，输入股票代码，默认 ensure_stock_reports
+        :param parser: PDF 解析函数，默认 process_pdf
+        :param pdf_dir: PDF 目录，默认 {results_dir}/pdf_reports
+        :param monitor_interval: 队列深度采样与日志间隔（秒）
+        """
+        if analyze_workers > 1 and analyzer_factory is None:
+            raise ValueError("analyze_workers 大于 1 时需提供 analyzer_factory，各分析线程不能共用一个分析器")
+        self.analyzer = analyzer
+        self.analyzer_factory = analyzer_factory
+        self._analyzer_local = threading.local()
+        self.downloader = downloader or (lambda code: ensure_stock_reports(code, analyzer.results_dir, delete_pdf=False))
+        self.parser = parser or process_pdf
+        self.pdf_dir = pdf_dir or os.path.join(analyzer.results_dir, 'pdf_reports')
+        self.parse_in_processes = parse_in_processes
+        self.monitor_interval = monitor_interval
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+
+        self.stages = {
+            'download': _Stage('download', self._download, download_workers, queue_size),
+            'parse': _Stage('parse', self._parse, parse_workers, queue_size),
+            'embed': _Stage('embed', self._embed, embed_workers, queue_size),
+            'analyze': _Stage('analyze', self._analyze, analyze_workers, queue_size),
+        }
+        for current, following in zip(STAGES, STAGES[1:]):
+            self.stages[current].emit = self.stages[following].put
+
+        # 每家公司尚未入库的年报数，归零后进入 analyze 阶段
+        self._pending: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+
+    # ---- 各阶段处理函数 ----
+
+    def _download(self, code: str, emit: Callable[[Any], None]) -> None:
+        """下载年报，把该公司的每份 PDF 交给解析阶段"""
+        self.downloader(code)
+        pdf_paths = sorted(glob.glob(os.path.join(self.pdf_dir, f"{code}_*.pdf")))
+        if not pdf_paths:
+            logging.warning(f"未找到公司 {code} 的年报PDF，直接使用已有txt分析")
+            self.stages['analyze'].put(code)
+            return
+
+        with self._pending_lock:
+            self._pending[code] = len(pdf_paths)
+        for pdf_path in pdf_paths:
+            emit((code, pdf_path))
+
+    def _parse(self, item, emit: Callable[[Any], None]) -> None:
+        """解析 PDF 章节；已有章节JSON时直接读取"""
+        code, pdf_path = item
+        stem = os.path.splitext(os.path.basename(pdf_path))[0]
+        json_path = os.path.join(self.analyzer.json_dir, f"{stem}_chapters.json")
+        sections = None
+        if os.path.exists(json_path):
+            try:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    sections = json.load(f).get('outline')
+            except Exception as e:
+                logging.warning(f"读取章节JSON {json_path} 失败，重新解析: {str(e)}")
+
+        try:
+            if not sections:
+                if self._parse_pool is not None:
+                    sections = self._parse_pool.submit(self.parser, pdf_path).result()
+                else:
+                    sections = self.parser(pdf_path)
+                self._save_sections(pdf_path, json_path, sections)
+        except Exception:
+            # 解析失败的年报不再进入下游，仍需计入该公司已结束的年报数
+            self._finish_report(code)
+            raise
+        emit((code, pdf_path, sections))
+
+    def _save_sections(self, pdf_path: str, json_path: str, sections: List[Dict[str, Any]]) -> None:
+        """保存章节JSON（供章节路由使用），txt 不存在时按章节拼接生成（供单年报分析使用）"""
+        os.makedirs(os.path.dirname(json_path), exist_ok=True)
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({'pdf_metadata': {'file_name': os.path.basename(pdf_path)},
+                       'outline': [{'content': s.get('content', ""), 'metadata': s.get('metadata', {})}
+                                   for s in sections]},
+                      f, ensure_ascii=False, indent=2)
+
+        txt_path = os.path.join(self.analyzer.txt_dir, re.sub(r'\.pdf$', '.txt', os.path.basename(pdf_path)))
+        if not os.path.exists(txt_path):
+            os.makedirs(self.analyzer.txt_dir, exist_ok=True)
+            with open(txt_path, 'w', encoding='utf-8') as f:
+                f.write("\n\n".join(s.get('content') or "" for s in sections))
+
+    def _embed(self, item, emit: Callable[[Any], None]) -> None:
+        """写入向量库；该年份已入库时跳过"""
+        code, pdf_path, sections = item
+        try:
+            year = parse_report_filename(pdf_path)['year']
+            if year in self.analyzer.report_store.index.get(code, {}).get('years', []):
+                logging.info(f"{os.path.basename(pdf_path)} 已入库，跳过向量化")
+            elif sections:
+                self.analyzer.store_sections(pdf_path, sections)
+        finally:
+            self._finish_report(code)
+
+    def _finish_report(self, code: str) -> None:
+        """记录一份年报处理结束（成功或失败），该公司全部年报结束后进入 analyze 阶段"""
+        with self._pending_lock:
+            self._pending[code] -= 1
+            done = self._pending[code] == 0
+        if done:
+            self.stages['analyze'].put(code)
+
+    def _analyze(self, code: str, emit: Callable[[Any], None]) -> None:
+        self._worker_analyzer().process_company(code)
+
+    def _worker_analyzer(self):
+        """当前分析线程使用的分析器：未提供 analyzer_factory 时为 self.analyzer，否则每个线程各创建一个"""
+        if self.analyzer_factory is None:
+            return self.analyzer
+        analyzer = getattr(self._analyzer_local, 'analyzer', None)
+        if analyzer is None:
+            analyzer = self._analyzer_local.analyzer = self.analyzer_factory()
+        return analyzer
+
+    # ---- 运行与统计 ----
+
+    def _monitor(self, stop: threading.Event) -> None:
+        """定期采样各阶段队列深度"""
+        last_log = time.perf_counter()
+        while not stop.wait(min(self.monitor_interval, 0.5)):
+            depths = {name: stage.sample_queue() for name, stage in self.stages.items()}
+            if time.perf_counter() - last_log >= self.monitor_interval:
+                last_log = time.perf_counter()
+                logging.info("流水线队列深度: " + ", ".join(f"{name} {depth}" for name, depth in depths.items()))
+
+    def run(self, stock_codes: List[str]) -> Dict[str, Any]:
+        """
+        批量处理多家公司
+        :param stock_codes: 股票代码列表
+        :return: {'wall_time': 总耗时, 'stages': {阶段: 统计}}
+        """
+        if self.parse_in_processes:
+            self._parse_pool = ProcessPoolExecutor(max_workers=self.stages['parse'].workers)
+
+        stop = threading.Event()
+        monitor = threading.Thread(target=self._monitor, args=(stop,), daemon=True)
+        start = time.perf_counter()
+        for stage in self.stages.values():
+            stage.start()
+        monitor.start()
+
+        try:
+            # 同一公司只入队一次：_pending 按公司计数，重复入队会相互覆盖
+            for code in dict.fromkeys(str(code).zfill(6) for code in stock_codes):
+                self.stages['download'].put(code)
+            # 按顺序关闭：上游全部结束后，下游不会再收到新任务
+            for name in STAGES:
+                self.stages[name].close()
+        finally:
+            stop.set()
+            monitor.join()
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown()
+                self._parse_pool = None
+
+        wall_time = time.perf_counter() - start
+        report = {'wall_time': round(wall_time, 3), 'stages': {}}
+        for name, stage in self.stages.items():
+            stats = stage.stats
+            report['stages'][name] = {
+                'workers': stage.workers,
+                'processed': stats['processed'],
+                'errors': stats['errors'],
+                'busy_time': round(stats['busy_time'], 3),
+                'throughput': round(stats['processed'] / wall_time, 3) if wall_time else 0.0,
+                'utilization': round(stats['busy_time'] / (wall_time * stage.workers), 3) if wall_time else 0.0,
+                'max_queue_depth': stats['max_queue_depth'],
+                'avg_queue_depth': round(stats['queue_depth_total'] / stats['queue_samples'], 2)
+                if stats['queue_samples'] else 0.0,
+            }
+        self.log_report(report)
+        return report
+
+    @staticmethod
+    def log_report(report: Dict[str, Any]) -> None:
+        """以日志形式输出各阶段统计"""
+        logging.info(f"批量处理完成，总耗时 {report['wall_time']:.1f}s")
+        for name, stats in report['stages'].items():
+            logging.info(
+                f"[{name}] 并发 {stats['workers']}, 处理 {stats['processed']} 项（错误 {stats['errors']}）, "
+                f"吞吐 {stats['throughput']:.2f}/s, 利用率 {stats['utilization']:.0%}, "
+                f"队列深度 平均 {stats['avg_queue_depth']} 最大 {stats['max_queue_depth']}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多公司年报批量分析")
+    parser.add_argument('stock_codes', nargs='+', help="股票代码")
+    parser.add_argument('--download-workers', type=int, default=2)
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--embed-workers', type=int, default=1)
+    parser.add_argument('--analyze-workers', type=int, default=1,
+                        help="LLM 分析并发数，大于 1 时每个分析线程各自创建 ReportAnalyzer")
+    parser.add_argument('--queue-size', type=int, default=8)
+    args = parser.parse_args()
+
+    from LLM.LLM_reports import ReportAnalyzer
+
+    results_dir = os.path.join(root_dir, 'results')
+    def create_analyzer():
+        return ReportAnalyzer(txt_dir=os.path.join(results_dir, 'txt_reports'), results_dir=results_dir)
+
+    runner = BatchRunner(create_analyzer(), download_workers=args.download_workers, parse_workers=args.parse_workers,
+                         embed_workers=args.embed_workers, analyze_workers=args.analyze_workers,
+                         queue_size=args.queue_size,
+                         analyzer_factory=create_analyzer if args.analyze_workers > 1 else None)
+    report = runner.run(args.stock_codes)
+    with open(os.path.join(results_dir, 'batch_report.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+chat_store.py
+
+SQLite 持久化的跨会话对话存储（results/chat_history.sqlite）：
+1. 消息按会话ID保存，页面刷新、应用重启后仍在，Streamlit 进程与批量任务进程可按会话ID共享同一段对话
+2. (session_id, compacted, id) 索引：读取最近消息只走索引取末尾若干条，耗时与对话总长度无关
+3. 后台压缩：未压缩消息中超出保留预算的较早部分累计到一定量后，在后台线程调用摘要函数合并进会话摘要，
+   并标记为已压缩；已压缩的消息仍保留，供界面回看
+4. 多个进程同时压缩同一会话时按摘要版本号做乐观并发控制，只有一个结果生效
+
+配合 TokenBudgetMemory 使用时，注入提示词的 chat_history = 会话摘要 + 预算内的未压缩消息，
+由本模块负责摘要，TokenBudgetMemory 不再自行摘要。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+from LLM.token_utils import estimate_tokens, truncate_to_tokens
+
+# 所有会话共用的压缩线程，压缩请求按会话去重
+_compaction_executor: Optional[ThreadPoolExecutor] = None
+_compaction_executor_lock = threading.Lock()
+
+
+def _get_compaction_executor() -> ThreadPoolExecutor:
+    global _compaction_executor
+    with _compaction_executor_lock:
+        if _compaction_executor is None:
+            _compaction_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-compaction")
+        return _compaction_executor
+
+
+class ChatStore:
+    """按会话保存消息与摘要的 SQLite 存储"""
+
+    def __init__(self, database_path: str, token_counter: Callable[[str], int] = estimate_tokens):
+        """
+        初始化存储
+        :param database_path: SQLite 文件路径
+        :param token_counter: 写入消息时计算 token 数，用于压缩判断
+        """
+        self.database_path = database_path
+        self.token_counter = token_counter
+        directory = os.path.dirname(database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, message TEXT,
+                    tokens INTEGER, compacted INTEGER DEFAULT 0, created_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session "
+                         "ON messages (session_id, compacted, id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY, summary TEXT DEFAULT '', version INTEGER DEFAULT 0,
+                    message_count INTEGER DEFAULT 0, updated_at REAL
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.database_path, timeout=30, isolation_level=None)
+
+    def add_messages(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        """追加消息"""
+        now = time.time()
+        rows = [(session_id, json.dumps(message_to_dict(message), ensure_ascii=False),
+                 self.token_counter(str(message.content)) + 4, now) for message in messages]
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT INTO messages (session_id, message, tokens, created_at) VALUES (?, ?, ?, ?)",
+                             rows)
+            conn.execute(
+                "INSERT INTO sessions (session_id, message_count, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET message_count = message_count + excluded.message_count, "
+                "updated_at = excluded.updated_at",
+                (session_id, len(rows), now)
+            )
+            conn.execute("COMMIT")
+
+    def recent_messages(self, session_id: str, limit: int, include_compacted: bool = False) -> List[BaseMessage]:
+        """
+        按时间顺序返回最近的消息，只读取索引末尾的 limit 条
+        :param session_id: 会话ID
+        :param limit: 最大条数
+        :param include_compacted: 是否包含已压缩进摘要的消息（界面回看时使用）
+        """
+        with self._connect() as conn:
+            if include_compacted:
+                rows = conn.execute("SELECT message FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                                    (session_id, limit)).fetchall()
+            else:
+                rows = conn.execute("SELECT message FROM messages WHERE session_id = ? AND compacted = 0 "
+                                    "ORDER BY id DESC LIMIT ?", (session_id, limit)).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in reversed(rows)])
+
+    def get_summary(self, session_id: str) -> str:
+        with self._connect() as conn:
+            row = conn.execute("SELECT summary FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row and row[0] else ""
+
+    def clear(self, session_id: str) -> None:
+        """删除会话的全部消息与摘要"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.execute("COMMIT")
+
+    def list_sessions(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """按最近更新时间列出会话"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT session_id, message_count, updated_at FROM sessions "
+                                "ORDER BY updated_at DESC LIMIT ?", (limit,)).fetchall()
+        return [{'session_id': row[0], 'message_count': row[1], 'updated_at': row[2]} for row in rows]
+
+    def compact(self, session_id: str, summarize_fn: Callable[[str, List[BaseMessage]], str],
+                keep_tokens: int, batch_tokens: int, max_summary_tokens: int) -> int:
+        """
+        把超出保留预算的较早未压缩消息合并进会话摘要
+        :param session_id: 会话ID
+        :param summarize_fn: (已有摘要, 待合并的消息) -> 新摘要
+        :param keep_tokens: 保留为原文的最近消息 token 数
+        :param batch_tokens: 待压缩消息累计达到该 token 数才压缩
+        :param max_summary_tokens: 摘要的 token 上限
+        :return: 本次压缩的消息数
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, message, tokens FROM messages WHERE session_id = ? AND compacted = 0 "
+                                "ORDER BY id", (session_id,)).fetchall()
+            session = conn.execute("SELECT summary, version FROM sessions WHERE session_id = ?",
+                                   (session_id,)).fetchone()
+        if not rows or session is None:
+            return 0
+
+        # 从最新消息向前保留 keep_tokens 以内的原文，最新一条始终保留
+        boundary, used = len(rows) - 1, rows[-1][2]
+        while boundary > 0 and used + rows[boundary - 1][2] <= keep_tokens:
+            boundary -= 1
+            used += rows[boundary][2]
+        pending = rows[:boundary]
+        if not pending or sum(row[2] for row in pending) < batch_tokens:
+            return 0
+
+        summary, version = session[0] or "", session[1]
+        new_summary = summarize_fn(summary, messages_from_dict([json.loads(row[1]) for row in pending]))
+        new_summary = truncate_to_tokens(new_summary.strip(), max_summary_tokens, self.token_counter)
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            updated = conn.execute("UPDATE sessions SET summary = ?, version = version + 1 "
+                                   "WHERE session_id = ? AND version = ?", (new_summary, session_id, version))
+            if updated.rowcount == 0:
+                # 其他进程已先完成压缩，放弃本次结果
+                conn.execute("ROLLBACK")
+                return 0
+            conn.execute("UPDATE messages SET compacted = 1 WHERE session_id = ? AND compacted = 0 AND id <= ?",
+                         (session_id, pending[-1][0]))
+            conn.execute("COMMIT")
+        logging.info(f"会话 {session_id} 已压缩 {len(pending)} 条消息，摘要 {self.token_counter(new_summary)} tokens")
+        return len(pending)
+
+
+class SQLiteChatMessageHistory(BaseChatMessageHistory):
+    """ChatStore 中一个会话的消息历史，写入后在后台压缩较早的消息"""
+
+    # TokenBudgetMemory 据此使用本历史的摘要，不再自行摘要
+    compacts_in_background = True
+
+    def __init__(self, store: ChatStore, session_id: str, max_messages: int = 200):
+        """
+        :param store: 对话存储
+        :param session_id: 会话ID
+        :param max_messages: messages 返回的未压缩消息上限，压缩滞后时保证读取量有界
+        """
+        self.store = store
+        self.session_id = session_id
+        self.max_messages = max_messages
+        self.summarize_fn: Optional[Callable[[str, List[BaseMessage]], str]] = None
+        self.keep_tokens = 1500
+        self.batch_tokens = 500
+        self.max_summary_tokens = 500
+        self._pending = False
+        self._lock = threading.Lock()
+
+    def configure_compaction(self, summarize_fn: Callable[[str, List[BaseMessage]], str], keep_tokens: int,
+                             batch_tokens: int, max_summary_tokens: int) -> None:
+        """
+        设置压缩参数，未设置摘要函数时不压缩
+        :param summarize_fn: (已有摘要, 待合并的消息) -> 新摘要
+        :param keep_tokens: 保留为原文的最近消息 token 数
+        :param batch_tokens: 待压缩消息累计达到该 token 数才压缩
+        :param max_summary_tokens: 摘要的 token 上限
+        """
+        self.summarize_fn = summarize_fn
+        self.keep_tokens = keep_tokens
+        self.batch_tokens = batch_tokens
+        self.max_summary_tokens = max_summary_tokens
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """尚未压缩的最近消息"""
+        return self.store.recent_messages(self.session_id, self.max_messages)
+
+    @property
+    def summary(self) -> str:
+        """已压缩消息的摘要"""
+        return self.store.get_summary(self.session_id)
+
+    def display_messages(self, limit: int = 100) -> List[BaseMessage]:
+        """界面显示用的最近消息，包含已压缩的消息"""
+        return self.store.recent_messages(self.session_id, limit, include_compacted=True)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.store.add_messages(self.session_id, messages)
+        self.schedule_compaction()
+
+    def clear(self) -> None:
+        self.store.clear(self.session_id)
+
+    def compact(self) -> int:
+        """立即压缩，返回压缩的消息数"""
+        if self.summarize_fn is None:
+            return 0
+        try:
+            return self.store.compact(self.session_id, self.summarize_fn, self.keep_tokens,
+                                      self.batch_tokens, self.max_summary_tokens)
+        except Exception as e:
+            # 压缩失败时消息保持未压缩，下次写入后重试
+            logging.error(f"压缩会话 {self.session_id} 时出错: {str(e)}")
+            return 0
+
+    def schedule_compaction(self) -> None:
+        """在后台线程压缩，同一会话同时只排队一次"""
+        if self.summarize_fn is None:
+            return
+        with self._lock:
+            if self._pending:
+                return
+            self._pending = True
+
+        def run():
+            with self._lock:
+                self._pending = False
+            self.compact()
+
+        _get_compaction_executor().submit(run)
@@ -0,0 +1,125 @@
+"""
+chat_stream.py
+
+对话的流式输出：
+1. StreamEventHandler 通过 langchain 回调把 LLM token 与工具调用转换为事件，供界面逐步渲染
+2. structured chat agent 的输出是 {"action": ..., "action_input": ...} 形式的 JSON，
+   FinalAnswerExtractor 只把 "Final Answer" 的 action_input 正文按 token 增量取出，工具调用的 JSON 不展示
+
+事件格式：
+- {'type': 'token', 'text': 文本片段}
+- {'type': 'tool_start', 'name': 工具名, 'input': 输入}
+- {'type': 'tool_end', 'name': 工具名, 'output': 输出摘要}
+- {'type': 'tool_error', 'name': 工具名, 'error': 错误信息}
+- {'type': 'final', 'text': 完整回复, 'ttft': 首 token 延迟（秒，无流式 token 时为 None）, 'elapsed': 总耗时}
+"""
+
+import re
+import threading
+from typing import Any, Callable, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+_FINAL_ANSWER_PATTERN = re.compile(r'"action"\s*:\s*"Final Answer"\s*,\s*"action_input"\s*:\s*"')
+_ESCAPES = {'n': "\n", 't': "\t", 'r': "\r", 'b': "\b", 'f': "\f", '"': '"', '\\': "\\", '/': "/"}
+
+
+class FinalAnswerExtractor:
+    """从流式 JSON 输出中增量提取 Final Answer 的 action_input 字符串"""
+
+    def __init__(self):
+        self._buffer = ""
+        self._started = False
+        self._done = False
+        self._escape: Optional[str] = None
+
+    def feed(self, token: str) -> str:
+        """
+        输入一个 token，返回新增的答案文本（尚未进入答案或答案已结束时返回空字符串）
+        :param token: LLM 输出的 token
+        :return: 新增答案文本
+        """
+        if self._done:
+            return ""
+        if not self._started:
+            self._buffer += token
+            match = _FINAL_ANSWER_PATTERN.search(self._buffer)
+            if not match:
+                return ""
+            self._started = True
+            token = self._buffer[match.end():]
+            self._buffer = ""
+        return self._consume(token)
+
+    def _consume(self, text: str) -> str:
+        """解析 JSON 字符串内容，处理转义，遇到未转义的引号时结束"""
+        output = []
+        for char in text:
+            if self._escape is not None:
+                self._escape += char
+                if self._escape[0] == 'u':
+                    if len(self._escape) == 5:
+                        try:
+                            output.append(chr(int(self._escape[1:], 16)))
+                        except ValueError:
+                            pass
+                        self._escape = None
+                else:
+                    output.append(_ESCAPES.get(char, char))
+                    self._escape = None
+            elif char == '\\':
+                self._escape = ""
+            elif char == '"':
+                self._done = True
+                break
+            else:
+                output.append(char)
+        return "".join(output)
+
+
+class StreamEventHandler(BaseCallbackHandler):
+    """把 LLM token 与工具调用转换为界面事件的回调处理器"""
+
+    def __init__(self, emit: Callable[[Dict[str, Any]], None], max_output_chars: int = 200):
+        """
+        初始化处理器
+        :param emit: 事件回调，如 queue.put
+        :param max_output_chars: 工具输出摘要的最大长度
+        """
+        self.emit = emit
+        self.max_output_chars = max_output_chars
+        self._extractors: Dict[UUID, FinalAnswerExtractor] = {}
+        self._tools: Dict[UUID, str] = {}
+        self._lock = threading.Lock()
+
+    def on_llm_new_token(self, token, *, chunk=None, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            extractor = self._extractors.setdefault(run_id, FinalAnswerExtractor())
+        text = extractor.feed(token)
+        if text:
+            self.emit({'type': 'token', 'text': text})
+
+    def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            self._extractors.pop(run_id, None)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, tags=None,
+                      metadata=None, inputs=None, **kwargs):
+        name = (serialized or {}).get('name', "")
+        with self._lock:
+            self._tools[run_id] = name
+        self.emit({'type': 'tool_start', 'name': name, 'input': input_str})
+
+    def on_tool_end(self, output, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            name = self._tools.pop(run_id, "")
+        text = str(getattr(output, 'content', output))
+        if len(text) > self.max_output_chars:
+            text = text[:self.max_output_chars] + "..."
+        self.emit({'type': 'tool_end', 'name': name, 'output': text})
+
+    def on_tool_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            name = self._tools.pop(run_id, "")
+        self.emit({'type': 'tool_error', 'name': name, 'error': str(error)})
@@ -0,0 +1,99 @@
+"""
+checkpoint_store.py
+
+公司分析各阶段结果的磁盘检查点：
+1. 每个阶段（单年报分析、多年对比、最终报告）的输出保存为 JSON，键为该阶段全部输入的哈希
+   （年报文件内容、章节JSON、提示词模板版本、模型、上游阶段输出等）
+2. 重新运行时输入未变的阶段直接读取检查点，从上次完成的阶段继续
+3. 写入先落临时文件再原子替换，进程中途退出不会留下半个检查点；同一阶段只保留最新一份
+"""
+
+import os
+import json
+import glob
+import hashlib
+import logging
+import shutil
+from datetime import datetime
+from typing import Any, Optional
+
+
+def file_digest(path: Optional[str]) -> str:
+    """
+    计算文件内容的 sha256，文件不存在时返回空字符串
+    :param path: 文件路径
+    :return: 十六进制摘要
+    """
+    if not path or not os.path.exists(path):
+        return ""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CheckpointStore:
+    """按作用域（如公司代码）与阶段保存中间结果的检查点存储"""
+
+    def __init__(self, directory: str):
+        """
+        初始化存储
+        :param directory: 检查点根目录
+        """
+        self.directory = directory
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """由阶段的全部输入生成检查点键"""
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, scope: str, stage: str, key: str) -> str:
+        return os.path.join(self.directory, scope, f"{stage}-{key[:16]}.json")
+
+    def load(self, scope: str, stage: str, key: str) -> Optional[Any]:
+        """
+        读取检查点
+        :param scope: 作用域，如公司代码
+        :param stage: 阶段名称，如 year_2023、comparison、final
+        :param key: make_key 生成的键
+        :return: 保存的结果，不存在或键不一致时返回 None
+        """
+        path = self._path(scope, stage, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data['value'] if data.get('key') == key else None
+        except Exception as e:
+            logging.error(f"读取检查点 {path} 时出错: {str(e)}")
+            return None
+
+    def save(self, scope: str, stage: str, key: str, value: Any) -> None:
+        """
+        保存检查点，并删除该阶段键不同的旧检查点
+        :param scope: 作用域
+        :param stage: 阶段名称
+        :param key: make_key 生成的键
+        :param value: 可 JSON 序列化的结果
+        """
+        path = self._path(scope, stage, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'stage': stage, 'key': key, 'created_at': datetime.now().isoformat(), 'value': value},
+                          f, ensure_ascii=False)
+            os.replace(temp_path, path)
+
+            for old_path in glob.glob(os.path.join(self.directory, glob.escape(scope), f"{glob.escape(stage)}-*.json")):
+                if old_path != path:
+                    os.remove(old_path)
+        except Exception as e:
+            logging.error(f"保存检查点 {path} 时出错: {str(e)}")
+
+    def clear(self, scope: str) -> None:
+        """删除某个作用域的全部检查点"""
+        shutil.rmtree(os.path.join(self.directory, scope), ignore_errors=True)
@@ -0,0 +1,138 @@
+"""
+conversation_memory.py
+
+token 预算受限的对话记忆：
+1. 完整对话仍写入 chat_memory（如 StreamlitChatMessageHistory），界面照常显示全部历史
+2. 注入提示词的 chat_history = 滚动摘要 + 预算内最近几轮原文，总 token 数不超过 max_tokens
+3. 滑出窗口的消息先积攒，累计达到 summary_batch_tokens 后才调用一次摘要函数，
+   把这一批消息合并进已有摘要（增量更新，而不是每轮都重新总结全部历史）
+4. 多输入的 agent（如 company_info + multi_year_analysis）按 input_keys 的顺序选取写入记忆的用户输入
+5. chat_memory 自带后台压缩（LLM/chat_store.py 的 SQLiteChatMessageHistory）时，摘要取自该历史，本类不再自行摘要
+"""
+
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from LLM.token_utils import estimate_tokens, truncate_to_tokens
+
+SUMMARY_PREFIX = "此前对话摘要："
+
+
+class TokenBudgetMemory(BaseChatMemory):
+    """最近几轮原文 + 增量滚动摘要、总 token 数有硬上限的对话记忆"""
+
+    memory_key: str = "chat_history"
+    return_messages: bool = True
+    # 注入提示词的摘要与最近消息的 token 总上限
+    max_tokens: int = 2000
+    # 滑出窗口但尚未摘要的消息累计达到该 token 数时才触发一次摘要
+    summary_batch_tokens: int = 500
+    # 摘要本身的 token 上限
+    max_summary_tokens: int = 500
+    # 摘要函数：(已有摘要, 待合并的消息) -> 新摘要；为 None 时滑出窗口的消息直接丢弃
+    summarize_fn: Optional[Callable[[str, List[BaseMessage]], str]] = None
+    token_counter: Callable[[str], int] = estimate_tokens
+    # 多输入 agent 中用户输入对应的键，按顺序选取第一个存在的（对话按意图调用不同 agent，用户消息填入其主输入）
+    input_keys: Tuple[str, ...] = ("input", "text_chunk", "yearly_analyses", "company_info")
+    summary: str = ""
+    # chat_memory 中已合并进摘要的消息数量
+    summarized_count: int = 0
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def _message_tokens(self, message: BaseMessage) -> int:
+        return self.token_counter(str(message.content)) + 4
+
+    @property
+    def _history_compacts(self) -> bool:
+        """chat_memory 是否自行把较早消息压缩为摘要"""
+        return getattr(self.chat_memory, 'compacts_in_background', False)
+
+    def _summary_message(self) -> Optional[SystemMessage]:
+        summary = self.chat_memory.summary if self._history_compacts else self.summary
+        return SystemMessage(content=SUMMARY_PREFIX + summary) if summary else None
+
+    def _recent_window(self, messages: List[BaseMessage]) -> Tuple[int, List[BaseMessage]]:
+        """
+        从最新消息向前选取预算内的消息
+        :param messages: 全部消息
+        :return: (窗口起始下标, 窗口内消息)；最新一条消息本身超出预算时截断后保留
+        """
+        if self.summarized_count > len(messages):
+            # 历史在外部被清空或替换，摘要已失效
+            self.summary, self.summarized_count = "", 0
+        summary_message = self._summary_message()
+        budget = self.max_tokens - (self._message_tokens(summary_message) if summary_message else 0)
+
+        start, used = len(messages), 0
+        while start > self.summarized_count:
+            tokens = self._message_tokens(messages[start - 1])
+            if used + tokens > budget:
+                break
+            used += tokens
+            start -= 1
+
+        window = list(messages[start:])
+        if not window and start > self.summarized_count:
+            latest = messages[-1]
+            window = [latest.__class__(content=truncate_to_tokens(
+                str(latest.content), max(budget - 4, 0), self.token_counter
+            ))]
+        return start, window
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """返回滚动摘要与最近消息，总 token 数不超过 max_tokens"""
+        _, window = self._recent_window(self.chat_memory.messages)
+        summary_message = self._summary_message()
+        messages = ([summary_message] if summary_message else []) + window
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: "\n".join(f"{message.type}: {message.content}" for message in messages)}
+
+    def _get_input_output(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> Tuple[str, str]:
+        """按 input_keys 选取用户输入，兼容多输入的 agent"""
+        if self.input_key is None:
+            input_key = next((key for key in self.input_keys if key in inputs), None)
+            if input_key is not None:
+                output_key = self.output_key or ("output" if "output" in outputs else next(iter(outputs)))
+                return str(inputs[input_key]), str(outputs[output_key])
+        return super()._get_input_output(inputs, outputs)
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        """写入一轮对话，必要时把滑出窗口的消息合并进摘要"""
+        input_str, output_str = self._get_input_output(inputs, outputs)
+        self.chat_memory.add_messages([HumanMessage(content=input_str), AIMessage(content=output_str)])
+        self._maybe_summarize()
+
+    def _maybe_summarize(self) -> None:
+        """滑出窗口的消息累计达到 summary_batch_tokens 时增量更新摘要"""
+        if self._history_compacts:
+            return
+        messages = self.chat_memory.messages
+        start, _ = self._recent_window(messages)
+        pending = messages[self.summarized_count:start]
+        if not pending or sum(self._message_tokens(message) for message in pending) < self.summary_batch_tokens:
+            return
+
+        if self.summarize_fn is None:
+            self.summarized_count = start
+            return
+        try:
+            summary = self.summarize_fn(self.summary, pending)
+        except Exception as e:
+            # 摘要失败时保留原摘要，这批消息下次连同新滑出的消息一起重试
+            logging.error(f"更新对话摘要时出错: {str(e)}")
+            return
+        self.summary = truncate_to_tokens(summary.strip(), self.max_summary_tokens, self.token_counter)
+        self.summarized_count = start
+        logging.info(f"对话摘要已更新：合并 {len(pending)} 条消息，摘要 {self.token_counter(self.summary)} tokens")
+
+    def clear(self) -> None:
+        """清空对话历史与摘要"""
+        super().clear()
+        self.summary, self.summarized_count = "", 0
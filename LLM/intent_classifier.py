@@ -0,0 +1,159 @@
+"""
+intent_classifier.py
+
+对话意图的本地快速分类：
+1. 关键词规则：命中明确的关键词时直接给出意图
+2. 向量最近中心：用示例句子的向量均值作为各意图的中心，按余弦相似度匹配
+3. 置信度不足时才回退到 LLM 意图识别
+分类结果按规范化后的消息缓存，重复提问不再计算。
+"""
+
+import re
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+INTENTS = [
+    "SINGLE_REPORT",
+    "COMPARE_REPORTS",
+    "INVESTMENT_ADVICE",
+    "DOWNLOAD_REPORT",
+    "STOCK_SCREENING",
+    "GENERAL_QUERY",
+]
+
+# 关键词规则：(正则, 权重)
+KEYWORD_RULES = {
+    "DOWNLOAD_REPORT": [(r"下载", 3), (r"获取.*年报", 2), (r"拉取", 2)],
+    "STOCK_SCREENING": [(r"筛选", 3), (r"选股", 3), (r"巴菲特", 2), (r"板块.*股票|股票.*板块", 2)],
+    "COMPARE_REPORTS": [(r"对比", 3), (r"比较", 3), (r"近\s*\d+\s*年", 2), (r"历年|多年|这几年", 2), (r"趋势", 1)],
+    "INVESTMENT_ADVICE": [(r"值得投资|值不值得", 3), (r"投资建议|投资价值", 3), (r"能不能买|可以买|买入|卖出", 2), (r"估值", 1)],
+    "SINGLE_REPORT": [(r"\d{4}\s*年?\s*(年报|年度报告)", 3), (r"年报|年度报告", 1), (r"分析", 1)],
+    "GENERAL_QUERY": [(r"什么是|是什么|什么叫", 3), (r"含义|定义|怎么计算|如何计算", 2)],
+}
+
+# 各意图的示例句子，用于计算向量中心
+INTENT_EXAMPLES = {
+    "SINGLE_REPORT": ["分析平安银行2023年报", "贵州茅台去年年报的主营业务情况", "帮我看看比亚迪2022年年度报告的风险"],
+    "COMPARE_REPORTS": ["对比平安银行近3年业绩", "比亚迪这几年营收变化", "贵州茅台历年战略执行情况对比"],
+    "INVESTMENT_ADVICE": ["平安银行值得投资吗", "现在可以买入贵州茅台吗", "给我比亚迪的投资建议"],
+    "DOWNLOAD_REPORT": ["下载平安银行的年报", "帮我获取600519的年度报告", "把比亚迪历年年报下载下来"],
+    "STOCK_SCREENING": ["筛选白酒板块股票", "按巴菲特策略选股", "找出符合条件的银行股"],
+    "GENERAL_QUERY": ["什么是ROE", "自由现金流怎么计算", "市盈率是什么意思"],
+}
+
+
+def normalize_message(message: str) -> str:
+    """规范化消息：去除空白与标点，英文转小写"""
+    return re.sub(r"[\s，。！？、,.!?；;：:“”\"'（）()]+", "", message or "").lower()
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm_a = sum(x * x for x in a) ** 0.5
+    norm_b = sum(y * y for y in b) ** 0.5
+    return dot / (norm_a * norm_b) if norm_a and norm_b else 0.0
+
+
+class IntentClassifier:
+    """关键词规则 + 向量最近中心的意图分类器，低置信度时回退到 LLM"""
+
+    def __init__(self, embeddings=None, llm_fallback: Optional[Callable[[str], str]] = None,
+                 rule_margin: int = 2, similarity_threshold: float = 0.6, similarity_margin: float = 0.05,
+                 cache_size: int = 1024):
+        """
+        初始化分类器
+        :param embeddings: langchain Embeddings 对象，为 None 时只使用关键词规则
+        :param llm_fallback: 回退的 LLM 分类函数，输入消息返回意图字符串
+        :param rule_margin: 规则得分最高的意图需领先第二名的分数
+        :param similarity_threshold: 向量匹配的最低相似度
+        :param similarity_margin: 向量匹配最高分需领先第二名的差值
+        :param cache_size: 分类结果缓存条目数
+        """
+        self.embeddings = embeddings
+        self.llm_fallback = llm_fallback
+        self.rule_margin = rule_margin
+        self.similarity_threshold = similarity_threshold
+        self.similarity_margin = similarity_margin
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._centroids: Optional[Dict[str, List[float]]] = None
+        self._lock = threading.Lock()
+
+    def _rule_scores(self, message: str) -> Dict[str, int]:
+        """计算各意图的关键词规则得分"""
+        scores = {}
+        for intent, rules in KEYWORD_RULES.items():
+            score = sum(weight for pattern, weight in rules if re.search(pattern, message))
+            if score:
+                scores[intent] = score
+        return scores
+
+    def _get_centroids(self) -> Dict[str, List[float]]:
+        """首次使用时计算各意图的向量中心"""
+        if self._centroids is None:
+            centroids = {}
+            for intent, examples in INTENT_EXAMPLES.items():
+                vectors = self.embeddings.embed_documents(examples)
+                dim = len(vectors[0])
+                centroids[intent] = [sum(v[i] for v in vectors) / len(vectors) for i in range(dim)]
+            self._centroids = centroids
+        return self._centroids
+
+    def _classify_local(self, message: str) -> Optional[Dict]:
+        """本地分类，置信度不足时返回 None"""
+        scores = self._rule_scores(message)
+        if scores:
+            ranked = sorted(scores.items(), key=lambda item: -item[1])
+            top_intent, top_score = ranked[0]
+            second_score = ranked[1][1] if len(ranked) > 1 else 0
+            if top_score - second_score >= self.rule_margin:
+                return {'intent': top_intent, 'confidence': float(top_score - second_score), 'source': 'rule'}
+
+        if self.embeddings is None:
+            return None
+
+        query_vector = self.embeddings.embed_query(message)
+        similarities = sorted(
+            ((intent, _cosine(query_vector, centroid)) for intent, centroid in self._get_centroids().items()),
+            key=lambda item: -item[1]
+        )
+        top_intent, top_similarity = similarities[0]
+        margin = top_similarity - similarities[1][1]
+        if top_similarity >= self.similarity_threshold and margin >= self.similarity_margin:
+            return {'intent': top_intent, 'confidence': round(top_similarity, 4), 'source': 'embedding'}
+        return None
+
+    def classify(self, message: str) -> Dict:
+        """
+        识别消息意图
+        :param message: 用户消息
+        :return: {'intent': 意图, 'confidence': 置信度, 'source': rule/embedding/llm/default/cache}
+        """
+        key = normalize_message(message)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return {**self._cache[key], 'source': 'cache'}
+
+        decision = self._classify_local(message)
+        if decision is None:
+            decision = self._classify_with_llm(message)
+
+        with self._lock:
+            self._cache[key] = decision
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        logging.info(f"意图识别: {decision['intent']}（来源 {decision['source']}，置信度 {decision['confidence']}）")
+        return decision
+
+    def _classify_with_llm(self, message: str) -> Dict:
+        """调用 LLM 回退分类，输出无法识别时归为 GENERAL_QUERY"""
+        if self.llm_fallback is not None:
+            text = self.llm_fallback(message)
+            for intent in INTENTS:
+                if intent in text:
+                    return {'intent': intent, 'confidence': 1.0, 'source': 'llm'}
+        return {'intent': "GENERAL_QUERY", 'confidence': 0.0, 'source': 'default'}
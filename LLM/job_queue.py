@@ -0,0 +1,327 @@
+"""
+job_queue.py
+
+长耗时分析的本地后台任务队列，供 Streamlit 界面提交任务、轮询进度与结果：
+1. 任务状态保存在 SQLite（results/jobs.sqlite）：queued -> running -> done / failed，或排队中取消为 cancelled，
+   进度、阶段说明、结果与错误都随任务持久化，页面刷新或应用重启后仍可查看
+2. 工作线程池从队列领取任务（原子地把 queued 改为 running），多个会话、多个进程可共用同一个队列；
+   界面进程可设置 JOB_WORKERS=0 只提交任务，由独立的工作进程执行：python -m LLM.job_queue --workers 2
+3. 运行中的任务定期写入心跳，工作进程中断后，心跳超时的任务重新排队
+4. 相同类型、相同参数的任务正在排队或运行时，重复提交返回已有任务
+
+内置任务类型：
+- process_company：{'stock_code': '000001', 'download': True}，下载年报后执行完整的公司分析
+- screen：{'query': 'screen:白酒'}，执行 stock_screening 工具的筛选或单股分析
+每个工作线程使用各自的 ReportAnalyzer（首次执行任务时创建），并发的公司分析不共用同一个分析器
+
+用法：
+python -m LLM.job_queue --workers 2
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import argparse
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# 添加项目根目录到Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from LLM.tool_cache import is_error_result
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+# 任务处理函数：(参数, 进度回调) -> 可 JSON 序列化的结果，进度回调参数为完成比例（0~1）与阶段说明
+JobHandler = Callable[[Dict[str, Any], Callable[[float, str], None]], Any]
+
+
+class JobQueue:
+    """SQLite 持久化的后台任务队列与工作线程池"""
+
+    def __init__(self, database_path: str, handlers: Optional[Dict[str, JobHandler]] = None, workers: int = 2,
+                 poll_interval: float = 1.0, stale_after: float = 300.0):
+        """
+        初始化队列
+        :param database_path: SQLite 文件路径
+        :param handlers: {任务类型: 处理函数}，只提交任务的进程可为空
+        :param workers: 工作线程数，0 表示只提交不执行
+        :param poll_interval: 空闲时轮询新任务的间隔（秒）
+        :param stale_after: 心跳超时时间（秒），超时的运行中任务视为工作进程已中断
+        """
+        self.database_path = database_path
+        self.handlers = dict(handlers or {})
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._running: Dict[str, float] = {}
+        self._running_lock = threading.Lock()
+
+        directory = os.path.dirname(database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY, kind TEXT, params TEXT, owner TEXT, status TEXT,
+                    progress REAL DEFAULT 0, message TEXT DEFAULT '', result TEXT, error TEXT,
+                    created_at REAL, started_at REAL, finished_at REAL, heartbeat REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.database_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job['params'] = json.loads(job['params'] or "{}")
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    # ---- 提交与查询 ----
+
+    def submit(self, kind: str, params: Dict[str, Any], owner: str = "") -> str:
+        """
+        提交任务，相同类型与参数的任务正在排队或运行时返回已有任务
+        :param kind: 任务类型
+        :param params: 任务参数
+        :param owner: 提交者标识，如 Streamlit 会话ID
+        :return: 任务ID
+        """
+        params_json = json.dumps(params, ensure_ascii=False, sort_keys=True)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = conn.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND params = ? AND status IN ('queued', 'running')",
+                (kind, params_json)
+            ).fetchone()
+            if existing:
+                conn.execute("COMMIT")
+                logging.info(f"任务 {kind} {params_json} 已在队列中: {existing['id']}")
+                return existing['id']
+            job_id = uuid.uuid4().hex[:12]
+            conn.execute(
+                "INSERT INTO jobs (id, kind, params, owner, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, kind, params_json, owner, time.time())
+            )
+            conn.execute("COMMIT")
+        logging.info(f"已提交任务 {job_id}: {kind} {params_json}")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询单个任务"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_jobs(self, owner: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        按提交时间倒序列出任务
+        :param owner: 只列出该提交者的任务，None 表示全部
+        :param limit: 最大条数
+        """
+        query, args = "SELECT * FROM jobs", []
+        if owner is not None:
+            query, args = query + " WHERE owner = ?", [owner]
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY created_at DESC LIMIT ?", (*args, limit)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def cancel(self, job_id: str) -> bool:
+        """取消排队中的任务，运行中的任务不中断"""
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? "
+                                  "WHERE id = ? AND status = 'queued'", (time.time(), job_id))
+        return cursor.rowcount > 0
+
+    # ---- 执行 ----
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """领取最早提交的、本进程能处理的排队任务"""
+        if not self.handlers:
+            return None
+        kinds = list(self.handlers)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE status = 'queued' AND kind IN ({','.join('?' * len(kinds))}) "
+                "ORDER BY created_at LIMIT 1", kinds
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', started_at = ?, heartbeat = ?, progress = 0, "
+                         "message = '开始执行', error = NULL WHERE id = ?", (now, now, row['id']))
+            conn.execute("COMMIT")
+        return self._to_dict(row)
+
+    def _update(self, job_id: str, **fields) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def run_job(self, job: Dict[str, Any]) -> None:
+        """执行一个已领取的任务并保存结果或错误"""
+        job_id = job['id']
+        with self._running_lock:
+            self._running[job_id] = time.time()
+
+        def progress(fraction: float, message: str = "") -> None:
+            self._update(job_id, progress=round(min(max(fraction, 0.0), 1.0), 4), message=message,
+                         heartbeat=time.time())
+
+        logging.info(f"开始执行任务 {job_id}: {job['kind']} {job['params']}")
+        try:
+            result = self.handlers[job['kind']](job['params'], progress)
+            self._update(job_id, status='done', progress=1.0, message="完成", finished_at=time.time(),
+                         result=json.dumps(result, ensure_ascii=False))
+            logging.info(f"任务 {job_id} 已完成")
+        except Exception as e:
+            logging.error(f"任务 {job_id} 执行出错: {str(e)}")
+            self._update(job_id, status='failed', message="出错", error=str(e), finished_at=time.time())
+        finally:
+            with self._running_lock:
+                self._running.pop(job_id, None)
+
+    def recover_stale(self) -> int:
+        """把心跳超时的运行中任务重新排队，返回重新排队的任务数"""
+        with self._running_lock:
+            own = list(self._running)
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET status = 'queued', message = '工作进程中断，重新排队' "
+                f"WHERE status = 'running' AND heartbeat < ? AND id NOT IN ({','.join('?' * len(own))})",
+                (time.time() - self.stale_after, *own)
+            )
+        if cursor.rowcount:
+            logging.warning(f"{cursor.rowcount} 个任务的工作进程已中断，重新排队")
+        return cursor.rowcount
+
+    def _heartbeat_loop(self) -> None:
+        """定期为本进程运行中的任务写入心跳，并回收其他进程中断的任务"""
+        interval = max(self.stale_after / 4, 0.1)
+        while not self._stop.wait(interval):
+            with self._running_lock:
+                running = list(self._running)
+            for job_id in running:
+                self._update(job_id, heartbeat=time.time())
+            self.recover_stale()
+
+    def _worker_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logging.error(f"领取任务时出错: {str(e)}")
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self.run_job(job)
+
+    def start(self) -> "JobQueue":
+        """启动工作线程与心跳线程（workers 为 0 时不启动）"""
+        if self.workers <= 0 or self._threads:
+            return self
+        self.recover_stale()
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._worker_loop, name=f"job-worker-{index}", daemon=True)
+                         for index in range(self.workers)]
+        self._threads.append(threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        logging.info(f"后台任务队列已启动，工作线程 {self.workers} 个")
+        return self
+
+    def stop(self, wait: bool = True) -> None:
+        """停止领取新任务，wait 为 True 时等待运行中的任务结束"""
+        self._stop.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+
+def build_default_handlers(analyzer_factory: Callable[[], Any]) -> Dict[str, JobHandler]:
+    """
+    内置任务类型的处理函数
+    :param analyzer_factory: 返回 ReportAnalyzer 的函数，每个工作线程执行第一个任务时调用一次，
+                             该线程之后的任务共用这个实例
+    :return: {任务类型: 处理函数}
+    """
+    state = threading.local()
+
+    def get_analyzer():
+        if getattr(state, 'analyzer', None) is None:
+            state.analyzer = analyzer_factory()
+        return state.analyzer
+
+    def process_company(params: Dict[str, Any], progress: Callable[[float, str], None]) -> Dict[str, Any]:
+        stock_code = str(params['stock_code']).zfill(6)
+        progress(0.0, "正在准备分析器")
+        analyzer = get_analyzer()
+        if params.get('download', True):
+            from reports.download_reports import ensure_stock_reports
+            progress(0.02, "正在下载并转换年报")
+            message = ensure_stock_reports(stock_code, analyzer.results_dir, delete_pdf=False)
+            if is_error_result(message):
+                raise RuntimeError(message)
+        # 分析阶段占 5%~100% 的进度
+        output_path = analyzer.process_company(
+            stock_code, resume=params.get('resume', True),
+            progress=lambda fraction, message: progress(0.05 + 0.95 * fraction, message)
+        )
+        if not output_path:
+            raise RuntimeError(f"未生成 {stock_code} 的分析报告，请检查年报文件与日志")
+        with open(output_path, 'r', encoding='utf-8') as f:
+            return {'report_path': output_path, 'report': f.read()}
+
+    def screen(params: Dict[str, Any], progress: Callable[[float, str], None]) -> Dict[str, Any]:
+        progress(0.0, "正在准备分析器")
+        tool = get_analyzer().create_stock_screening_tool()
+        progress(0.1, "正在筛选股票")
+        text = tool.func(params['query'])
+        if is_error_result(text):
+            raise RuntimeError(text)
+        return {'text': text}
+
+    return {'process_company': process_company, 'screen': screen}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后台任务队列工作进程")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--database', default=os.path.join(root_dir, 'results', 'jobs.sqlite'))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    def create_analyzer():
+        from LLM.LLM_reports import ReportAnalyzer
+        results_dir = os.path.join(root_dir, 'results')
+        return ReportAnalyzer(txt_dir=os.path.join(results_dir, 'txt_reports'), results_dir=results_dir)
+
+    job_queue = JobQueue(args.database, build_default_handlers(create_analyzer), workers=args.workers).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        job_queue.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+lexical_index.py
+
+年报文本块的本地倒排索引（BM25）：
+1. 中文按字符二元组（bigram）切分，英文单词与数字整体作为词项，能精确命中
+   “经营活动产生的现金流量净额”“研发投入”等财务科目名称和数值
+2. 使用 SQLite 持久化，入库时增量写入，无需重建
+3. 支持按 stock_code、year、report_type 过滤，与向量检索结果融合使用
+"""
+
+import os
+import re
+import json
+import math
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+_CJK_RUN_PATTERN = re.compile(r'[\u4e00-\u9fff]+')
+_WORD_PATTERN = re.compile(r'[A-Za-z]+|\d+(?:[.,]\d+)*%?')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    将文本切分为检索词项：中文连续片段取二元组（单字片段保留单字），英文转小写，数字去掉千分位逗号
+    :param text: 文本
+    :return: 词项列表
+    """
+    tokens = []
+    for run in _CJK_RUN_PATTERN.findall(text or ""):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    for word in _WORD_PATTERN.findall(text or ""):
+        tokens.append(word.lower().replace(',', ''))
+    return tokens
+
+
+class LexicalIndex:
+    """基于 SQLite 的增量 BM25 倒排索引"""
+
+    def __init__(self, database_path: str, k1: float = 1.2, b: float = 0.75):
+        """
+        初始化索引
+        :param database_path: SQLite 文件路径
+        :param k1: BM25 词频饱和参数
+        :param b: BM25 文档长度归一化参数
+        """
+        self.database_path = database_path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(database_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS docs (
+                    doc_id TEXT PRIMARY KEY,
+                    stock_code TEXT,
+                    year INTEGER,
+                    report_type TEXT,
+                    length INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, doc_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_docs_filter ON docs (stock_code, year, report_type);
+            """)
+
+    def add_documents(self, doc_ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """
+        增量写入文本块
+        :param doc_ids: 文本块ID，与向量库中的ID一致，便于结果融合
+        :param texts: 文本块内容
+        :param metadatas: 文本块元数据
+        """
+        doc_rows = []
+        posting_rows = []
+        for doc_id, text, metadata in zip(doc_ids, texts, metadatas):
+            counts = Counter(tokenize(text))
+            doc_rows.append((
+                doc_id, metadata.get('stock_code'), metadata.get('year'), metadata.get('report_type'),
+                sum(counts.values()), text, json.dumps(metadata, ensure_ascii=False)
+            ))
+            posting_rows.extend((term, doc_id, tf) for term, tf in counts.items())
+
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?, ?, ?, ?)", doc_rows)
+            self._conn.executemany("INSERT OR REPLACE INTO postings VALUES (?, ?, ?)", posting_rows)
+
+    @staticmethod
+    def _filter_clause(filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        """生成 docs 表的过滤条件"""
+        clauses = []
+        params: List[Any] = []
+        for key in ('stock_code', 'year', 'report_type'):
+            if filters.get(key):
+                clauses.append(f"d.{key} = ?")
+                params.append(filters[key])
+        return (" AND " + " AND ".join(clauses)) if clauses else "", params
+
+    def search(self, query: str, k: int = 3, **filters) -> List[Tuple[Document, float]]:
+        """
+        BM25 检索
+        :param query: 查询文本
+        :param k: 返回结果数
+        :param filters: stock_code、year、report_type 过滤条件
+        :return: [(文档, BM25得分)]，得分越高越相关
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        where, params = self._filter_clause(filters)
+        scores: Dict[str, float] = {}
+        with self._lock:
+            total_docs, avg_length = self._conn.execute(
+                f"SELECT COUNT(*), AVG(d.length) FROM docs d WHERE 1 = 1{where}", params
+            ).fetchone()
+            if not total_docs:
+                return []
+
+            for term in terms:
+                rows = self._conn.execute(
+                    f"SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON p.doc_id = d.doc_id "
+                    f"WHERE p.term = ?{where}", [term] + params
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (total_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+                for doc_id, tf, length in rows:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / (avg_length or 1))
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            top = sorted(scores.items(), key=lambda item: -item[1])[:k]
+            results = []
+            for doc_id, score in top:
+                content, metadata = self._conn.execute(
+                    "SELECT content, metadata FROM docs WHERE doc_id = ?", (doc_id,)
+                ).fetchone()
+                results.append((Document(id=doc_id, page_content=content, metadata=json.loads(metadata)), score))
+        return results
+
+    def count(self) -> int:
+        """返回已索引的文本块数量"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int = 3, rrf_k: int = 60) -> List[Tuple[Document, float]]:
+    """
+    倒数排名融合（RRF）多路检索结果
+    :param result_lists: 多路检索结果，每路按相关度降序排列
+    :param k: 返回结果数
+    :param rrf_k: RRF 平滑常数
+    :return: [(文档, 融合得分)]，得分越高越相关
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            documents.setdefault(key, doc)
+    ranked = sorted(scores.items(), key=lambda item: -item[1])[:k]
+    return [(documents[key], score) for key, score in ranked]
@@ -0,0 +1,128 @@
+"""
+llm_cache.py
+
+基于 SQLite 的 LLM 响应持久化缓存：
+1. 以 模型配置(llm_string) + 提示词模板版本 + 完整渲染后的消息 作为缓存键
+2. 支持 TTL 过期与最大条目数（按最近访问时间淘汰）
+3. 实现 langchain 的 BaseCache 接口，可直接传给 ChatOpenAI(cache=...)
+
+分析器以 temperature=0 运行，相同输入的输出可复用，避免重复分析同一年报时再次付费。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+
+
+class ResponseCache(BaseCache):
+    """持久化的 LLM 响应缓存"""
+
+    def __init__(self, database_path: str, prompt_version: str = "1",
+                 ttl_seconds: Optional[float] = 7 * 24 * 3600, max_entries: Optional[int] = 10000):
+        """
+        初始化缓存
+        :param database_path: SQLite 数据库文件路径
+        :param prompt_version: 提示词模板版本，模板修改后更换版本号即可使旧缓存失效
+        :param ttl_seconds: 缓存有效期（秒），None 表示永不过期
+        :param max_entries: 最大缓存条目数，None 表示不限制
+        """
+        self.database_path = database_path
+        self.prompt_version = prompt_version
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(database_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    prompt_version TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+
+    def _make_key(self, prompt: str, llm_string: str) -> str:
+        """由模板版本、模型配置和渲染后的消息生成缓存键"""
+        raw = "\x1f".join([self.prompt_version, llm_string, prompt])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """查找缓存，未命中或已过期时返回 None"""
+        key = self._make_key(prompt, llm_string)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            response, created_at = row
+            if self._is_expired(created_at, now):
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+
+        try:
+            return [loads(item) for item in json.loads(response)]
+        except Exception as e:
+            logging.warning(f"LLM 缓存条目解析失败，按未命中处理: {str(e)}")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """写入缓存，并按 TTL 与容量执行淘汰"""
+        key = self._make_key(prompt, llm_string)
+        response = json.dumps([dumps(generation) for generation in return_val])
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, prompt_version, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, self.prompt_version, response, now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """删除过期条目，超出容量时删除最久未访问的条目（调用方需持有锁）"""
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+
+        if self.max_entries is not None:
+            count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                    (overflow,)
+                )
+
+    def clear(self, **kwargs) -> None:
+        """清空缓存"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def size(self) -> int:
+        """返回当前缓存条目数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
@@ -0,0 +1,305 @@
+"""
+llm_standin.py
+
+本地 OpenAI 兼容的 LLM 替身服务，用于离线测试与基准测试 ReportAnalyzer 的 agent 编排：
+1. 实现 POST /v1/chat/completions（含 stream=True 的 SSE 流式输出与 stream_options.include_usage）和 GET /v1/models
+2. 回复由脚本决定：按顺序匹配规则（正则匹配全部消息或最后一条消息），同一规则的多个回复依次轮换，
+   POST /v1/reset 重置轮换位置，相同的请求序列总能得到相同的回复，便于重放
+3. 可配置首 token 延迟（latency）与输出速率（tokens_per_second），模拟真实模型的响应时间
+4. 记录每次请求匹配的规则、token 数与服务端耗时，供基准测试区分 LLM 时间与编排开销
+
+脚本文件格式（JSON）：
+{"rules": [{"name": "intent", "match": "可能的意图类别", "scope": "all", "responses": ["GENERAL_QUERY"]}],
+ "default": "默认回复"}
+
+用法：
+python -m LLM.llm_standin --port 8765 --script script.json --latency 0.5 --tokens-per-second 40
+OPENROUTER_BASE_URL=http://127.0.0.1:8765/v1 OPENROUTER_API_KEY=standin streamlit run LLM/app.py
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+# 添加项目根目录到Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+from LLM.token_utils import estimate_tokens
+
+# 流式输出的切片：连续的字母数字、连续空白或单个其他字符
+_PIECE_PATTERN = re.compile(r'[A-Za-z0-9_.]+|\s+|.', re.S)
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    """取出消息文本，兼容 content 为分段列表的格式"""
+    content = message.get('content') or ""
+    if isinstance(content, list):
+        return "".join(part.get('text', "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+class ScriptedResponder:
+    """按规则脚本生成回复"""
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None, default: str = ""):
+        """
+        初始化
+        :param rules: 规则列表，每条包含 match（正则）、responses（回复列表），可选 name 与 scope（all 或 last）
+        :param default: 没有规则匹配时的回复
+        """
+        self.rules = []
+        for index, rule in enumerate(rules or []):
+            self.rules.append({
+                'name': rule.get('name') or f"rule_{index}",
+                'pattern': re.compile(rule['match'], re.S),
+                'scope': rule.get('scope', "all"),
+                'responses': list(rule['responses']) or [""],
+            })
+        self.default = default
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str) -> "ScriptedResponder":
+        """从 JSON 脚本文件加载"""
+        with open(path, 'r', encoding='utf-8') as f:
+            script = json.load(f)
+        return cls(script.get('rules', []), script.get('default', ""))
+
+    def respond(self, messages: List[Dict[str, Any]]) -> Tuple[str, str]:
+        """
+        根据请求消息选择回复
+        :param messages: OpenAI 格式的消息列表
+        :return: (规则名称, 回复文本)
+        """
+        full_text = "\n".join(_message_text(message) for message in messages)
+        last_text = _message_text(messages[-1]) if messages else ""
+        for rule in self.rules:
+            text = last_text if rule['scope'] == "last" else full_text
+            if rule['pattern'].search(text):
+                with self._lock:
+                    position = self._positions.get(rule['name'], 0)
+                    self._positions[rule['name']] = position + 1
+                return rule['name'], rule['responses'][position % len(rule['responses'])]
+        return "default", self.default
+
+    def reset(self) -> None:
+        """重置各规则的轮换位置"""
+        with self._lock:
+            self._positions.clear()
+
+
+class StandinServer:
+    """OpenAI 兼容的本地替身服务"""
+
+    def __init__(self, responder: ScriptedResponder, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, tokens_per_second: float = 0.0, model: str = "standin"):
+        """
+        初始化服务
+        :param responder: 回复脚本
+        :param host: 监听地址
+        :param port: 监听端口，0 表示随机分配
+        :param latency: 首 token 延迟（秒）
+        :param tokens_per_second: 输出速率，0 表示不限速
+        :param model: 响应中返回的模型名
+        """
+        self.responder = responder
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.model = model
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> str:
+        """在后台线程启动服务，返回 base_url"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="llm-standin", daemon=True)
+        self._thread.start()
+        logging.info(f"LLM 替身服务已启动: {self.base_url}")
+        return self.base_url
+
+    def stop(self) -> None:
+        """停止服务"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        汇总请求统计
+        :return: {'calls', 'prompt_tokens', 'completion_tokens', 'server_seconds', 'by_rule'}
+        """
+        with self._lock:
+            requests = list(self.requests)
+        by_rule: Dict[str, int] = {}
+        for request in requests:
+            by_rule[request['rule']] = by_rule.get(request['rule'], 0) + 1
+        return {
+            'calls': len(requests),
+            'prompt_tokens': sum(request['prompt_tokens'] for request in requests),
+            'completion_tokens': sum(request['completion_tokens'] for request in requests),
+            'server_seconds': sum(request['seconds'] for request in requests),
+            'by_rule': by_rule,
+        }
+
+    def reset(self) -> None:
+        """清空请求记录并重置脚本轮换位置"""
+        with self._lock:
+            self.requests.clear()
+        self.responder.reset()
+
+    def _pace(self, start: float, tokens_sent: int) -> None:
+        """按首 token 延迟与输出速率等待到下一片段的发送时间"""
+        due = start + self.latency
+        if self.tokens_per_second > 0:
+            due += tokens_sent / self.tokens_per_second
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip('/').endswith('/models'):
+                    self._send_json(200, {'object': "list", 'data': [{'id': server.model, 'object': "model"}]})
+                else:
+                    self._send_json(404, {'error': {'message': f"未知路径 {self.path}"}})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self._send_json(400, {'error': {'message': "请求体不是合法的JSON"}})
+                    return
+
+                if self.path.rstrip('/').endswith('/reset'):
+                    server.reset()
+                    self._send_json(200, {'status': "ok"})
+                elif self.path.rstrip('/').endswith('/chat/completions'):
+                    self._chat_completion(payload)
+                else:
+                    self._send_json(404, {'error': {'message': f"未知路径 {self.path}"}})
+
+            def _chat_completion(self, payload: Dict[str, Any]) -> None:
+                start = time.perf_counter()
+                messages = payload.get('messages') or []
+                rule, text = server.responder.respond(messages)
+                usage = {
+                    'prompt_tokens': sum(estimate_tokens(_message_text(message)) for message in messages),
+                    'completion_tokens': estimate_tokens(text),
+                }
+                usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+                base = {'id': f"chatcmpl-{uuid.uuid4().hex}", 'created': int(time.time()),
+                        'model': payload.get('model') or server.model}
+
+                try:
+                    if payload.get('stream'):
+                        self._stream(base, text, usage, start,
+                                     bool((payload.get('stream_options') or {}).get('include_usage')))
+                    else:
+                        server._pace(start, usage['completion_tokens'])
+                        self._send_json(200, {**base, 'object': "chat.completion", 'usage': usage, 'choices': [{
+                            'index': 0, 'message': {'role': "assistant", 'content': text}, 'finish_reason': "stop"
+                        }]})
+                finally:
+                    with server._lock:
+                        server.requests.append({'rule': rule, 'seconds': time.perf_counter() - start, **usage})
+
+            def _stream(self, base: Dict[str, Any], text: str, usage: Dict[str, int], start: float,
+                        include_usage: bool) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                def send(chunk: Dict[str, Any]) -> None:
+                    self.wfile.write(f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', **chunk}, ensure_ascii=False)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+
+                tokens_sent = 0
+                first = True
+                for piece in _PIECE_PATTERN.findall(text):
+                    server._pace(start, tokens_sent)
+                    delta = {'content': piece}
+                    if first:
+                        delta['role'] = "assistant"
+                        first = False
+                    send({'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})
+                    tokens_sent += estimate_tokens(piece)
+                server._pace(start, tokens_sent)
+                send({'choices': [{'index': 0, 'delta': {} if not first else {'role': "assistant", 'content': ""},
+                                   'finish_reason': "stop"}]})
+                if include_usage:
+                    send({'choices': [], 'usage': usage})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地 LLM 替身服务")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--script', help="规则脚本（JSON）路径")
+    parser.add_argument('--default', default="", help="未匹配规则时的回复")
+    parser.add_argument('--latency', type=float, default=0.0, help="首 token 延迟（秒）")
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help="输出速率，0 表示不限速")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    responder = ScriptedResponder.from_file(args.script) if args.script else ScriptedResponder(default=args.default)
+    if args.default and args.script:
+        responder.default = args.default
+    server = StandinServer(responder, host=args.host, port=args.port, latency=args.latency,
+                           tokens_per_second=args.tokens_per_second)
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
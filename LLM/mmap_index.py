@@ -0,0 +1,314 @@
+"""
+mmap_index.py
+
+基于内存映射矩阵的本地向量索引，作为 Chroma 之外的向量后端：
+1. 归一化后的向量以 float16 或 int8（逐行缩放）追加写入 vectors.bin，检索时通过 np.memmap 按需读取，
+   常驻内存只有 IVF 质心，不随入库规模增长
+2. 文本、元数据与所属倒排列表保存在旁路 SQLite 表中，年份、报告类型过滤在 SQLite 中完成
+3. 行数达到训练阈值后用 k-means 训练 IVF 质心，检索时只扫描与查询最近的 nprobe 个列表；
+   行数增长到上次训练的 4 倍时自动重新训练，未训练前使用分块暴力检索；
+   按公司分片时单个分片通常只有几百到几千行，达不到默认训练阈值（10000 行），实际走的是暴力检索
+4. 入库与检索可在不同线程并发进行：行数、映射矩阵与 SQLite 读写都在锁内取得，检索只使用取得时的快照
+接口与 langchain Chroma 的 add_texts、similarity_search_by_vector_with_relevance_scores 保持一致，
+可由 ReportStore 按公司分片直接替换使用。
+"""
+
+import os
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+_SCAN_BATCH_ROWS = 65536
+
+
+def _kmeans(vectors: np.ndarray, n_clusters: int, n_iter: int = 10, seed: int = 42) -> np.ndarray:
+    """球面 k-means（余弦距离），返回归一化后的质心"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(n_clusters):
+            members = vectors[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+            else:
+                centroids[cluster] = vectors[rng.integers(len(vectors))]
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    return centroids
+
+
+def _where_conditions(where: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """将 Chroma 风格的等值过滤（含 $and）展开为 {字段: 值}"""
+    if not where:
+        return {}
+    if "$and" in where:
+        conditions: Dict[str, Any] = {}
+        for condition in where["$and"]:
+            conditions.update(_where_conditions(condition))
+        return conditions
+    return {key: value for key, value in where.items() if not key.startswith("$")}
+
+
+class MmapVectorIndex:
+    """内存映射向量矩阵 + IVF + SQLite 元数据表的向量索引"""
+
+    def __init__(self, directory: str, embeddings, dtype: str = "float16", nprobe: int = 8,
+                 train_threshold: int = 10000):
+        """
+        初始化索引（目录不存在时创建）
+        :param directory: 索引目录，包含 vectors.bin、scales.bin、centroids.npy 与 rows.sqlite
+        :param embeddings: langchain Embeddings 对象
+        :param dtype: 向量存储精度，float16 或 int8
+        :param nprobe: 检索时扫描的倒排列表数
+        :param train_threshold: 训练 IVF 的最小行数，之前使用暴力检索（按公司分片时一般达不到）
+        """
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"不支持的向量精度: {dtype}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.embeddings = embeddings
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self._vectors_path = os.path.join(directory, 'vectors.bin')
+        self._scales_path = os.path.join(directory, 'scales.bin')
+        self._centroids_path = os.path.join(directory, 'centroids.npy')
+        # 可重入：add_vectors 持锁训练时会再次读取行数与映射矩阵
+        self._lock = threading.RLock()
+        self._matrix: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+
+        self._conn = sqlite3.connect(os.path.join(directory, 'rows.sqlite'), check_same_thread=False)
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS rows (
+                    row_id INTEGER PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    list_id INTEGER NOT NULL DEFAULT -1,
+                    year INTEGER,
+                    report_type TEXT,
+                    content TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_rows_list ON rows (list_id);
+                CREATE INDEX IF NOT EXISTS idx_rows_year ON rows (year);
+            """)
+
+        self.dtype = self._get_meta('dtype') or dtype
+        self.dim = int(self._get_meta('dim') or 0)
+        self.trained_rows = int(self._get_meta('trained_rows') or 0)
+        self.centroids = np.load(self._centroids_path) if os.path.exists(self._centroids_path) else None
+        self._repair()
+
+    # ---- 元信息与文件 ----
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: Any) -> None:
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dim * (2 if self.dtype == "float16" else 1)
+
+    def count(self) -> int:
+        """返回索引中的行数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def _repair(self) -> None:
+        """向量文件写入后元数据未提交（进程中断）时，截掉多余的向量行"""
+        if not self.dim or not os.path.exists(self._vectors_path):
+            return
+        rows = self.count()
+        if os.path.getsize(self._vectors_path) > rows * self._row_bytes:
+            logging.warning(f"向量索引 {self.directory} 存在未提交的向量，已截断到 {rows} 行")
+            with open(self._vectors_path, 'r+b') as f:
+                f.truncate(rows * self._row_bytes)
+            if self.dtype == "int8" and os.path.exists(self._scales_path):
+                with open(self._scales_path, 'r+b') as f:
+                    f.truncate(rows * 4)
+
+    def _open_matrix(self, rows: int) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        按行数取得内存映射矩阵，行数变化时重新映射
+        :return: (矩阵, 缩放系数)，调用方持有的是当时的映射，之后的重新映射不影响它
+        """
+        with self._lock:
+            if self._matrix is None or len(self._matrix) != rows:
+                dtype = np.float16 if self.dtype == "float16" else np.int8
+                self._matrix = np.memmap(self._vectors_path, dtype=dtype, mode='r', shape=(rows, self.dim))
+                self._scales = (np.memmap(self._scales_path, dtype=np.float32, mode='r', shape=(rows,))
+                                if self.dtype == "int8" else None)
+            return self._matrix, self._scales
+
+    def _decode(self, row_ids: np.ndarray, rows: int) -> np.ndarray:
+        """读取指定行并还原为 float32 向量"""
+        matrix, scales = self._open_matrix(rows)
+        vectors = np.asarray(matrix[row_ids], dtype=np.float32)
+        if scales is not None:
+            vectors *= (np.asarray(scales[row_ids]) / 127.0)[:, None]
+        return vectors
+
+    # ---- 写入 ----
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+                  ids: Optional[List[str]] = None) -> List[str]:
+        """
+        向量化并写入文本块
+        :param texts: 文本块
+        :param metadatas: 元数据
+        :param ids: 文本块ID
+        :return: 文本块ID列表
+        """
+        vectors = np.asarray(self.embeddings.embed_documents(list(texts)), dtype=np.float32)
+        return self.add_vectors(vectors, texts, metadatas, ids)
+
+    def add_vectors(self, vectors: np.ndarray, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+                    ids: Optional[List[str]] = None) -> List[str]:
+        """
+        写入已计算好的向量
+        :param vectors: 形状为 (n, dim) 的向量
+        :param texts: 文本块
+        :param metadatas: 元数据
+        :param ids: 文本块ID，默认使用行号
+        :return: 文本块ID列表
+        """
+        if not len(texts):
+            return []
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        metadatas = metadatas or [{} for _ in texts]
+
+        with self._lock:
+            if not self.dim:
+                self.dim = vectors.shape[1]
+                self._set_meta('dim', self.dim)
+                self._set_meta('dtype', self.dtype)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度 {vectors.shape[1]} 与索引维度 {self.dim} 不一致")
+
+            start = self.count()
+            ids = list(ids) if ids else [str(start + i) for i in range(len(texts))]
+            list_ids = (np.argmax(vectors @ self.centroids.T, axis=1) if self.centroids is not None
+                        else np.full(len(texts), -1))
+
+            # 先追加向量，再提交元数据；中途中断时由 _repair 截断多余向量
+            if self.dtype == "float16":
+                with open(self._vectors_path, 'ab') as f:
+                    f.write(vectors.astype(np.float16).tobytes())
+            else:
+                scales = np.abs(vectors).max(axis=1).astype(np.float32) + 1e-12
+                quantized = np.round(vectors / scales[:, None] * 127).astype(np.int8)
+                with open(self._vectors_path, 'ab') as f:
+                    f.write(quantized.tobytes())
+                with open(self._scales_path, 'ab') as f:
+                    f.write(scales.tobytes())
+
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(start + i, doc_id, int(list_id), metadata.get('year'), metadata.get('report_type'),
+                      text, json.dumps(metadata, ensure_ascii=False))
+                     for i, (doc_id, list_id, text, metadata) in enumerate(zip(ids, list_ids, texts, metadatas))]
+                )
+
+            total = start + len(texts)
+            if total >= self.train_threshold and total >= 4 * max(self.trained_rows, 1):
+                self._train(total)
+        return ids
+
+    def _train(self, rows: int, sample_size: int = 50000) -> None:
+        """训练 IVF 质心并重新分配全部行（调用方持有锁）"""
+        n_lists = max(int(np.sqrt(rows)), 1)
+        rng = np.random.default_rng(42)
+        sample_ids = np.sort(rng.choice(rows, min(rows, sample_size), replace=False))
+        centroids = _kmeans(self._decode(sample_ids, rows), min(n_lists, len(sample_ids)))
+
+        assignments = []
+        for start in range(0, rows, _SCAN_BATCH_ROWS):
+            batch = self._decode(np.arange(start, min(start + _SCAN_BATCH_ROWS, rows)), rows)
+            assignments.extend(np.argmax(batch @ centroids.T, axis=1).tolist())
+        with self._conn:
+            self._conn.executemany("UPDATE rows SET list_id = ? WHERE row_id = ?",
+                                   [(list_id, row_id) for row_id, list_id in enumerate(assignments)])
+
+        np.save(self._centroids_path, centroids)
+        self.centroids = centroids
+        self.trained_rows = rows
+        self._set_meta('trained_rows', rows)
+        logging.info(f"向量索引 {self.directory} 训练完成: {rows} 行, {len(centroids)} 个倒排列表")
+
+    # ---- 检索 ----
+
+    def _candidate_rows(self, query: np.ndarray, conditions: Dict[str, Any], rows: int) -> Optional[np.ndarray]:
+        """确定需要扫描的行号，None 表示扫描全部行（调用方持有锁，质心与 list_id 保持一致）"""
+        clauses, params = [], []
+        for key in ('year', 'report_type'):
+            if conditions.get(key):
+                clauses.append(f"{key} = ?")
+                params.append(conditions[key])
+
+        if self.centroids is not None:
+            probe = np.argsort(-(self.centroids @ query))[:self.nprobe]
+            clauses.append(f"list_id IN ({', '.join('?' for _ in probe)})")
+            params.extend(int(list_id) for list_id in probe)
+        elif not clauses:
+            return None
+
+        row_ids = self._conn.execute(f"SELECT row_id FROM rows WHERE {' AND '.join(clauses)}", params).fetchall()
+        return np.array(sorted(row_id for (row_id,) in row_ids if row_id < rows), dtype=np.int64)
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4,
+                                                          filter: Optional[Dict[str, Any]] = None
+                                                          ) -> List[Tuple[Document, float]]:
+        """
+        按向量检索
+        :param embedding: 查询向量
+        :param k: 返回结果数
+        :param filter: Chroma 风格的等值过滤条件（year、report_type）
+        :return: [(文档, 余弦距离)]，距离越小越相关
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+        # 在锁内取得行数与候选行的快照，之后并发写入的行不参与本次检索
+        with self._lock:
+            rows = self.count()
+            if not rows or not self.dim:
+                return []
+            candidates = self._candidate_rows(query, _where_conditions(filter), rows)
+        best_ids: List[np.ndarray] = []
+        best_scores: List[np.ndarray] = []
+        batches = (np.arange(start, min(start + _SCAN_BATCH_ROWS, rows)) for start in range(0, rows, _SCAN_BATCH_ROWS)) \
+            if candidates is None else (candidates[i:i + _SCAN_BATCH_ROWS] for i in range(0, len(candidates), _SCAN_BATCH_ROWS))
+        for batch in batches:
+            if not len(batch):
+                continue
+            scores = self._decode(batch, rows) @ query
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            best_ids.append(batch[top])
+            best_scores.append(scores[top])
+        if not best_ids:
+            return []
+
+        row_ids = np.concatenate(best_ids)
+        scores = np.concatenate(best_scores)
+        order = np.argsort(-scores)[:k]
+
+        results = []
+        for row_id, score in zip(row_ids[order], scores[order]):
+            with self._lock:
+                doc_id, content, metadata = self._conn.execute(
+                    "SELECT doc_id, content, metadata FROM rows WHERE row_id = ?", (int(row_id),)
+                ).fetchone()
+            results.append((Document(id=doc_id, page_content=content, metadata=json.loads(metadata)),
+                            float(1.0 - score)))
+        return results
@@ -0,0 +1,112 @@
+"""
+model_tiers.py
+
+模型档位配置：调用量大的步骤使用小而快的模型，只有最终综合使用大模型
+1. 两个档位：fast（意图识别回退、逐块的单年报分析、结构化记录抽取、年份合并、对话摘要）
+   与 heavy（多年对比、最终投资建议），各组件的档位可通过 LLM_COMPONENT_TIERS 覆盖
+2. 每个档位的模型名与单价通过环境变量配置，未配置 fast 模型时两档使用同一模型
+3. 用量统计按档位汇总调用次数、token、耗时与费用
+
+环境变量：
+LLM_MODEL_HEAVY=deepseek/deepseek-chat-v3-0324:free
+LLM_MODEL_FAST=qwen/qwen-2.5-7b-instruct
+LLM_PRICE_HEAVY=0.27,1.10          # 每百万输入、输出 token 的价格（美元）
+LLM_PRICE_FAST=0.04,0.10
+LLM_COMPONENT_TIERS="single_report_executor=heavy"
+"""
+
+import os
+import logging
+from typing import Dict, Optional, Tuple
+
+DEFAULT_MODEL = "deepseek/deepseek-chat-v3-0324:free"
+
+TIERS = ("fast", "heavy")
+
+# 各组件默认档位，未列出的组件使用 heavy
+DEFAULT_COMPONENT_TIERS = {
+    'intent_chain': "fast",
+    'single_report_executor': "fast",
+    'year_record': "fast",
+    'comparison_merge': "fast",
+    'memory_summary': "fast",
+    'comparison_executor': "heavy",
+    'final_executor': "heavy",
+}
+
+
+def parse_price(spec: str) -> Tuple[float, float]:
+    """
+    解析单价配置 "输入单价,输出单价"（每百万 token）
+    :param spec: 配置字符串
+    :return: (输入单价, 输出单价)，无效或为空时返回 (0, 0)
+    """
+    try:
+        prompt_price, _, completion_price = (spec or "").partition(',')
+        return float(prompt_price or 0), float(completion_price or 0)
+    except ValueError:
+        logging.warning(f"忽略无效的模型单价配置: {spec}")
+        return 0.0, 0.0
+
+
+def parse_component_tiers(spec: str) -> Dict[str, str]:
+    """
+    解析组件档位配置，如 "single_report_executor=heavy,intent_chain=fast"
+    :param spec: 配置字符串
+    :return: {组件名称: 档位}
+    """
+    tiers = {}
+    for item in (spec or "").split(','):
+        name, _, tier = item.partition('=')
+        if not name.strip():
+            continue
+        if tier.strip() in TIERS:
+            tiers[name.strip()] = tier.strip()
+        else:
+            logging.warning(f"忽略无效的组件档位配置: {item}")
+    return tiers
+
+
+def estimate_cost(prompt_tokens: int, completion_tokens: int, price: Tuple[float, float]) -> float:
+    """
+    按单价计算费用
+    :param prompt_tokens: 输入 token 数
+    :param completion_tokens: 输出 token 数
+    :param price: (输入单价, 输出单价)，每百万 token
+    :return: 费用（美元）
+    """
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+class ModelTiers:
+    """模型档位：组件到档位、档位到模型与单价的映射"""
+
+    def __init__(self, models: Dict[str, str], prices: Optional[Dict[str, Tuple[float, float]]] = None,
+                 component_tiers: Optional[Dict[str, str]] = None):
+        """
+        初始化档位配置
+        :param models: {档位: 模型名}
+        :param prices: {档位: (输入单价, 输出单价)}，每百万 token
+        :param component_tiers: 组件档位，覆盖 DEFAULT_COMPONENT_TIERS
+        """
+        self.models = {tier: models.get(tier) or models.get('heavy') or DEFAULT_MODEL for tier in TIERS}
+        self.prices = {tier: (prices or {}).get(tier, (0.0, 0.0)) for tier in TIERS}
+        self.component_tiers = {**DEFAULT_COMPONENT_TIERS, **(component_tiers or {})}
+
+    @classmethod
+    def from_env(cls) -> "ModelTiers":
+        """从环境变量读取配置，fast 模型未配置时与 heavy 相同"""
+        heavy = os.getenv("LLM_MODEL_HEAVY") or DEFAULT_MODEL
+        return cls(
+            models={'heavy': heavy, 'fast': os.getenv("LLM_MODEL_FAST") or heavy},
+            prices={tier: parse_price(os.getenv(f"LLM_PRICE_{tier.upper()}", "")) for tier in TIERS},
+            component_tiers=parse_component_tiers(os.getenv("LLM_COMPONENT_TIERS", ""))
+        )
+
+    def tier_for(self, component: str) -> str:
+        """组件所用档位"""
+        return self.component_tiers.get(component, "heavy")
+
+    def model_for(self, component: str) -> str:
+        """组件所用模型名"""
+        return self.models[self.tier_for(component)]
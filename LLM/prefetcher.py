@@ -0,0 +1,120 @@
+"""
+prefetcher.py
+
+对话中提到公司时的预取：在意图识别与 agent 规划进行的同时，后台准备该公司的年报数据
+1. 在本地解析消息中提到的公司：6位股票代码、已入库公司的简称、资料库中收录的公司名称；
+   未入库、未收录的6位数字只有符合A股代码前缀且后面不跟金额、数量单位时才视为股票代码，
+   避免“营收300000元”之类的数字触发后台下载
+2. 已入库的公司只预热向量分片；未入库的公司在后台执行 下载 -> 解析 -> 向量化，
+   下载经过工具结果缓存，agent 随后调用 download_stock_reports 时共享同一次下载
+3. 同一公司的预取不重复执行：进行中的预取被复用，完成后在冷却时间内不再重复
+4. report_retriever 检索某公司时，如该公司的预取仍在进行，最多等待 wait_timeout 秒
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from LLM.report_store import find_stock_codes
+
+
+def resolve_stock_mentions(message: str, report_index: Dict[str, Dict[str, Any]], profile_store=None) -> List[str]:
+    """
+    解析消息中提到的股票代码
+    :param message: 用户消息
+    :param report_index: ReportStore.index，{股票代码: {'name', 'years', ...}}
+    :param profile_store: ProfileStore，可为空
+    :return: 按出现来源去重后的股票代码列表
+    """
+    codes = find_stock_codes(message, report_index)
+    codes += [code for code, entry in report_index.items() if entry.get('name') and entry['name'] in message]
+    if profile_store is not None:
+        codes += [profile['code'] for profile in profile_store.find_companies(message)]
+    return list(dict.fromkeys(codes))
+
+
+class ReportPrefetcher:
+    """按公司去重的后台预取器"""
+
+    def __init__(self, is_ready: Callable[[str], bool], ingest: Callable[[str], Any],
+                 warm: Optional[Callable[[str], Any]] = None, max_workers: int = 2,
+                 cooldown: float = 600.0, wait_timeout: float = 30.0):
+        """
+        初始化预取器
+        :param is_ready: 判断公司年报是否已入库
+        :param ingest: 下载并入库公司年报
+        :param warm: 预热已入库公司的数据（如打开向量分片）
+        :param max_workers: 后台线程数
+        :param cooldown: 同一公司两次预取之间的最短间隔（秒）
+        :param wait_timeout: wait 的默认最长等待时间（秒）
+        """
+        self.is_ready = is_ready
+        self.ingest = ingest
+        self.warm = warm
+        self.cooldown = cooldown
+        self.wait_timeout = wait_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._futures: Dict[str, Future] = {}
+        self._finished_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.stats = {'warmed': 0, 'ingested': 0, 'skipped': 0, 'errors': 0}
+
+    def _run(self, code: str) -> str:
+        try:
+            if self.is_ready(code):
+                if self.warm:
+                    self.warm(code)
+                outcome = 'warmed'
+            else:
+                logging.info(f"预取：{code} 的年报尚未入库，后台开始下载与入库")
+                self.ingest(code)
+                outcome = 'ingested'
+        except Exception as e:
+            logging.error(f"预取 {code} 时出错: {str(e)}")
+            outcome = 'errors'
+        with self._lock:
+            self.stats[outcome] += 1
+            self._finished_at[code] = time.monotonic()
+        return outcome
+
+    def prefetch(self, stock_codes: List[str]) -> List[Future]:
+        """
+        为多家公司启动预取，立即返回
+        :param stock_codes: 股票代码列表
+        :return: 新启动或进行中的预取任务
+        """
+        futures = []
+        now = time.monotonic()
+        with self._lock:
+            for code in stock_codes:
+                future = self._futures.get(code)
+                if future is not None and not future.done():
+                    futures.append(future)
+                elif now - self._finished_at.get(code, float('-inf')) < self.cooldown:
+                    self.stats['skipped'] += 1
+                else:
+                    future = self._futures[code] = self._executor.submit(self._run, code)
+                    futures.append(future)
+        return futures
+
+    def wait(self, stock_code: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        等待某公司进行中的预取完成
+        :param stock_code: 股票代码
+        :param timeout: 最长等待时间（秒），默认 wait_timeout
+        :return: 预取结果（warmed/ingested/errors），没有预取或等待超时时返回 None
+        """
+        with self._lock:
+            future = self._futures.get(stock_code)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=self.wait_timeout if timeout is None else timeout)
+        except Exception:
+            logging.warning(f"等待 {stock_code} 的预取超时，使用当前已入库的数据")
+            return None
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,372 @@
+"""
+profile_store.py
+
+本地公司与行业资料库，wiki_search 工具优先查询，未命中时才访问外部来源：
+1. 资料来自已采集的数据：入库年报中的公司简介/业务概要章节、get_stock_detail 返回的股票详细信息，
+   以及外部查询（维基百科）的结果，统一保存在 SQLite（results/profiles.sqlite）
+2. 内存中维护代码、名称与二元组索引，支持股票代码、全称、简称（"茅台" -> "贵州茅台"）、
+   句子中包含的公司名以及相近名称的模糊查找
+3. 行业资料由已收录公司的行业字段汇总得到，可叠加外部查询到的行业介绍
+4. 外部来源可替换：LiveProfileSource 调用 akshare 与维基百科，OfflineProfileSource 从本地 JSON 读取，
+   用于离线运行和测试（环境变量 PROFILE_SOURCE=offline:路径）
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from LLM.lexical_index import tokenize
+
+_STOCK_CODE_PATTERN = re.compile(r'(?<!\d)(\d{6})(?!\d)')
+_INDUSTRY_SUFFIX_PATTERN = re.compile(r'(行业|板块|产业)$')
+
+# 年报中包含公司概况的章节标题关键词
+OVERVIEW_SECTION_KEYWORDS = ["公司简介", "公司基本情况", "业务概要", "主要业务", "主营业务"]
+# get_stock_detail 字段到资料字段的映射
+DETAIL_FIELDS = {
+    '股票代码': 'code', '股票简称': 'name', '行业': 'industry', '上市时间': 'listing_date',
+    '总市值': 'market_cap', '总股本': 'total_shares', '员工人数': 'employees',
+    '主营业务': 'main_business', '公司简介': 'intro',
+}
+# 公司资料中有实际内容的字段，只有代码、名称等字段的资料不算命中
+DETAIL_KEYS = ('intro', 'industry', 'main_business')
+PROFILE_LABELS = [
+    ('industry', "所属行业"), ('listing_date', "上市时间"), ('market_cap', "总市值"),
+    ('total_shares', "总股本"), ('employees', "员工人数"), ('main_business', "主营业务"), ('intro', "公司简介"),
+]
+
+
+def _normalize_name(name: str) -> str:
+    return re.sub(r'\s+', "", str(name or "")).lower()
+
+
+def _dice(a: set, b: set) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+def profile_from_stock_detail(detail: Any) -> Optional[Dict[str, Any]]:
+    """
+    将 get_stock_detail 的结果（单行 DataFrame 或字典）转换为公司资料
+    :param detail: 股票详细信息
+    :return: 资料字典，缺少股票代码时返回 None
+    """
+    if hasattr(detail, 'to_dict'):
+        if getattr(detail, 'empty', False):
+            return None
+        records = detail.to_dict('records')
+        detail = records[0] if records else {}
+    profile = {field: str(detail[key]) for key, field in DETAIL_FIELDS.items()
+               if key in detail and detail[key] not in (None, "")}
+    if not profile.get('code'):
+        return None
+    profile['code'] = profile['code'].zfill(6)
+    return profile
+
+
+def profile_from_report(report_info: Dict[str, Any], sections: List[Dict[str, Any]],
+                        max_chars: int = 600) -> Optional[Dict[str, Any]]:
+    """
+    从年报的概况类章节提取公司资料
+    :param report_info: parse_report_filename 的结果
+    :param sections: 章节列表（content + metadata.section_path）
+    :param max_chars: 简介最大字数
+    :return: 资料字典，没有概况类章节时只包含代码与名称
+    """
+    if not report_info.get('stock_code'):
+        return None
+    profile = {'code': report_info['stock_code'], 'name': report_info.get('company_name', "")}
+    if report_info.get('year'):
+        profile['report_year'] = str(report_info['year'])
+    for keyword in OVERVIEW_SECTION_KEYWORDS:
+        for section in sections:
+            path = section.get('metadata', {}).get('section_path') or []
+            content = " ".join((section.get('content') or "").split())
+            if content and any(keyword in str(part) for part in path):
+                profile['intro'] = content[:max_chars]
+                return profile
+    return profile
+
+
+def has_profile_details(profile: Dict[str, Any]) -> bool:
+    """
+    资料是否有实际内容：行业汇总与条目总是有，公司资料需至少包含简介、行业或主营业务之一
+    :param profile: lookup 的结果
+    """
+    return profile['kind'] != 'company' or any(profile.get(key) for key in DETAIL_KEYS)
+
+
+class ProfileStore:
+    """SQLite 持久化、内存索引的公司与行业资料库"""
+
+    def __init__(self, database_path: str, max_age_days: float = 30):
+        """
+        初始化资料库
+        :param database_path: SQLite 文件路径
+        :param max_age_days: 资料有效期（天），过期的资料视为未命中，由外部来源刷新
+        """
+        self.database_path = database_path
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self._lock = threading.Lock()
+        directory = os.path.dirname(database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS profiles (
+                    key TEXT PRIMARY KEY, kind TEXT, code TEXT, name TEXT,
+                    data TEXT, source TEXT, updated_at REAL
+                )
+            """)
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self._by_code: Dict[str, str] = {}
+        self._by_name: Dict[str, str] = {}
+        self._terms: Dict[str, set] = {}
+        self._load()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.database_path)
+
+    def _load(self) -> None:
+        """从 SQLite 加载全部资料并建立内存索引"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT key, kind, code, name, data, source, updated_at FROM profiles").fetchall()
+        for key, kind, code, name, data, source, updated_at in rows:
+            self._index({'key': key, 'kind': kind, 'code': code, 'name': name, 'source': source,
+                         'updated_at': updated_at, **json.loads(data or "{}")})
+
+    def _index(self, profile: Dict[str, Any]) -> None:
+        key = profile['key']
+        self._profiles[key] = profile
+        if profile.get('code'):
+            self._by_code[profile['code']] = key
+        name = _normalize_name(profile.get('name'))
+        if name:
+            self._by_name[name] = key
+            for term in set(tokenize(name)):
+                self._terms.setdefault(term, set()).add(name)
+
+    def _save(self, key: str, kind: str, code: str, name: str, data: Dict[str, Any], source: str) -> Dict[str, Any]:
+        """合并已有字段后写入 SQLite 并更新索引"""
+        with self._lock:
+            existing = self._profiles.get(key, {})
+            merged = {k: v for k, v in existing.items()
+                      if k not in ('key', 'kind', 'code', 'name', 'source', 'updated_at')}
+            merged.update({k: v for k, v in data.items() if v not in (None, "")})
+            name = name or existing.get('name', "")
+            sources = sorted(set(filter(None, (existing.get('source') or "").split(','))) | {source})
+            profile = {'key': key, 'kind': kind, 'code': code, 'name': name, 'source': ",".join(sources),
+                       'updated_at': time.time(), **merged}
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO profiles (key, kind, code, name, data, source, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, kind, code, name, json.dumps(merged, ensure_ascii=False), profile['source'],
+                     profile['updated_at'])
+                )
+            self._index(profile)
+            return profile
+
+    def upsert_company(self, profile: Dict[str, Any], source: str) -> Dict[str, Any]:
+        """
+        写入或合并公司资料
+        :param profile: 至少包含 code，可包含 name、industry、intro 等字段
+        :param source: 来源，如 report、stock_detail、wiki
+        :return: 合并后的资料
+        """
+        data = {k: v for k, v in profile.items() if k not in ('code', 'name')}
+        existing_year = str(self._profiles.get(profile['code'], {}).get('report_year', ""))
+        if 'report_year' in data and existing_year > str(data['report_year']):
+            # 已有更新年份年报的简介时，不被较早的年报覆盖
+            data = {k: v for k, v in data.items() if k not in ('intro', 'report_year')}
+        return self._save(profile['code'], 'company', profile['code'], profile.get('name', ""), data, source)
+
+    def upsert_entry(self, name: str, text: str, source: str) -> Dict[str, Any]:
+        """
+        写入公司或行业以外的条目（如外部查询到的行业介绍）
+        :param name: 条目名称
+        :param text: 内容
+        :param source: 来源
+        """
+        return self._save(f"entry:{_normalize_name(name)}", 'entry', "", name, {'intro': text}, source)
+
+    def _fresh(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        profile = self._profiles.get(key) if key else None
+        if profile and time.time() - profile['updated_at'] <= self.max_age_seconds:
+            return profile
+        return None
+
+    def _industry_profile(self, query: str) -> Optional[Dict[str, Any]]:
+        """按行业名称汇总已收录公司"""
+        industry = _INDUSTRY_SUFFIX_PATTERN.sub("", query.strip())
+        if len(industry) < 2:
+            return None
+        companies = [profile for profile in self._profiles.values()
+                     if profile['kind'] == 'company' and industry in str(profile.get('industry', ""))]
+        if not companies:
+            return None
+        entry = self._fresh(self._by_name.get(_normalize_name(query)) or
+                            self._by_name.get(_normalize_name(industry)))
+        return {'kind': 'industry', 'name': industry, 'intro': entry.get('intro', "") if entry else "",
+                'companies': [(profile['code'], profile['name']) for profile in
+                              sorted(companies, key=lambda p: p['code'])]}
+
+    def lookup(self, query: str, min_score: float = 0.5) -> Optional[Dict[str, Any]]:
+        """
+        查找公司、行业或条目资料
+        顺序：股票代码 -> 名称完全匹配 -> 行业汇总 -> 查询中包含的最长名称 -> 包含查询的最短名称 -> 二元组相似度
+        :param query: 查询文本
+        :param min_score: 相似度匹配的最低 Dice 系数
+        :return: 资料字典，未命中或已过期时返回 None
+        """
+        query = (query or "").strip()
+        if not query:
+            return None
+        with self._lock:
+            code_match = _STOCK_CODE_PATTERN.search(query)
+            if code_match and self._fresh(self._by_code.get(code_match.group(1))):
+                return self._fresh(self._by_code[code_match.group(1)])
+
+            normalized = _normalize_name(query)
+            exact = self._fresh(self._by_name.get(normalized))
+            if exact and exact['kind'] == 'company':
+                return exact
+            industry = self._industry_profile(query)
+            if industry:
+                return industry
+            if exact:
+                return exact
+
+            terms = set(tokenize(normalized))
+            candidates = set()
+            for term in terms:
+                candidates |= self._terms.get(term, set())
+
+            contained = [name for name in candidates if len(name) >= 2 and name in normalized]
+            if contained:
+                return self._fresh(self._by_name[max(contained, key=len)])
+            containing = [name for name in candidates if len(normalized) >= 2 and normalized in name]
+            if containing:
+                return self._fresh(self._by_name[min(containing, key=len)])
+
+            scored = [(_dice(terms, set(tokenize(name))), name) for name in candidates]
+            scored = [item for item in scored if item[0] >= min_score]
+            if scored:
+                return self._fresh(self._by_name[max(scored)[1]])
+        return None
+
+    def find_companies(self, text: str) -> List[Dict[str, Any]]:
+        """
+        找出文本中提到的已收录公司（股票代码或名称出现在文本中），不检查有效期
+        :param text: 文本，如用户消息
+        :return: 公司资料列表
+        """
+        normalized = _normalize_name(text)
+        if not normalized:
+            return []
+        with self._lock:
+            keys = [self._by_code[code] for code in _STOCK_CODE_PATTERN.findall(text) if code in self._by_code]
+            candidates = set()
+            for term in set(tokenize(normalized)):
+                candidates |= self._terms.get(term, set())
+            keys += [self._by_name[name] for name in candidates if len(name) >= 2 and name in normalized]
+            companies = [self._profiles[key] for key in dict.fromkeys(keys)]
+        return [profile for profile in companies if profile['kind'] == 'company']
+
+    def count(self) -> int:
+        return len(self._profiles)
+
+
+def format_profile(profile: Dict[str, Any]) -> str:
+    """
+    将资料渲染为工具输出文本
+    :param profile: lookup 的结果
+    :return: 文本
+    """
+    if profile['kind'] == 'industry':
+        lines = [f"行业：{profile['name']}"]
+        if profile.get('intro'):
+            lines.append(profile['intro'])
+        names = "、".join(f"{name}({code})" for code, name in profile['companies'][:20])
+        lines.append(f"本地已收录该行业公司 {len(profile['companies'])} 家：{names}")
+        return "\n".join(lines)
+    if profile['kind'] == 'entry':
+        return f"{profile['name']}：{profile.get('intro', '')}"
+
+    lines = [f"公司：{profile.get('name', '')}（{profile.get('code', '')}）"]
+    for field, label in PROFILE_LABELS:
+        if profile.get(field):
+            lines.append(f"{label}：{profile[field]}")
+    if profile.get('report_year'):
+        lines.append(f"资料来源：{profile.get('source', '')}，最近年报 {profile['report_year']} 年")
+    return "\n".join(lines)
+
+
+class LiveProfileSource:
+    """外部来源：akshare 股票详细信息与维基百科"""
+
+    def __init__(self, fetch_detail: Optional[Callable[[str], Any]] = None):
+        """
+        :param fetch_detail: 获取股票详细信息的函数，默认 analyze.stock_data_fetcher.get_stock_detail
+        """
+        self._fetch_detail = fetch_detail
+        self._wiki = None
+
+    def stock_detail(self, stock_code: str) -> Optional[Dict[str, Any]]:
+        """获取股票详细信息并转换为公司资料"""
+        if self._fetch_detail is None:
+            from analyze.stock_data_fetcher import get_stock_detail
+            self._fetch_detail = get_stock_detail
+        return profile_from_stock_detail(self._fetch_detail(stock_code))
+
+    def search(self, query: str) -> Optional[str]:
+        """
+        在维基百科中搜索
+        :return: 条目内容，没有精确匹配时返回 None
+        """
+        if self._wiki is None:
+            from langchain_community.docstore.wikipedia import Wikipedia
+            self._wiki = Wikipedia()
+        result = self._wiki.search(query)
+        if isinstance(result, str):
+            return None
+        return result.page_content
+
+
+class OfflineProfileSource:
+    """离线来源：从本地 JSON 读取，格式 {"companies": {"代码": {get_stock_detail 字段}}, "entries": {"名称": "内容"}}"""
+
+    def __init__(self, path: Optional[str] = None, data: Optional[Dict[str, Any]] = None):
+        if data is None:
+            data = {}
+            if path and os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+        self.companies = data.get('companies', {})
+        self.entries = data.get('entries', {})
+        self.calls = 0
+
+    def stock_detail(self, stock_code: str) -> Optional[Dict[str, Any]]:
+        self.calls += 1
+        detail = self.companies.get(stock_code)
+        return profile_from_stock_detail({'股票代码': stock_code, **detail}) if detail else None
+
+    def search(self, query: str) -> Optional[str]:
+        self.calls += 1
+        return self.entries.get(query.strip())
+
+
+def build_profile_source(spec: str = "live"):
+    """
+    按配置创建外部来源
+    :param spec: live（默认）或 offline:JSON路径
+    """
+    if spec and spec.startswith("offline"):
+        _, _, path = spec.partition(":")
+        logging.info(f"公司资料使用离线来源 {path or '（空）'}")
+        return OfflineProfileSource(path or None)
+    return LiveProfileSource()
@@ -0,0 +1,345 @@
+"""
+report_store.py
+
+按公司分片的年报向量存储：
+1. 每家公司一个 Chroma collection（reports_{股票代码}），检索时只搜索相关公司的分片
+2. 文本块元数据包含 stock_code、company_name、year、report_type、section_path，支持按年份、报告类型过滤
+3. index.json 记录已入库的公司及年份，用于从查询中识别公司名称、在无公司过滤时确定需要搜索的分片；
+   多个实例（如对话分析器与后台任务分析器）共用同一目录时，入库在文件锁内重新读取并合并 index.json 后原子替换，
+   各实例发现 index.json 被更新后重新读取
+4. 入库时同步写入本地 BM25 倒排索引（与 vector_store 同级的 lexical_index.sqlite），
+   hybrid_search 将词法与向量结果按倒数排名融合，弥补向量检索对财务科目名称、数值的漏召回
+5. 向量后端可选 Chroma（默认）或内存映射 IVF 索引（mmap_index.MmapVectorIndex），两者按相同接口按公司分片
+6. 查询向量与检索结果使用 LRU 缓存，本实例入库或发现其他实例更新 index.json 时递增 generation，使已缓存的检索结果失效
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from LLM.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from LLM.mmap_index import MmapVectorIndex
+from LLM.retrieval_cache import RetrievalCache
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，index.json 只在进程内加锁
+    fcntl = None
+
+# 检索工具输入中可显式指定的过滤条件，如 "code=000001 year=2023 section=风险 主要风险有哪些"
+_EXPLICIT_FILTER_PATTERN = re.compile(r'(?<![A-Za-z])(code|year|type|section)\s*=\s*(\S+)')
+_STOCK_CODE_PATTERN = re.compile(r'(?<![\d.])(\d{6})(?![\d.])(\s*[元万亿千百股%‰个家人吨台辆户倍])?')
+# 沪市主板 600/601/603/605、科创板 688/689、深市主板 000~003、创业板 300/301、北交所 43/83/87/920
+_A_SHARE_CODE_PATTERN = re.compile(r'^(60[0135]|68[89]|00[0-3]|30[01]|43|83|87|920)\d+$')
+_YEAR_PATTERN = re.compile(r'(?<!\d)(20\d{2})(?!\d)\s*年?')
+
+
+def parse_report_filename(file_path: str) -> Dict[str, Any]:
+    """
+    从 {代码}_{简称}_{年份}.pdf/.txt 文件名中解析报告信息
+    :param file_path: 文件路径
+    :return: 包含 stock_code、company_name、year、report_type 的字典
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    parts = stem.split('_')
+    year = parts[2] if len(parts) > 2 else ""
+    return {
+        'stock_code': parts[0].zfill(6) if parts and parts[0].isdigit() else (parts[0] if parts else ""),
+        'company_name': parts[1] if len(parts) > 1 else "",
+        'year': int(year) if year.isdigit() else 0,
+        'report_type': "annual",
+    }
+
+
+def find_stock_codes(text: str, known_codes=()) -> List[str]:
+    """
+    识别文本中的6位股票代码
+    已入库的代码直接认可；其他6位数字只有符合A股代码前缀且后面不跟金额、数量单位时才视为股票代码，
+    避免“营收300000元”之类的数字被当作公司
+    :param text: 文本
+    :param known_codes: 已知的股票代码（如 ReportStore.index）
+    :return: 按出现顺序排列的股票代码
+    """
+    return [code for code, unit in _STOCK_CODE_PATTERN.findall(text or "")
+            if code in known_codes or (not unit and _A_SHARE_CODE_PATTERN.match(code))]
+
+
+class ReportStore:
+    """按公司分片、带元数据过滤的年报向量存储"""
+
+    def __init__(self, persist_directory: str, embeddings, collection_prefix: str = "reports",
+                 lexical_index_path: Optional[str] = None, cache_size: int = 256,
+                 backend: str = "chroma", vector_dtype: str = "float16"):
+        """
+        初始化存储
+        :param persist_directory: 向量库持久化目录
+        :param embeddings: langchain Embeddings 对象
+        :param collection_prefix: collection 名称前缀
+        :param lexical_index_path: BM25 索引文件路径，默认与持久化目录同级的 lexical_index.sqlite
+        :param cache_size: 检索结果缓存条目数，为 0 时不缓存
+        :param backend: 向量后端，chroma 或 mmap
+        :param vector_dtype: mmap 后端的向量存储精度，float16 或 int8
+        """
+        if backend not in ("chroma", "mmap"):
+            raise ValueError(f"不支持的向量后端: {backend}")
+        self.persist_directory = persist_directory
+        self.embeddings = embeddings
+        self.collection_prefix = collection_prefix
+        self.backend = backend
+        self.vector_dtype = vector_dtype
+        os.makedirs(persist_directory, exist_ok=True)
+        self._client = None
+        if backend == "chroma":
+            # chromadb 导入较慢，只在使用 Chroma 后端时导入
+            import chromadb
+
+            self._client = chromadb.PersistentClient(path=persist_directory)
+        self._collections: Dict[str, Any] = {}
+        self._index_path = os.path.join(persist_directory, 'index.json')
+        self._lock = threading.Lock()
+        # 每次入库或重新读取 index.json 时递增，检索结果缓存以此判断是否过期
+        self.generation = 0
+        self._index: Dict[str, Dict[str, Any]] = {}
+        # 最近一次读取或写入时 index.json 的 (inode, 修改时间, 大小)
+        self._index_stamp = None
+        self._refresh_index()
+        self.lexical_index = LexicalIndex(lexical_index_path or os.path.join(
+            os.path.dirname(os.path.abspath(persist_directory)), 'lexical_index.sqlite'
+        ))
+        self.cache = RetrievalCache(max_entries=cache_size)
+
+    @property
+    def index(self) -> Dict[str, Dict[str, Any]]:
+        """已入库公司索引：{股票代码: {'name': 简称, 'years': [...]}}，其他实例更新 index.json 后重新读取"""
+        self._refresh_index()
+        return self._index
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        """读取已入库公司索引：{股票代码: {'name': 简称, 'years': [...]}}"""
+        if os.path.exists(self._index_path):
+            try:
+                with open(self._index_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                logging.error(f"读取向量库索引 {self._index_path} 时出错: {str(e)}")
+        return {}
+
+    def _index_file_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self._index_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _refresh_index(self) -> None:
+        """index.json 与上次读取或写入时不同（被其他实例更新）时重新读取，并使检索缓存失效"""
+        if self._index_file_stamp() == self._index_stamp:
+            return
+        with self._lock:
+            stamp = self._index_file_stamp()
+            if stamp != self._index_stamp:
+                self._index = self._load_index()
+                self._index_stamp = stamp
+                self.generation += 1
+
+    @contextmanager
+    def _index_file_lock(self):
+        """更新 index.json 的文件锁，其他进程以及同一进程中的其他实例互斥"""
+        if fcntl is None:
+            yield
+            return
+        with open(self._index_path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save_index(self, index: Dict[str, Dict[str, Any]]) -> None:
+        """写入临时文件后原子替换，读取方不会读到写了一半的 index.json"""
+        temp_path = f"{self._index_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self._index_path)
+
+    def get_collection(self, stock_code: str):
+        """获取（必要时创建）指定公司的分片：Chroma collection 或 MmapVectorIndex"""
+        with self._lock:
+            if stock_code not in self._collections:
+                name = f"{self.collection_prefix}_{stock_code}"
+                if self.backend == "mmap":
+                    self._collections[stock_code] = MmapVectorIndex(
+                        os.path.join(self.persist_directory, name), self.embeddings, dtype=self.vector_dtype
+                    )
+                else:
+                    from langchain_chroma import Chroma
+
+                    self._collections[stock_code] = Chroma(
+                        collection_name=name,
+                        embedding_function=self.embeddings,
+                        client=self._client,
+                        collection_metadata={"hnsw:space": "cosine"}
+                    )
+            return self._collections[stock_code]
+
+    def add_chunks(self, texts: List[str], metadatas: List[Dict[str, Any]]) -> int:
+        """
+        写入文本块，按 stock_code 分发到对应公司的 collection
+        :param texts: 文本块列表
+        :param metadatas: 元数据列表，需包含 stock_code、company_name、year
+        :return: 写入的文本块数量
+        """
+        grouped: Dict[str, Tuple[List[str], List[Dict[str, Any]]]] = {}
+        for text, metadata in zip(texts, metadatas):
+            group = grouped.setdefault(metadata['stock_code'], ([], []))
+            group[0].append(text)
+            group[1].append(metadata)
+
+        for stock_code, (group_texts, group_metadatas) in grouped.items():
+            # 向量库与倒排索引使用相同的ID，便于融合去重
+            ids = [uuid.uuid4().hex for _ in group_texts]
+            self.get_collection(stock_code).add_texts(texts=group_texts, metadatas=group_metadatas, ids=ids)
+            self.lexical_index.add_documents(ids, group_texts, group_metadatas)
+
+        # 在锁内以磁盘上的 index.json 为准合并本次入库的公司与年份，不覆盖其他实例写入的条目
+        with self._lock, self._index_file_lock():
+            index = self._load_index()
+            for stock_code, (_, group_metadatas) in grouped.items():
+                entry = index.setdefault(stock_code, {'name': "", 'years': []})
+                entry['name'] = group_metadatas[0].get('company_name') or entry['name']
+                entry['years'] = sorted(set(entry['years']) | {m['year'] for m in group_metadatas if m.get('year')})
+            self._save_index(index)
+            self._index = index
+            self._index_stamp = self._index_file_stamp()
+            self.generation += 1
+        return len(texts)
+
+    def parse_query_filters(self, query: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        从检索输入中解析过滤条件
+        支持显式写法 code=000001 year=2023 type=annual section=风险，
+        也会识别查询中的股票代码（见 find_stock_codes）、已入库公司的简称和年份。
+        :param query: 检索输入
+        :return: (去除显式过滤条件后的查询文本, 过滤条件字典)
+        """
+        filters: Dict[str, Any] = {}
+        for key, value in _EXPLICIT_FILTER_PATTERN.findall(query):
+            if key == 'code':
+                filters['stock_code'] = value
+            elif key == 'year' and value.isdigit():
+                filters['year'] = int(value)
+            elif key == 'type':
+                filters['report_type'] = value
+            elif key == 'section':
+                filters['section'] = value
+        text = _EXPLICIT_FILTER_PATTERN.sub("", query).strip()
+
+        if 'stock_code' not in filters:
+            codes = find_stock_codes(text, self.index)
+            if codes:
+                filters['stock_code'] = codes[0]
+            else:
+                for stock_code, entry in self.index.items():
+                    if entry.get('name') and entry['name'] in text:
+                        filters['stock_code'] = stock_code
+                        break
+
+        if 'year' not in filters:
+            year_match = _YEAR_PATTERN.search(text)
+            if year_match:
+                filters['year'] = int(year_match.group(1))
+
+        return text or query, filters
+
+    @staticmethod
+    def _build_where(filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """将过滤条件转换为 Chroma where 表达式（section 在检索后按路径过滤）"""
+        conditions = [{key: filters[key]} for key in ('year', 'report_type') if filters.get(key)]
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def search(self, query: str, k: int = 3, stock_code: Optional[str] = None, year: Optional[int] = None,
+               report_type: Optional[str] = None, section: Optional[str] = None) -> List[Tuple[Document, float]]:
+        """
+        在相关分片中检索
+        :param query: 查询文本
+        :param k: 返回结果数
+        :param stock_code: 股票代码，指定时只搜索该公司的 collection
+        :param year: 报告年份
+        :param report_type: 报告类型，如 annual
+        :param section: 章节关键词，匹配 section_path
+        :return: [(文档, 余弦距离)]，距离越小越相关
+        """
+        filters = {'stock_code': stock_code, 'year': year, 'report_type': report_type, 'section': section}
+        self._refresh_index()
+        return self.cache.get_or_compute(
+            RetrievalCache.make_key('vector', query, filters, k), self.generation,
+            lambda: self._vector_search(query, k, **filters)
+        )
+
+    def _vector_search(self, query: str, k: int, stock_code: Optional[str] = None, year: Optional[int] = None,
+                       report_type: Optional[str] = None, section: Optional[str] = None) -> List[Tuple[Document, float]]:
+        """执行向量检索（不经过结果缓存）"""
+        if stock_code:
+            stock_codes = [stock_code] if stock_code in self.index else []
+        else:
+            stock_codes = [code for code, entry in self.index.items() if not year or year in entry['years']]
+        if not stock_codes:
+            return []
+
+        # 查询向量只计算一次，在各分片间复用
+        query_vector = self.cache.embed_query(query, self.embeddings.embed_query)
+        where = self._build_where({'year': year, 'report_type': report_type})
+        fetch_k = k * 4 if section else k
+        results: List[Tuple[Document, float]] = []
+        for code in stock_codes:
+            results.extend(self.get_collection(code).similarity_search_by_vector_with_relevance_scores(
+                embedding=query_vector, k=fetch_k, filter=where
+            ))
+
+        if section:
+            results = [(doc, score) for doc, score in results if section in doc.metadata.get('section_path', "")]
+        results.sort(key=lambda item: item[1])
+        return results[:k]
+
+    def hybrid_search(self, query: str, k: int = 3, stock_code: Optional[str] = None, year: Optional[int] = None,
+                      report_type: Optional[str] = None, section: Optional[str] = None,
+                      candidates: int = 10) -> List[Tuple[Document, float]]:
+        """
+        词法（BM25）与向量检索的融合检索
+        :param query: 查询文本
+        :param k: 返回结果数
+        :param candidates: 每路检索的候选数量
+        :return: [(文档, 融合得分)]，得分越高越相关
+        """
+        filters = {'stock_code': stock_code, 'year': year, 'report_type': report_type, 'section': section}
+        self._refresh_index()
+        return self.cache.get_or_compute(
+            RetrievalCache.make_key(f'hybrid:{candidates}', query, filters, k), self.generation,
+            lambda: self._hybrid_search(query, k, candidates, **filters)
+        )
+
+    def _hybrid_search(self, query: str, k: int, candidates: int, stock_code: Optional[str] = None,
+                       year: Optional[int] = None, report_type: Optional[str] = None,
+                       section: Optional[str] = None) -> List[Tuple[Document, float]]:
+        """执行融合检索（不经过结果缓存）"""
+        vector_results = self.search(query, k=candidates, stock_code=stock_code, year=year,
+                                     report_type=report_type, section=section)
+        lexical_results = self.lexical_index.search(query, k=candidates * 4 if section else candidates,
+                                                    stock_code=stock_code, year=year, report_type=report_type)
+        if section:
+            lexical_results = [(doc, score) for doc, score in lexical_results
+                               if section in doc.metadata.get('section_path', "")]
+
+        return reciprocal_rank_fusion(
+            [[doc for doc, _ in vector_results], [doc for doc, _ in lexical_results[:candidates]]],
+            k=k
+        )
@@ -0,0 +1,104 @@
+"""
+retrieval_cache.py
+
+年报检索结果的进程内 LRU 缓存：
+1. 查询向量按规范化后的查询文本缓存，同一查询不再重复计算向量
+2. top-k 检索结果按（检索方式、规范化查询、过滤条件、k）缓存
+3. 检索结果与向量库的代数（generation）绑定，入库使代数递增后旧结果全部失效；
+   查询向量与库内容无关，不随入库失效
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from LLM.intent_classifier import normalize_message
+
+
+class RetrievalCache:
+    """查询向量与检索结果的 LRU 缓存"""
+
+    def __init__(self, max_entries: int = 256, max_embeddings: int = 1024):
+        """
+        初始化缓存
+        :param max_entries: 检索结果缓存条目数，为 0 时不缓存
+        :param max_embeddings: 查询向量缓存条目数，为 0 时不缓存
+        """
+        self.max_entries = max_entries
+        self.max_embeddings = max_embeddings
+        self._results: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(method: str, query: str, filters: Dict[str, Any], k: int) -> Tuple:
+        """生成检索结果缓存键，忽略值为空的过滤条件"""
+        filter_items = tuple(sorted((key, value) for key, value in filters.items() if value))
+        return method, normalize_message(query), filter_items, k
+
+    def embed_query(self, query: str, embed_fn: Callable[[str], List[float]]) -> List[float]:
+        """
+        获取查询向量，未命中时调用 embed_fn 计算
+        :param query: 查询文本
+        :param embed_fn: 向量计算函数，如 embeddings.embed_query
+        :return: 查询向量
+        """
+        key = normalize_message(query) or query
+        with self._lock:
+            if key in self._embeddings:
+                self._embeddings.move_to_end(key)
+                return self._embeddings[key]
+
+        vector = embed_fn(query)
+        if self.max_embeddings:
+            with self._lock:
+                self._embeddings[key] = vector
+                while len(self._embeddings) > self.max_embeddings:
+                    self._embeddings.popitem(last=False)
+        return vector
+
+    def get_or_compute(self, key: Tuple, generation: int, compute: Callable[[], List]) -> List:
+        """
+        获取检索结果，未命中或向量库代数变化时调用 compute 重新检索
+        :param key: make_key 生成的缓存键
+        :param generation: 向量库当前代数
+        :param compute: 检索函数
+        :return: 检索结果列表（副本）
+        """
+        with self._lock:
+            if generation != self._generation:
+                if self._results:
+                    logging.debug(f"向量库已更新（代数 {generation}），清空 {len(self._results)} 条检索缓存")
+                self._results.clear()
+                self._generation = generation
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return list(self._results[key])
+            self.misses += 1
+
+        results = compute()
+        if self.max_entries:
+            with self._lock:
+                # 检索期间发生入库时不写入，避免缓存过期结果
+                if generation == self._generation:
+                    self._results[key] = list(results)
+                    while len(self._results) > self.max_entries:
+                        self._results.popitem(last=False)
+        return results
+
+    def clear(self) -> None:
+        """清空全部缓存"""
+        with self._lock:
+            self._results.clear()
+            self._embeddings.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中统计"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(self._results), 'embeddings': len(self._embeddings)}
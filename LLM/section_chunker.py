@@ -0,0 +1,170 @@
+"""
+section_chunker.py
+
+按目录结构切分年报：
+1. 以 pdf_parser 输出的章节记录为单位，文本块不跨越 section_path 边界
+2. 只有超过 chunk_size 的章节才按句子边界切分，相邻块之间最多重叠一个短句
+3. 每个文本块携带章节元数据（section_path、section_id、page）及重叠字节数，
+   便于统计文本块数量与重叠带来的额外向量化/LLM开销
+4. 装箱为 LLM 输入时，章节标题、块间分隔符与统一前缀都计入 chunk_size，装箱结果整体不超过 chunk_size
+"""
+
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 句子结束标点（含换行），切分时标点保留在句尾
+_SENTENCE_END_PATTERN = re.compile(r'(?<=[。！？；!?;\n])')
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    按句末标点和换行切分句子，保留标点与空白，拼接后等于原文
+    :param text: 文本
+    :return: 句子列表
+    """
+    return [sentence for sentence in _SENTENCE_END_PATTERN.split(text or "") if sentence]
+
+
+def chunk_stats(chunks: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    统计文本块数量、总字节数与重叠字节数
+    :param chunks: chunk_sections 的返回值
+    :return: {'chunks': 数量, 'total_bytes': 总字节数, 'overlap_bytes': 重叠字节数}
+    """
+    return {
+        'chunks': len(chunks),
+        'total_bytes': sum(len(chunk['text'].encode('utf-8')) for chunk in chunks),
+        'overlap_bytes': sum(chunk['metadata'].get('overlap_bytes', 0) for chunk in chunks),
+    }
+
+
+class SectionChunker:
+    """按章节边界切分文本的切分器"""
+
+    def __init__(self, chunk_size: int = 4000, max_overlap: int = 100,
+                 length_function: Callable[[str], int] = len):
+        """
+        初始化切分器
+        :param chunk_size: 单个文本块的最大长度（按 length_function 计量）
+        :param max_overlap: 相邻块重叠的最大长度，上一块末句不超过该长度时才重复到下一块开头，0 表示不重叠
+        :param length_function: 长度计量函数
+        """
+        self.chunk_size = chunk_size
+        self.max_overlap = max_overlap
+        self.length_function = length_function
+
+    def _hard_split(self, sentence: str, chunk_size: int) -> List[str]:
+        """对超过 chunk_size 的单个句子按长度硬切分，二分查找每段能容纳的最长前缀"""
+        pieces = []
+        rest = sentence
+        while rest:
+            low, high = 1, len(rest)
+            while low < high:
+                middle = (low + high + 1) // 2
+                if self.length_function(rest[:middle]) <= chunk_size:
+                    low = middle
+                else:
+                    high = middle - 1
+            pieces.append(rest[:low])
+            rest = rest[low:]
+        return pieces
+
+    def split_text(self, text: str, chunk_size: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        切分单个章节的正文，未超长时原样返回一个块。
+        块长度按句子长度累加计算，每个句子只计量一次，使用真实分词器时也不会重复分词。
+        :param text: 章节正文
+        :param chunk_size: 块的最大长度，默认 self.chunk_size（装箱时扣除标题等占用后传入）
+        :return: [{'text': 文本块, 'overlap': 与上一块重叠的文本}]
+        """
+        chunk_size = chunk_size or self.chunk_size
+        if self.length_function(text) <= chunk_size:
+            return [{'text': text, 'overlap': ""}] if text.strip() else []
+
+        sentences = []
+        for sentence in split_sentences(text):
+            length = self.length_function(sentence)
+            if length > chunk_size:
+                sentences.extend((piece, self.length_function(piece))
+                                 for piece in self._hard_split(sentence, chunk_size))
+            else:
+                sentences.append((sentence, length))
+
+        pieces = []
+        current: List[Tuple[str, int]] = []
+        current_length = 0
+        overlap = ""
+        for sentence, length in sentences:
+            if current and current_length + length > chunk_size:
+                pieces.append({'text': "".join(part for part, _ in current), 'overlap': overlap})
+                last, last_length = current[-1]
+                # 仅重复一个短句作为上下文衔接，且不能使下一块超长
+                if (self.max_overlap and len(current) > 1 and last_length <= self.max_overlap
+                        and last_length + length <= chunk_size):
+                    current, current_length, overlap = [current[-1]], last_length, last
+                else:
+                    current, current_length, overlap = [], 0, ""
+            current.append((sentence, length))
+            current_length += length
+        if current:
+            pieces.append({'text': "".join(part for part, _ in current), 'overlap': overlap})
+        return pieces
+
+    def chunk_sections(self, sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        将章节记录切分为文本块
+        :param sections: 章节记录列表（content + metadata，即 process_pdf 或章节JSON中的 outline 项）
+        :return: [{'text': 文本块, 'metadata': 章节元数据 + chunk_index、chunk_count、overlap_bytes}]
+        """
+        chunks = []
+        for section in sections:
+            metadata = section.get('metadata', {})
+            section_path = metadata.get('section_path') or [section.get('title') or metadata.get('section_title', "")]
+            pieces = self.split_text(section.get('content') or "")
+            for index, piece in enumerate(pieces):
+                chunks.append({
+                    'text': piece['text'],
+                    'metadata': {
+                        **metadata,
+                        'section_path': section_path,
+                        'chunk_index': index,
+                        'chunk_count': len(pieces),
+                        'overlap_bytes': len(piece['overlap'].encode('utf-8')),
+                    }
+                })
+        return chunks
+
+    def pack_sections(self, sections: List[Dict[str, Any]], prefix: str = "") -> List[str]:
+        """
+        将章节按原文顺序装箱为 LLM 输入：整章节不被拆到两个输入中（超长章节除外），
+        每段前加【章节路径】标题，尽量填满 chunk_size 以减少调用次数。
+        前缀、标题与段间分隔符都计入 chunk_size：超长章节按扣除前缀和标题后的长度切分，
+        装箱时按各段长度与分隔符长度之和判断是否超出（各部分分别计量的长度之和不小于拼接后的长度）
+        :param sections: 章节记录列表
+        :param prefix: 每个输入开头的统一说明，如跨年差异的说明
+        :return: 文本列表，每项以 prefix 开头
+        """
+        capacity = self.chunk_size - (self.length_function(prefix) if prefix else 0)
+        separator_length = self.length_function("\n\n")
+        packed = []
+        current = ""
+        current_length = 0
+        for section in sections:
+            metadata = section.get('metadata', {})
+            section_path = metadata.get('section_path') or [section.get('title') or metadata.get('section_title', "")]
+            title = f"【{' > '.join(section_path)}】\n"
+            body_size = max(capacity - self.length_function(title), 1)
+            for piece in self.split_text(section.get('content') or "", body_size):
+                block = title + piece['text']
+                block_length = self.length_function(block)
+                if current and current_length + separator_length + block_length > capacity:
+                    packed.append(prefix + current)
+                    current, current_length = block, block_length
+                elif current:
+                    current = f"{current}\n\n{block}"
+                    current_length += separator_length + block_length
+                else:
+                    current, current_length = block, block_length
+        if current:
+            packed.append(prefix + current)
+        return packed
@@ -0,0 +1,175 @@
+"""
+section_diff.py
+
+同一公司相邻年份年报的章节差异：连续两年的年报大部分内容（公司简介、经营模式、风险提示等固定表述）逐年重复，
+单年报分析只需关注相对上一年新增或变化的段落。
+1. 章节对齐：按 section_path 对齐，标题去掉“第X节”“一、”“（一）”等编号后比较，章节编号变化不影响对齐
+2. 段落切分：pdf_parser 的章节内容按 PDF 版面换行，先把行拼回段落（行末为句末标点或遇到空行时断段），
+   超长段落按句子切分，避免一处改动使整段都算作变化
+3. 段落哈希：去除空白并把报告年份、上一年份、下一年份替换为占位符后计算，
+   “2023年公司实现营业收入”与上年的“2022年公司实现营业收入”视为相同
+4. 对齐章节中哈希未出现过的段落，与上年同章节未匹配的段落相似度不低于阈值的记为“变化”，否则记为“新增”；
+   上年任一章节中出现过的段落（章节间移动）视为未变
+5. 只输出含新增或变化段落的章节（段落前标注“（新增）”“（变化）”），格式与 load_section_records 相同，
+   可直接交给 SectionRouter 路由
+"""
+
+import re
+import hashlib
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, List, Optional
+
+from LLM.section_chunker import split_sentences
+from LLM.token_utils import estimate_tokens
+
+NEW_LABEL = "（新增）"
+CHANGED_LABEL = "（变化）"
+
+# 行末为这些字符时断段
+_PARAGRAPH_END_PATTERN = re.compile(r'[。！？!?；;：:]$')
+# 标题前的编号：第三节、一、（一）、1.、1.1 等
+_TITLE_NUMBER_PATTERN = re.compile(
+    r'^(第[一二三四五六七八九十百零\d]+[节章部分条]|[一二三四五六七八九十]+[、.．]|[（(][一二三四五六七八九十\d]+[)）]'
+    r'|\d+(\.\d+)*[、.．]?)\s*'
+)
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize_title(title: str) -> str:
+    """去掉章节标题的编号与空白，用于跨年对齐"""
+    title = _WHITESPACE_PATTERN.sub("", title or "")
+    return _TITLE_NUMBER_PATTERN.sub("", title) or title
+
+
+def split_paragraphs(content: str, max_chars: int = 400) -> List[str]:
+    """
+    把按版面换行的章节内容拼回段落
+    :param content: 章节内容
+    :param max_chars: 超过该长度的段落按句子切分
+    :return: 段落列表
+    """
+    paragraphs = []
+    current = []
+    for line in (content or "").split("\n"):
+        line = line.strip()
+        if line:
+            current.append(line)
+        if current and (not line or _PARAGRAPH_END_PATTERN.search(line)):
+            paragraphs.append("".join(current))
+            current = []
+    if current:
+        paragraphs.append("".join(current))
+
+    result = []
+    for paragraph in paragraphs:
+        if len(paragraph) > max_chars:
+            result.extend(sentence.strip() for sentence in split_sentences(paragraph) if sentence.strip())
+        else:
+            result.append(paragraph)
+    return result
+
+
+def _normalize_paragraph(paragraph: str, year: Optional[int]) -> str:
+    text = _WHITESPACE_PATTERN.sub("", paragraph)
+    if year:
+        for offset, placeholder in ((-1, "{上年}"), (0, "{本年}"), (1, "{下年}")):
+            text = re.sub(rf'(?<!\d){year + offset}(?!\d)', placeholder, text)
+    return text
+
+
+def paragraph_hash(paragraph: str, year: Optional[int] = None) -> str:
+    """
+    段落内容哈希
+    :param paragraph: 段落
+    :param year: 报告年份，提供时年份引用替换为相对占位符后再计算
+    """
+    return hashlib.sha1(_normalize_paragraph(paragraph, year).encode('utf-8')).hexdigest()
+
+
+def _section_path(section: Dict[str, Any]) -> List[str]:
+    metadata = section.get('metadata', {})
+    return metadata.get('section_path') or [metadata.get('section_title', "")]
+
+
+def diff_sections(current: List[Dict[str, Any]], previous: List[Dict[str, Any]],
+                  year: Optional[int] = None, previous_year: Optional[int] = None,
+                  similarity: float = 0.6, max_paragraph_chars: int = 400,
+                  token_counter: Callable[[str], int] = estimate_tokens) -> Dict[str, Any]:
+    """
+    计算本年年报相对上一年年报的新增与变化段落
+    :param current: 本年章节记录（content + metadata.section_path）
+    :param previous: 上一年章节记录
+    :param year: 本年年份
+    :param previous_year: 上一年年份
+    :param similarity: 与上年同章节段落的相似度不低于该值时记为变化，否则记为新增
+    :param max_paragraph_chars: 超过该长度的段落按句子切分后比较
+    :param token_counter: token 计数函数
+    :return: {'sections': 含新增或变化段落的章节记录（按原文顺序，metadata.diff 为该章节的段落统计）,
+              'stats': {'sections', 'changed_sections', 'paragraphs', 'new', 'changed', 'unchanged', 'removed',
+                        'total_tokens', 'delta_tokens'}}
+    """
+    # 上年段落按对齐后的章节路径分组，并记录全部段落哈希以识别章节间移动
+    previous_by_path: Dict[tuple, List[tuple]] = {}
+    previous_hashes = set()
+    for section in previous:
+        key = tuple(normalize_title(title) for title in _section_path(section))
+        for paragraph in split_paragraphs(section.get('content') or "", max_paragraph_chars):
+            digest = paragraph_hash(paragraph, previous_year)
+            previous_by_path.setdefault(key, []).append((digest, _normalize_paragraph(paragraph, previous_year)))
+            previous_hashes.add(digest)
+
+    stats = {'sections': 0, 'changed_sections': 0, 'paragraphs': 0, 'new': 0, 'changed': 0, 'unchanged': 0,
+             'removed': 0, 'total_tokens': 0, 'delta_tokens': 0}
+    current_hashes = set()
+    matched_previous = set()
+    delta_sections = []
+    for section in current:
+        content = section.get('content') or ""
+        path = _section_path(section)
+        stats['sections'] += 1
+        stats['total_tokens'] += token_counter(content)
+        # 上年对齐章节的段落，作为“变化”段落的比对对象
+        aligned = previous_by_path.get(tuple(normalize_title(title) for title in path), [])
+
+        lines = []
+        counts = {'new': 0, 'changed': 0, 'unchanged': 0}
+        for paragraph in split_paragraphs(content, max_paragraph_chars):
+            digest = paragraph_hash(paragraph, year)
+            current_hashes.add(digest)
+            if digest in previous_hashes:
+                counts['unchanged'] += 1
+                continue
+            # 本段固定为 seq2 只建一次索引，先用相似度上界跳过明显不相近的段落
+            matcher = SequenceMatcher(None, autojunk=False)
+            matcher.set_seq2(_normalize_paragraph(paragraph, year))
+            best_digest, best_score = None, similarity
+            for previous_digest, previous_text in aligned:
+                if previous_digest in matched_previous:
+                    continue
+                matcher.set_seq1(previous_text)
+                if matcher.real_quick_ratio() < best_score or matcher.quick_ratio() < best_score:
+                    continue
+                score = matcher.ratio()
+                if score >= best_score:
+                    best_digest, best_score = previous_digest, score
+            if best_digest is not None:
+                matched_previous.add(best_digest)
+                counts['changed'] += 1
+                lines.append(CHANGED_LABEL + paragraph)
+            else:
+                counts['new'] += 1
+                lines.append(NEW_LABEL + paragraph)
+
+        stats['paragraphs'] += sum(counts.values())
+        for name, count in counts.items():
+            stats[name] += count
+        if lines:
+            delta_content = "\n".join(lines)
+            stats['changed_sections'] += 1
+            stats['delta_tokens'] += token_counter(delta_content)
+            delta_sections.append({'content': delta_content, 'metadata': {
+                **section.get('metadata', {}), 'section_path': path, 'diff': counts
+            }})
+
+    stats['removed'] = len(previous_hashes - current_hashes - matched_previous)
+    return {'sections': delta_sections, 'stats': stats}
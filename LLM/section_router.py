@@ -0,0 +1,156 @@
+"""
+section_router.py
+
+年报章节路由：根据 pdf_parser 输出的目录结构（section_path）挑选与分析问题相关的章节，
+仅将管理层讨论与分析、未来发展、风险因素等章节在 token 预算内送入 LLM，
+跳过财务报表附注、审计报告等与单年报分析提示词无关的大段内容。
+"""
+
+import os
+import json
+import logging
+from typing import Callable, List, Dict, Any, Optional
+
+from LLM.token_utils import estimate_tokens, truncate_to_tokens
+
+# 相关章节关键词及权重，权重越高越优先保留
+DEFAULT_SECTION_KEYWORDS = {
+    "管理层讨论与分析": 10,
+    "经营情况讨论与分析": 10,
+    "可能面对的风险": 10,
+    "风险因素": 10,
+    "未来发展": 9,
+    "经营计划": 9,
+    "发展战略": 8,
+    "主营业务": 8,
+    "风险": 7,
+    "核心竞争力": 6,
+    "董事会报告": 5,
+    "业务概要": 5,
+    "投资状况": 4,
+}
+
+# 命中以下关键词的章节直接跳过
+DEFAULT_EXCLUDE_KEYWORDS = [
+    "财务报告", "财务报表", "附注", "审计报告", "备查文件", "释义", "重要提示",
+    "公司治理", "股份变动", "优先股", "债券相关", "环境和社会责任",
+]
+
+
+def load_section_records(json_path: str) -> List[Dict[str, Any]]:
+    """
+    读取 pdf_parser 保存的章节JSON
+    :param json_path: *_chapters.json 文件路径
+    :return: 章节记录列表，每项包含 content 与 metadata（section_path 等）
+    """
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('outline', [])
+    except Exception as e:
+        logging.error(f"读取章节JSON {json_path} 时出错: {str(e)}")
+        return []
+
+
+class SectionRouter:
+    """按章节路径选择相关内容的路由器"""
+
+    def __init__(self, token_budget: int = 12000, keywords: Optional[Dict[str, int]] = None,
+                 exclude_keywords: Optional[List[str]] = None,
+                 token_counter: Callable[[str], int] = estimate_tokens):
+        """
+        初始化路由器
+        :param token_budget: 单份年报送入 LLM 的最大 token 数
+        :param keywords: 相关章节关键词及权重
+        :param exclude_keywords: 需要跳过的章节关键词
+        :param token_counter: token 计数函数，与分析器切分文本块使用的计数器一致
+        """
+        self.token_budget = token_budget
+        self.token_counter = token_counter
+        self.keywords = keywords if keywords is not None else DEFAULT_SECTION_KEYWORDS
+        self.exclude_keywords = exclude_keywords if exclude_keywords is not None else DEFAULT_EXCLUDE_KEYWORDS
+
+    def score_section(self, section_path: List[str]) -> int:
+        """
+        计算章节相关度，0 表示不相关。
+        当前章节标题命中关键词取全部权重，仅由上级章节命中时取一半权重，使更具体的章节优先。
+        :param section_path: 从顶级章节到当前章节的标题路径
+        :return: 相关度得分
+        """
+        if not section_path:
+            return 0
+        path_text = " > ".join(section_path)
+        if any(keyword in path_text for keyword in self.exclude_keywords):
+            return 0
+
+        def match_weight(text: str) -> int:
+            return max((weight for keyword, weight in self.keywords.items() if keyword in text), default=0)
+
+        return max(match_weight(section_path[-1]), match_weight(" > ".join(section_path[:-1])) // 2)
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """截断到 max_tokens 以内，并尽量退回到最后一个完整句子"""
+        truncated = truncate_to_tokens(text, max_tokens, self.token_counter)
+        if truncated == text:
+            return text
+        boundary = max(truncated.rfind(mark) for mark in "。！？\n")
+        return truncated[:boundary + 1] if boundary >= 0 else truncated
+
+    def route(self, sections: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        在 token 预算内选择相关章节
+        :param sections: 章节记录列表（content + metadata.section_path）
+        :return: 包含 text、sections、selected_paths、total_tokens、selected_tokens 的字典，
+                 sections 为选中的章节记录（超预算时内容已截断），按原文顺序排列
+        """
+        candidates = []
+        total_tokens = 0
+        for index, section in enumerate(sections):
+            content = section.get('content') or ""
+            metadata = section.get('metadata', {})
+            section_path = metadata.get('section_path') or [metadata.get('section_title', "")]
+            tokens = self.token_counter(content)
+            total_tokens += tokens
+            score = self.score_section(section_path)
+            if score > 0 and content.strip():
+                candidates.append((score, index, section_path, content, tokens, metadata))
+
+        # 先按相关度选入预算，再按原文顺序输出
+        candidates.sort(key=lambda item: (-item[0], item[1]))
+        selected = []
+        used_tokens = 0
+        for score, index, section_path, content, tokens, metadata in candidates:
+            remaining = self.token_budget - used_tokens
+            if remaining <= 0:
+                break
+            if tokens > remaining:
+                content = self._truncate(content, remaining)
+                tokens = self.token_counter(content)
+                if not content:
+                    continue
+            selected.append((index, section_path, content, metadata))
+            used_tokens += tokens
+
+        selected.sort(key=lambda item: item[0])
+        text = "\n\n".join(f"【{' > '.join(path)}】\n{content}" for _, path, content, _ in selected)
+
+        return {
+            'text': text,
+            'sections': [{'content': content, 'metadata': {**metadata, 'section_path': path}}
+                         for _, path, content, metadata in selected],
+            'selected_paths': [path for _, path, _, _ in selected],
+            'total_tokens': total_tokens,
+            'selected_tokens': self.token_counter(text),
+        }
+
+
+def find_section_json(file_path: str, json_dir: str) -> Optional[str]:
+    """
+    根据年报txt文件名查找对应的章节JSON（{code}_{name}_{year}_chapters.json）
+    :param file_path: 年报txt文件路径
+    :param json_dir: 章节JSON目录
+    :return: JSON文件路径，不存在时返回 None
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    json_path = os.path.join(json_dir, f"{stem}_chapters.json")
+    return json_path if os.path.exists(json_path) else None
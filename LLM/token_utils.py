@@ -0,0 +1,156 @@
+"""
+token_utils.py
+
+文本 token 数估算工具，用于在发送给 LLM 之前控制提示词规模：
+1. estimate_tokens：按中文/其他字符分别计数的快速估算
+2. TokenEstimator：可用真实分词器在样本上校准系数的快速估算器
+3. build_token_counter：按配置选择估算器、tiktoken 或 HuggingFace 分词器
+4. truncate_to_tokens：按 token 上限截断文本
+"""
+
+import re
+import logging
+from typing import Callable, List, Optional
+
+# 中日韩统一表意文字及全角标点
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+
+# 经验系数：中文字符约 0.6 token/字，其余字符（英文、数字、空白）约 0.3 token/字
+CJK_TOKENS_PER_CHAR = 0.6
+OTHER_TOKENS_PER_CHAR = 0.3
+
+# 校准样本：覆盖年报中的叙述、表格数字与中英混排
+CALIBRATION_SAMPLES = [
+    "报告期内，公司实现营业收入1,234,567.89万元，同比增长12.34%；归属于上市公司股东的净利润234,567.12万元。",
+    "经营活动产生的现金流量净额 345,678.90 289,012.34 19.61%",
+    "公司坚持以客户为中心，持续推进数字化转型，不断提升风险管理能力和综合金融服务水平。",
+    "项目 2023年 2022年 本年比上年增减\n营业收入 1,797.56 1,662.47 8.13%\n基本每股收益（元/股） 2.01 1.92 4.69%",
+    "The Company adopted IFRS 17 and recognized ROE of 11.2% and CET1 ratio of 9.85% in FY2023.",
+    "可能面对的风险：宏观经济波动风险、行业竞争加剧风险、原材料价格波动风险以及汇率变动风险。",
+]
+
+
+def _char_counts(text: str):
+    """返回（中文字符数，其他字符数）"""
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count, len(text) - cjk_count
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    快速估算文本的 token 数
+    :param text: 文本内容
+    :return: 估算的 token 数
+    """
+    if not text:
+        return 0
+    cjk_count, other_count = _char_counts(text)
+    return int(cjk_count * CJK_TOKENS_PER_CHAR + other_count * OTHER_TOKENS_PER_CHAR) + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int, token_counter: Callable[[str], int] = estimate_tokens) -> str:
+    """
+    截断文本，使其 token 数不超过上限（二分查找保留的前缀长度）
+    :param text: 原文本
+    :param max_tokens: token 上限
+    :param token_counter: token 计数函数
+    :return: 截断后的文本
+    """
+    if max_tokens <= 0:
+        return ""
+    if token_counter(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if token_counter(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+class TokenEstimator:
+    """按中文/其他字符线性估算 token 数的估算器"""
+
+    def __init__(self, cjk_per_char: float = CJK_TOKENS_PER_CHAR, other_per_char: float = OTHER_TOKENS_PER_CHAR):
+        """
+        初始化估算器
+        :param cjk_per_char: 每个中文字符的 token 数
+        :param other_per_char: 每个其他字符的 token 数
+        """
+        self.cjk_per_char = cjk_per_char
+        self.other_per_char = other_per_char
+
+    def __call__(self, text: str) -> int:
+        if not text:
+            return 0
+        cjk_count, other_count = _char_counts(text)
+        return int(cjk_count * self.cjk_per_char + other_count * self.other_per_char) + 1
+
+    @classmethod
+    def calibrate(cls, texts: List[str], count_fn: Callable[[str], int]) -> "TokenEstimator":
+        """
+        用真实分词器在样本上以最小二乘拟合两个系数
+        :param texts: 样本文本
+        :param count_fn: 真实 token 计数函数
+        :return: 校准后的估算器，样本不足以拟合时返回默认系数
+        """
+        # 求解 [[Σc², Σco], [Σco, Σo²]] · [a, b] = [Σct, Σot]
+        scc = sco = soo = sct = sot = 0.0
+        for text in texts:
+            c, o = _char_counts(text)
+            t = count_fn(text)
+            scc += c * c
+            sco += c * o
+            soo += o * o
+            sct += c * t
+            sot += o * t
+        determinant = scc * soo - sco * sco
+        if not determinant:
+            return cls()
+        cjk_per_char = (sct * soo - sot * sco) / determinant
+        other_per_char = (scc * sot - sco * sct) / determinant
+        if cjk_per_char <= 0 or other_per_char <= 0:
+            return cls()
+        return cls(round(cjk_per_char, 4), round(other_per_char, 4))
+
+
+def _load_exact_counter(spec: str) -> Optional[Callable[[str], int]]:
+    """加载真实分词器：tiktoken[:编码名] 或 hf:模型名，依赖缺失时返回 None"""
+    try:
+        if spec.startswith("tiktoken"):
+            import tiktoken
+            encoding = tiktoken.get_encoding(spec.split(":", 1)[1] if ":" in spec else "cl100k_base")
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        if spec.startswith("hf:"):
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(spec[3:])
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+    except Exception as e:
+        logging.warning(f"加载分词器 {spec} 失败，使用估算器: {str(e)}")
+        return None
+    logging.warning(f"未知的分词器配置 {spec}，使用估算器")
+    return None
+
+
+def build_token_counter(spec: str = "estimate") -> Callable[[str], int]:
+    """
+    按配置构造 token 计数函数
+    :param spec: estimate（默认估算器）、tiktoken[:编码名]、hf:模型名，
+                 或 calibrated:<分词器配置>（用该分词器在样本上校准后的估算器，速度与估算器相同）
+    :return: 计数函数
+    """
+    spec = (spec or "estimate").strip()
+    if spec == "estimate":
+        return TokenEstimator()
+
+    calibrated = spec.startswith("calibrated:")
+    exact = _load_exact_counter(spec[len("calibrated:"):] if calibrated else spec)
+    if exact is None:
+        return TokenEstimator()
+    if calibrated:
+        estimator = TokenEstimator.calibrate(CALIBRATION_SAMPLES, exact)
+        logging.info(f"token 估算器校准完成: 中文 {estimator.cjk_per_char}/字, 其他 {estimator.other_per_char}/字")
+        return estimator
+    return exact
@@ -0,0 +1,168 @@
+"""
+tool_cache.py
+
+agent 工具结果的进程内缓存，在 setup_agents 构建工具时包装各工具函数：
+1. 按（工具名称、规范化输入）缓存结果，每个工具单独设置有效期（秒），有效期为 0 的工具不缓存
+2. 相同输入的并发调用只执行一次（single-flight），其余调用等待并共享结果
+3. 出错的结果（工具返回的"错误：..."、"...出错..."提示或抛出的异常）不缓存，下次调用重新执行
+4. 缓存随 ReportAnalyzer 实例存在，同一轮内和多轮对话之间都可命中
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from langchain_core.tools import Tool
+
+# 各工具默认有效期（秒）：维基百科条目变化慢；个股分析依赖行情数据；
+# report_retriever 已有随入库失效的检索缓存，这里不再缓存
+DEFAULT_TOOL_TTLS = {
+    'download_stock_reports': 3600,
+    'stock_screening': 1800,
+    'wiki_search': 24 * 3600,
+    'report_retriever': 0,
+}
+
+
+def parse_ttl_spec(spec: str) -> Dict[str, float]:
+    """
+    解析有效期配置，如 "wiki_search=86400,stock_screening=0"
+    :param spec: 配置字符串
+    :return: {工具名称: 有效期}
+    """
+    ttls = {}
+    for item in (spec or "").split(','):
+        name, _, value = item.partition('=')
+        try:
+            if name.strip():
+                ttls[name.strip()] = float(value)
+        except ValueError:
+            logging.warning(f"忽略无效的工具缓存有效期配置: {item}")
+    return ttls
+
+
+def is_error_result(result: Any) -> bool:
+    """工具返回的是否为错误提示：以“错误”开头（如“错误：无效的操作”）或包含“出错”（如“检索过程出错：...”）"""
+    return isinstance(result, str) and (result.lstrip().startswith("错误") or "出错" in result)
+
+
+def is_cacheable_result(result: Any) -> bool:
+    """工具返回的错误提示不缓存"""
+    return not is_error_result(result)
+
+
+class _Flight:
+    """一次进行中的工具调用，供并发的相同调用等待"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ToolResultCache:
+    """带每工具有效期与 single-flight 的工具结果缓存"""
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, default_ttl: float = 0,
+                 max_entries: int = 512, clock: Callable[[], float] = time.monotonic):
+        """
+        初始化缓存
+        :param ttls: {工具名称: 有效期秒数}，未列出的工具使用 default_ttl
+        :param default_ttl: 默认有效期，0 表示不缓存
+        :param max_entries: 最大条目数，超出后淘汰最久未使用的条目
+        :param clock: 时钟函数，便于测试
+        """
+        self.ttls = dict(DEFAULT_TOOL_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._flights: Dict[Tuple[str, str], _Flight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    @staticmethod
+    def make_key(tool_name: str, tool_input: Any) -> Tuple[str, str]:
+        """缓存键：工具名称 + 去除首尾与多余空白的输入"""
+        return tool_name, " ".join(str(tool_input).split())
+
+    def call(self, tool_name: str, tool_input: Any, func: Callable[[Any], Any]) -> Any:
+        """
+        执行工具调用，命中有效缓存时直接返回，相同输入的并发调用只执行一次
+        :param tool_name: 工具名称
+        :param tool_input: 工具输入
+        :param func: 工具函数
+        :return: 工具结果
+        """
+        key = self.make_key(tool_name, tool_input)
+        ttl = self.ttls.get(tool_name, self.default_ttl)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                logging.info(f"工具缓存命中 {tool_name}({key[1]})")
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            logging.info(f"等待进行中的相同工具调用 {tool_name}({key[1]})")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func(tool_input)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                if flight.error is None and ttl > 0 and is_cacheable_result(flight.result):
+                    self._entries[key] = (self.clock() + ttl, flight.result)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            flight.done.set()
+
+    def wrap(self, tool: Tool) -> Tool:
+        """
+        返回调用经过缓存的工具副本
+        :param tool: 原工具
+        :return: 名称、描述相同的新工具
+        """
+        func = tool.func
+        return Tool(
+            name=tool.name,
+            func=lambda tool_input: self.call(tool.name, tool_input, func),
+            description=tool.description,
+            return_direct=tool.return_direct
+        )
+
+    def invalidate(self, tool_name: Optional[str] = None) -> None:
+        """清除指定工具（为 None 时清除全部）的缓存"""
+        with self._lock:
+            if tool_name is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == tool_name]:
+                    del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中、未命中、共享调用次数与当前条目数"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'shared': self.shared, 'entries': len(self._entries)}
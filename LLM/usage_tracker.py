@@ -0,0 +1,317 @@
+"""
+usage_tracker.py
+
+基于 langchain 回调的 token 与耗时统计：
+1. 记录每次 LLM 调用的 prompt/completion token、总耗时、首 token 延迟（TTFT）与重试次数
+2. 记录每次工具调用的耗时与错误
+3. 按组件（single_report_executor、comparison_executor、final_executor、intent_chain 等）
+   和作用域（一次公司分析、一轮对话）聚合，并导出为 JSONL
+4. 按模型档位（LLM/model_tiers.py，通过 tier:fast / tier:heavy 标签标识）汇总调用、耗时与费用
+
+重试发生在 OpenAI SDK 内部，不会触发 langchain 的 on_retry 回调，因此通过 httpx 的请求钩子
+（http_event_hooks）统计每次 LLM 调用实际发出的 HTTP 请求数，多出的请求即为重试。
+未设置作用域的调用（后台记忆压缩、预取等）记在 "default" 作用域下，只保留最近 max_unscoped_records 条。
+"""
+
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from LLM.model_tiers import estimate_cost
+
+# 通过 invoke 的 tags 标识的组件名称
+COMPONENTS = ("single_report_executor", "comparison_executor", "final_executor", "intent_chain",
+              "year_record", "comparison_merge", "memory_summary")
+TIER_TAG_PREFIX = "tier:"
+DEFAULT_SCOPE = "default"
+
+
+def _component_from_tags(tags: Optional[List[str]]) -> str:
+    """从回调 tags 中识别所属组件"""
+    for tag in tags or []:
+        if tag in COMPONENTS:
+            return tag
+    return "other"
+
+
+def _tier_from_tags(tags: Optional[List[str]]) -> Optional[str]:
+    """从回调 tags 中识别模型档位"""
+    for tag in tags or []:
+        if tag.startswith(TIER_TAG_PREFIX):
+            return tag[len(TIER_TAG_PREFIX):]
+    return None
+
+
+def _extract_token_usage(response: LLMResult) -> Dict[str, int]:
+    """从 LLM 结果中提取 token 用量，兼容 llm_output 与 usage_metadata 两种来源"""
+    usage = (response.llm_output or {}).get('token_usage') or {}
+    prompt_tokens = usage.get('prompt_tokens', 0)
+    completion_tokens = usage.get('completion_tokens', 0)
+
+    if not prompt_tokens and not completion_tokens:
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, 'message', None)
+                usage_metadata = getattr(message, 'usage_metadata', None) or {}
+                prompt_tokens += usage_metadata.get('input_tokens', 0)
+                completion_tokens += usage_metadata.get('output_tokens', 0)
+
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens}
+
+
+class UsageTracker(BaseCallbackHandler):
+    """记录 LLM 与工具调用用量的回调处理器"""
+
+    def __init__(self, prices: Optional[Dict[str, Tuple[float, float]]] = None, max_unscoped_records: int = 1000):
+        """
+        :param prices: {档位: (输入单价, 输出单价)}，每百万 token，用于按档位计算费用
+        :param max_unscoped_records: 未设置作用域的记录最多保留条数，这些记录不会随导出清理
+        """
+        self.prices = dict(prices or {})
+        self.max_unscoped_records = max_unscoped_records
+        self._unscoped_count = 0
+        self.records: List[Dict[str, Any]] = []
+        self._runs: Dict[UUID, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # 作用域按线程保存，批量并发处理多家公司时互不干扰
+        self._local = threading.local()
+
+    @property
+    def current_scope(self) -> str:
+        return getattr(self._local, 'scope', DEFAULT_SCOPE)
+
+    @current_scope.setter
+    def current_scope(self, name: str) -> None:
+        self._local.scope = name
+
+    @contextmanager
+    def scope(self, name: str):
+        """
+        设置统计作用域，作用域内的调用记录都会带上该名称
+        :param name: 作用域名称，如 "company:000001"、"chat:3"
+        """
+        previous = self.current_scope
+        self.current_scope = name
+        try:
+            yield self
+        finally:
+            self.current_scope = previous
+
+    def _active_llm_runs(self) -> List[UUID]:
+        """当前线程内尚未结束的 LLM 调用，最内层在末尾"""
+        if not hasattr(self._local, 'llm_runs'):
+            self._local.llm_runs = []
+        return self._local.llm_runs
+
+    def http_event_hooks(self) -> Dict[str, List[Any]]:
+        """
+        httpx 客户端的事件钩子，用于创建 ChatOpenAI 的 http_client
+        :return: {'request': [钩子]}，每发出一次 HTTP 请求就计入当前线程最内层的 LLM 调用
+        """
+        return {'request': [self._on_http_request]}
+
+    def _on_http_request(self, request) -> None:
+        active = self._active_llm_runs()
+        run = self._runs.get(active[-1]) if active else None
+        if run is not None:
+            run['requests'] += 1
+
+    # ---- LLM 回调 ----
+
+    def _start_llm_run(self, run_id: UUID, serialized: Dict[str, Any], tags: Optional[List[str]]) -> None:
+        kwargs = (serialized or {}).get('kwargs', {})
+        with self._lock:
+            self._runs[run_id] = {
+                'type': 'llm',
+                'scope': self.current_scope,
+                'component': _component_from_tags(tags),
+                'tier': _tier_from_tags(tags),
+                'model': kwargs.get('model_name') or kwargs.get('model') or "",
+                'start': time.perf_counter(),
+                'first_token': None,
+                'requests': 0,
+            }
+        self._active_llm_runs().append(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, tags=None,
+                            metadata=None, **kwargs):
+        self._start_llm_run(run_id, serialized, tags)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, tags=None,
+                     metadata=None, **kwargs):
+        self._start_llm_run(run_id, serialized, tags)
+
+    def on_llm_new_token(self, token, *, chunk=None, run_id, parent_run_id=None, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and run['first_token'] is None:
+            run['first_token'] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id, parent_run_id=None, **kwargs):
+        run = self._pop_run(run_id)
+        if run is None:
+            return
+        run.update(_extract_token_usage(response))
+        self._finish(run)
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        run = self._pop_run(run_id)
+        if run is None:
+            return
+        run['error'] = str(error)
+        self._finish(run)
+
+    # ---- 工具回调 ----
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, tags=None,
+                      metadata=None, inputs=None, **kwargs):
+        with self._lock:
+            self._runs[run_id] = {
+                'type': 'tool',
+                'scope': self.current_scope,
+                'component': _component_from_tags(tags),
+                'name': (serialized or {}).get('name', ""),
+                'start': time.perf_counter(),
+            }
+
+    def on_tool_end(self, output, *, run_id, parent_run_id=None, **kwargs):
+        run = self._pop_run(run_id)
+        if run is not None:
+            self._finish(run)
+
+    def on_tool_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        run = self._pop_run(run_id)
+        if run is not None:
+            run['error'] = str(error)
+            self._finish(run)
+
+    # ---- 记录与聚合 ----
+
+    def _pop_run(self, run_id: UUID) -> Optional[Dict[str, Any]]:
+        active = self._active_llm_runs()
+        if run_id in active:
+            active.remove(run_id)
+        with self._lock:
+            return self._runs.pop(run_id, None)
+
+    def _finish(self, run: Dict[str, Any]) -> None:
+        """计算耗时并保存记录"""
+        end = time.perf_counter()
+        start = run.pop('start')
+        first_token = run.pop('first_token', None)
+        run['wall_time'] = round(end - start, 4)
+        if run['type'] == 'llm':
+            run['ttft'] = round(first_token - start, 4) if first_token is not None else None
+            # 命中缓存或假模型时没有 HTTP 请求，重试次数为 0
+            run['retries'] = max(run.pop('requests') - 1, 0)
+        run['timestamp'] = datetime.now().isoformat()
+        with self._lock:
+            self.records.append(run)
+            if run['scope'] == DEFAULT_SCOPE:
+                self._unscoped_count += 1
+                if self._unscoped_count > self.max_unscoped_records:
+                    # 丢弃最早的一条未设置作用域的记录，避免长时间运行时无限增长
+                    oldest = next(i for i, r in enumerate(self.records) if r['scope'] == DEFAULT_SCOPE)
+                    del self.records[oldest]
+                    self._unscoped_count -= 1
+
+    def get_records(self, scope: Optional[str] = None) -> List[Dict[str, Any]]:
+        """获取指定作用域（默认全部）的调用记录"""
+        with self._lock:
+            return [r for r in self.records if scope is None or r['scope'] == scope]
+
+    def summarize(self, scope: Optional[str] = None) -> Dict[str, Any]:
+        """
+        按组件、模型档位和工具聚合调用记录
+        :param scope: 作用域名称，None 表示全部
+        :return: {'components': {...}, 'tiers': {...}, 'tools': {...}}
+        """
+        components: Dict[str, Dict[str, Any]] = {}
+        tiers: Dict[str, Dict[str, Any]] = {}
+        tools: Dict[str, Dict[str, Any]] = {}
+
+        for record in self.get_records(scope):
+            if record['type'] == 'llm' and record.get('tier'):
+                tier = tiers.setdefault(record['tier'], {
+                    'models': [], 'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'wall_time': 0.0
+                })
+                if record.get('model') and record['model'] not in tier['models']:
+                    tier['models'].append(record['model'])
+                tier['calls'] += 1
+                tier['prompt_tokens'] += record.get('prompt_tokens', 0)
+                tier['completion_tokens'] += record.get('completion_tokens', 0)
+                tier['wall_time'] = round(tier['wall_time'] + record['wall_time'], 4)
+            if record['type'] == 'llm':
+                stats = components.setdefault(record['component'], {
+                    'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                    'wall_time': 0.0, 'ttft_total': 0.0, 'ttft_count': 0, 'retries': 0, 'errors': 0
+                })
+                stats['prompt_tokens'] += record.get('prompt_tokens', 0)
+                stats['completion_tokens'] += record.get('completion_tokens', 0)
+                if record.get('ttft') is not None:
+                    stats['ttft_total'] += record['ttft']
+                    stats['ttft_count'] += 1
+                stats['retries'] += record.get('retries', 0)
+            else:
+                stats = tools.setdefault(record['name'], {'calls': 0, 'wall_time': 0.0, 'errors': 0})
+            stats['calls'] += 1
+            stats['wall_time'] = round(stats['wall_time'] + record['wall_time'], 4)
+            stats['errors'] += 1 if record.get('error') else 0
+
+        for stats in components.values():
+            ttft_count = stats.pop('ttft_count')
+            ttft_total = stats.pop('ttft_total')
+            stats['avg_ttft'] = round(ttft_total / ttft_count, 4) if ttft_count else None
+
+        for name, stats in tiers.items():
+            stats['avg_latency'] = round(stats['wall_time'] / stats['calls'], 4)
+            stats['cost'] = round(estimate_cost(stats['prompt_tokens'], stats['completion_tokens'],
+                                                self.prices.get(name, (0.0, 0.0))), 6)
+
+        return {'components': components, 'tiers': tiers, 'tools': tools}
+
+    def export_jsonl(self, output_path: str, scope: Optional[str] = None, clear: bool = True) -> None:
+        """
+        将调用记录与聚合结果追加写入 JSONL 文件
+        :param output_path: 输出文件路径
+        :param scope: 作用域名称，None 表示全部
+        :param clear: 导出后是否从内存中移除这些记录
+        """
+        records = self.get_records(scope)
+        summary = self.summarize(scope)
+        with open(output_path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.write(json.dumps({'type': 'summary', 'scope': scope, **summary}, ensure_ascii=False) + "\n")
+
+        if clear:
+            with self._lock:
+                self.records = [r for r in self.records if scope is not None and r['scope'] != scope]
+                self._unscoped_count = sum(1 for r in self.records if r['scope'] == DEFAULT_SCOPE)
+
+    def log_summary(self, scope: Optional[str] = None) -> None:
+        """以日志形式输出聚合结果"""
+        summary = self.summarize(scope)
+        for name, stats in summary['components'].items():
+            ttft = f"{stats['avg_ttft']:.2f}s" if stats['avg_ttft'] is not None else "-"
+            logging.info(
+                f"[用量 {scope}] {name}: 调用 {stats['calls']} 次, token {stats['prompt_tokens']}+"
+                f"{stats['completion_tokens']}, 耗时 {stats['wall_time']:.1f}s, "
+                f"平均TTFT {ttft}, 重试 {stats['retries']} 次"
+            )
+        for name, stats in summary['tiers'].items():
+            logging.info(
+                f"[用量 {scope}] 模型档位 {name}（{', '.join(stats['models']) or '-'}）: 调用 {stats['calls']} 次, "
+                f"token {stats['prompt_tokens']}+{stats['completion_tokens']}, 耗时 {stats['wall_time']:.1f}s, "
+                f"平均 {stats['avg_latency']:.2f}s/次, 费用 ${stats['cost']:.4f}"
+            )
+        for name, stats in summary['tools'].items():
+            logging.info(f"[用量 {scope}] 工具 {name}: 调用 {stats['calls']} 次, 耗时 {stats['wall_time']:.1f}s, "
+                         f"错误 {stats['errors']} 次")
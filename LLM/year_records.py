@@ -0,0 +1,126 @@
+"""
+year_records.py
+
+单年报分析的紧凑结构化记录与多年分层对比：
+1. 单年报分析的自由文本由 LLM 抽取为固定字段的记录（关键指标、业务要点、下一年计划、主要风险），
+   每个字段条目数与长度有上限，多年对比只读取这些记录，不再拼接全部分析原文
+2. merge_pairwise 在记录总量超出对比预算时，按年份顺序两两合并相邻的记录或小结，
+   逐层归并直到总量落入预算，最终对比提示词的大小不随年份数线性增长
+"""
+
+import re
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from LLM.token_utils import estimate_tokens
+
+# 记录字段：(键, 显示名称)
+RECORD_FIELDS = [
+    ('metrics', "关键指标"),
+    ('business', "业务要点"),
+    ('plans', "下一年计划"),
+    ('risks', "主要风险"),
+]
+MAX_ITEMS_PER_FIELD = 8
+MAX_ITEM_CHARS = 60
+
+_JSON_BLOCK_PATTERN = re.compile(r'\{.*\}', re.S)
+
+
+def _clean_items(value: Any) -> List[str]:
+    """将字段值规范为去重、截断后的字符串列表"""
+    if isinstance(value, dict):
+        items = [f"{key}: {item}" for key, item in value.items()]
+    elif isinstance(value, (list, tuple)):
+        items = [str(item) for item in value]
+    elif value:
+        items = [str(value)]
+    else:
+        items = []
+
+    cleaned = []
+    for item in items:
+        item = " ".join(item.split())[:MAX_ITEM_CHARS]
+        if item and item not in cleaned:
+            cleaned.append(item)
+    return cleaned[:MAX_ITEMS_PER_FIELD]
+
+
+def parse_year_record(text: str, year: Any) -> Optional[Dict[str, Any]]:
+    """
+    解析 LLM 输出的结构化记录，兼容 ```json 代码块与前后多余文字
+    :param text: LLM 输出
+    :param year: 报告年份
+    :return: {'year', 'metrics', 'business', 'plans', 'risks'}，无法解析时返回 None
+    """
+    match = _JSON_BLOCK_PATTERN.search(text or "")
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    record = {'year': str(year)}
+    for key, _ in RECORD_FIELDS:
+        record[key] = _clean_items(data.get(key))
+    if not any(record[key] for key, _ in RECORD_FIELDS):
+        return None
+    return record
+
+
+def fallback_year_record(analysis: str, year: Any) -> Dict[str, Any]:
+    """
+    结构化抽取失败时的回退记录：取分析原文的前几句作为业务要点
+    :param analysis: 单年报分析文本
+    :param year: 报告年份
+    :return: 记录
+    """
+    record = {'year': str(year)}
+    for key, _ in RECORD_FIELDS:
+        record[key] = []
+    record['business'] = _clean_items(re.split(r'[\n。；]', analysis or ""))
+    return record
+
+
+def format_year_record(record: Dict[str, Any]) -> str:
+    """
+    将记录渲染为紧凑文本，用于对比提示词
+    :param record: parse_year_record 的结果
+    :return: 文本
+    """
+    title = f"【{record['year']}年】"
+    if record.get('baseline_year'):
+        title += f"（相对{record['baseline_year']}年的新增与变化）"
+    lines = [title]
+    for key, label in RECORD_FIELDS:
+        if record.get(key):
+            lines.append(f"{label}：" + "；".join(record[key]))
+    return "\n".join(lines)
+
+
+def merge_pairwise(texts: List[str], merge_fn: Callable[[str, str], str], token_budget: int,
+                   token_counter: Callable[[str], int] = estimate_tokens) -> List[str]:
+    """
+    两两合并相邻文本，直到总 token 数不超过预算或只剩一段
+    :param texts: 按年份排序的记录文本或小结
+    :param merge_fn: 合并函数 (较早的文本, 较晚的文本) -> 合并后的小结
+    :param token_budget: 总 token 预算
+    :param token_counter: token 计数函数
+    :return: 合并后的文本列表，仍按年份排序
+    """
+    texts = list(texts)
+    level = 0
+    while len(texts) > 1 and sum(token_counter(text) for text in texts) > token_budget:
+        level += 1
+        merged = []
+        for index in range(0, len(texts) - 1, 2):
+            merged.append(merge_fn(texts[index], texts[index + 1]))
+        if len(texts) % 2:
+            merged.append(texts[-1])
+        logging.info(f"多年对比第 {level} 层两两合并：{len(texts)} -> {len(merged)} 段")
+        texts = merged
+    return texts
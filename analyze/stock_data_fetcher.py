@@ -11,8 +11,8 @@ stock_data_fetcher.py
 
 import os
 from datetime import datetime
-import akshare as ak
 import pandas as pd
+# akshare 导入较慢，各函数请求数据时才导入
 
 def process_stock_df(df, exchange):
     """
@@ -63,6 +63,8 @@ def get_stock_list(exclude_st=True):
         - stock_codes: 股票代码列表
     """
     try:
+        import akshare as ak
+
         # 获取北交所股票列表
         bj_stocks = ak.stock_info_bj_name_code()
         bj_stocks = process_stock_df(bj_stocks, 'BJ')
@@ -113,6 +115,8 @@ def get_financial_abstract(stock_code):
         pandas.DataFrame: 财务报表数据
     """
     try:
+        import akshare as ak
+
         # 获取年度财务报表数据
         df = ak.stock_financial_abstract_ths(symbol=stock_code, indicator="按年度")
         return df
@@ -131,6 +135,8 @@ def get_cash_flow(stock_code):
         pandas.DataFrame: 现金流量表数据
     """
     try:
+        import akshare as ak
+
         # 获取年度现金流量表数据
         df = ak.stock_financial_cash_ths(symbol=stock_code, indicator="按年度")
         return df
@@ -149,6 +155,8 @@ def get_financial_indicator(stock_code, start_year='2020'):
         pandas.DataFrame: 财务分析指标数据
     """
     try:
+        import akshare as ak
+
         # 获取财务分析指标数据
         df = ak.stock_financial_analysis_indicator(symbol=stock_code, start_year=start_year)
         return df
@@ -183,6 +191,8 @@ def get_stock_detail(stock_code: str) -> pd.DataFrame:
         >>> print(detail)
     """
     try:
+        import akshare as ak
+
         # 获取股票详细信息
         df = ak.stock_individual_info_em(symbol=stock_code)
         
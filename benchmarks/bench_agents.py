@@ -0,0 +1,218 @@
+"""
+bench_agents.py
+
+使用本地 LLM 替身服务（LLM/llm_standin.py）对 ReportAnalyzer 的 agent 编排做端到端基准，不访问 OpenRouter：
+- analyze_single_report：单份年报
+- process_company：多年年报的完整分析（单年报分析 -> 结构化记录 -> 多年对比 -> 最终报告）
+- chat：多轮对话（经 chat_stream，含检索工具调用，统计首 token 延迟）
+
+每个场景输出总耗时、LLM 调用次数（按脚本规则分类）、每份年报的调用次数、替身服务耗时，
+以及编排开销 = 总耗时 - 替身服务耗时（各场景中 LLM 调用串行执行）。
+替身服务的首 token 延迟与输出速率固定，编排代码变慢时开销一项会随之增加。
+
+用法：
+python benchmarks/bench_agents.py --fake-embeddings
+python benchmarks/bench_agents.py --fake-embeddings --latency 0.5 --tokens-per-second 40 --years 5 --output bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.llm_standin import ScriptedResponder, StandinServer
+
+STOCK_CODE = "000001"
+COMPANY_NAME = "平安银行"
+CHAT_MESSAGES = [
+    "什么是ROE",
+    "平安银行2023年经营活动现金流如何",
+    "平安银行值得投资吗",
+    "对比平安银行近3年业绩",
+    "总结一下刚才的结论",
+]
+SENTENCES = [
+    "报告期内，公司实现营业收入同比增长，主营业务保持稳定。",
+    "公司持续加大研发投入，核心竞争力进一步增强。",
+    "受原材料价格波动影响，毛利率较上年有所下降。",
+    "经营活动产生的现金流量净额较上年明显改善。",
+    "公司将继续推进渠道建设，提升品牌影响力。",
+]
+
+
+def final_answer(text: str) -> str:
+    """structured chat agent 的最终回答格式"""
+    return "```json\n" + json.dumps({"action": "Final Answer", "action_input": text}, ensure_ascii=False) + "\n```"
+
+
+def build_script(answer_chars: int) -> ScriptedResponder:
+    """
+    构造覆盖 ReportAnalyzer 各类 LLM 调用的回复脚本
+    :param answer_chars: agent 最终回答的字数
+    """
+    answer = ("".join(SENTENCES) * (answer_chars // len("".join(SENTENCES)) + 1))[:answer_chars]
+    record = {"metrics": {"营业收入": "1797亿元，同比+8%", "净利润": "465亿元，同比+2%"},
+              "business": ["零售业务转型", "对公业务稳健"], "plans": ["扩大财富管理"], "risks": ["资产质量风险"]}
+    tool_call = "```json\n" + json.dumps({"action": "report_retriever", "action_input": "code=000001 现金流"},
+                                         ensure_ascii=False) + "\n```"
+    rules = [
+        {'name': "intent", 'match': "可能的意图类别", 'responses': ["GENERAL_QUERY"]},
+        {'name': "year_record", 'match': "结构化记录", 'responses': [json.dumps(record, ensure_ascii=False)]},
+        {'name': "comparison_merge", 'match': "合并为一段小结", 'responses': ["【小结】营收稳步增长，计划基本完成。"]},
+        {'name': "memory_summary", 'match': "维护一段对话摘要", 'responses': ["用户关注平安银行的盈利能力、现金流与投资价值。"]},
+        {'name': "agent_after_tool", 'match': "Observation:", 'scope': "last", 'responses': [final_answer(answer)]},
+        {'name': "agent_tool_call", 'match': "现金流如何|什么是ROE", 'scope': "last", 'responses': [tool_call]},
+    ]
+    return ScriptedResponder(rules, default=final_answer(answer))
+
+
+def write_synthetic_reports(txt_dir: str, json_dir: str, years: List[int], seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    生成模拟年报 txt 与章节JSON
+    :return: [{'year', 'txt_path', 'outline'}]
+    """
+    rng = random.Random(seed)
+    reports = []
+    for year in years:
+        outline = []
+        for index, (path, sentence_count) in enumerate([
+            (["管理层讨论与分析", "主营业务"], 120), (["管理层讨论与分析", "未来发展"], 60),
+            (["管理层讨论与分析", "可能面对的风险"], 40), (["财务报告", "附注"], 400),
+        ]):
+            content = "".join(rng.choice(SENTENCES) for _ in range(sentence_count))
+            outline.append({'content': content, 'metadata': {
+                'section_id': str(index + 1), 'section_title': path[-1], 'section_path': path, 'page': index * 10 + 1
+            }})
+        stem = f"{STOCK_CODE}_{COMPANY_NAME}_{year}"
+        txt_path = os.path.join(txt_dir, f"{stem}.txt")
+        with open(txt_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(section['content'] for section in outline))
+        with open(os.path.join(json_dir, f"{stem}_chapters.json"), 'w', encoding='utf-8') as f:
+            json.dump({'pdf_metadata': {}, 'outline': outline}, f, ensure_ascii=False)
+        reports.append({'year': year, 'txt_path': txt_path, 'outline': outline})
+    return reports
+
+
+def measure(server: StandinServer, func: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """执行一个场景，统计总耗时、LLM 调用与编排开销"""
+    server.reset()
+    start = time.perf_counter()
+    extra = func() or {}
+    wall = time.perf_counter() - start
+    stats = server.stats()
+    overhead = wall - stats['server_seconds']
+    return {
+        'wall_seconds': round(wall, 3),
+        'llm_calls': stats['calls'],
+        'server_seconds': round(stats['server_seconds'], 3),
+        'overhead_seconds': round(overhead, 3),
+        'overhead_per_call': round(overhead / stats['calls'], 4) if stats['calls'] else 0.0,
+        'prompt_tokens': stats['prompt_tokens'],
+        'completion_tokens': stats['completion_tokens'],
+        'calls_by_rule': stats['by_rule'],
+        **extra,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ReportAnalyzer agent 编排端到端基准（本地 LLM 替身）")
+    parser.add_argument('--years', type=int, default=3, help="模拟年报的年数")
+    parser.add_argument('--chat-turns', type=int, default=len(CHAT_MESSAGES))
+    parser.add_argument('--latency', type=float, default=0.05, help="替身服务首 token 延迟（秒）")
+    parser.add_argument('--tokens-per-second', type=float, default=500.0, help="替身服务输出速率，0 表示不限速")
+    parser.add_argument('--answer-chars', type=int, default=300, help="agent 最终回答的字数")
+    parser.add_argument('--use-cache', action='store_true', help="启用LLM响应缓存与回答缓存（默认跳过，以测量完整调用）")
+    parser.add_argument('--section-diff', action='store_true',
+                        help="启用跨年章节差异（默认关闭：模拟年报由少量句子随机组成，逐年差异不具代表性）")
+    parser.add_argument('--fake-embeddings', action='store_true', help="使用确定性假向量，不加载 text2vec 模型")
+    parser.add_argument('--output', help="结果JSON的保存路径")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    work_dir = tempfile.mkdtemp(prefix="bench_agents_")
+    txt_dir = os.path.join(work_dir, 'txt_reports')
+    json_dir = os.path.join(work_dir, 'json_reports')
+    os.makedirs(txt_dir)
+    os.makedirs(json_dir)
+
+    server = StandinServer(build_script(args.answer_chars), latency=args.latency,
+                           tokens_per_second=args.tokens_per_second)
+    os.environ['OPENROUTER_BASE_URL'] = server.start()
+    os.environ['OPENROUTER_API_KEY'] = "standin"
+    os.environ.setdefault('PROFILE_SOURCE', "offline")
+    if not args.use_cache:
+        os.environ['LLM_CACHE_BYPASS'] = "1"
+        os.environ['ANSWER_CACHE_BYPASS'] = "1"
+    if not args.section_diff:
+        os.environ['SECTION_DIFF'] = "0"
+
+    try:
+        import LLM.LLM_reports as llm_reports
+        from langchain_community.chat_message_histories import ChatMessageHistory
+        if args.fake_embeddings:
+            # ReportAnalyzer 创建时才从 langchain_huggingface 导入 HuggingFaceEmbeddings
+            import langchain_huggingface
+            from langchain_core.embeddings import DeterministicFakeEmbedding
+            langchain_huggingface.HuggingFaceEmbeddings = lambda **kwargs: DeterministicFakeEmbedding(size=768)
+
+        start = time.perf_counter()
+        analyzer = llm_reports.ReportAnalyzer(txt_dir=txt_dir, results_dir=work_dir,
+                                              message_history=ChatMessageHistory(), json_dir=json_dir)
+        init_seconds = time.perf_counter() - start
+
+        reports = write_synthetic_reports(txt_dir, json_dir, list(range(2024 - args.years, 2024)))
+        for report in reports:
+            analyzer.store_sections(report['txt_path'][:-4] + ".pdf", report['outline'])
+
+        results = {'config': vars(args), 'init_seconds': round(init_seconds, 3)}
+
+        def run_single_report():
+            return {} if analyzer.analyze_single_report(reports[-1]['txt_path']) else {'error': "分析失败"}
+
+        results['analyze_single_report'] = measure(server, run_single_report)
+        results['analyze_single_report']['calls_per_report'] = results['analyze_single_report']['llm_calls']
+
+        def run_process_company():
+            return {} if analyzer.process_company(STOCK_CODE, resume=False) else {'error': "分析失败"}
+
+        results['process_company'] = measure(server, run_process_company)
+        results['process_company']['calls_per_report'] = round(
+            results['process_company']['llm_calls'] / len(reports), 2)
+
+        def run_chat():
+            ttfts = []
+            for message in (CHAT_MESSAGES * args.chat_turns)[:args.chat_turns]:
+                final = list(analyzer.chat_stream(message))[-1]
+                if final['ttft'] is not None:
+                    ttfts.append(final['ttft'])
+            return {'turns': args.chat_turns,
+                    'avg_ttft_seconds': round(sum(ttfts) / len(ttfts), 3) if ttfts else None}
+
+        results['chat'] = measure(server, run_chat)
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'场景':<24}{'总耗时(s)':>10}{'LLM调用':>8}{'替身耗时(s)':>12}{'编排开销(s)':>12}{'开销/调用(s)':>13}")
+    for name in ('analyze_single_report', 'process_company', 'chat'):
+        row = results[name]
+        print(f"{name:<24}{row['wall_seconds']:>10.2f}{row['llm_calls']:>8}{row['server_seconds']:>12.2f}"
+              f"{row['overhead_seconds']:>12.2f}{row['overhead_per_call']:>13.3f}")
+    print(f"初始化 {results['init_seconds']:.2f}s；每份年报调用次数：单份 {results['analyze_single_report']['calls_per_report']}，"
+          f"完整分析 {results['process_company']['calls_per_report']}；对话平均首 token 延迟 {results['chat']['avg_ttft_seconds']}s")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
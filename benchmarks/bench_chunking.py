@@ -0,0 +1,86 @@
+"""
+bench_chunking.py
+
+对比原有的字符切分（RecursiveCharacterTextSplitter，chunk_size=4000，overlap=400）
+与按章节切分（SectionChunker）的文本块数量、总字节数和重叠字节数。
+
+用法：
+python benchmarks/bench_chunking.py                 # 使用 reports/json_reports 中的章节JSON，不存在时生成模拟章节
+python benchmarks/bench_chunking.py --json-dir DIR
+"""
+
+import os
+import sys
+import glob
+import random
+import argparse
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from LLM.section_chunker import SectionChunker, chunk_stats
+from LLM.section_router import load_section_records
+
+SENTENCES = [
+    "报告期内，公司实现营业收入同比增长，主营业务保持稳定。",
+    "公司持续加大研发投入，核心竞争力进一步增强。",
+    "受原材料价格波动影响，毛利率较上年有所下降。",
+    "经营活动产生的现金流量净额较上年明显改善。",
+    "公司将继续推进渠道建设，提升品牌影响力。",
+]
+
+
+def build_synthetic_sections(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """生成长度差异较大的模拟章节（多数较短，少数超长）"""
+    rng = random.Random(seed)
+    sections = []
+    for i in range(count):
+        sentence_count = int(rng.lognormvariate(3, 1.2)) + 1
+        content = "".join(rng.choice(SENTENCES) for _ in range(sentence_count))
+        sections.append({'content': content, 'metadata': {'section_path': [f"第{i // 5 + 1}节", f"小节{i}"]}})
+    return sections
+
+
+def splitter_stats(splitter: RecursiveCharacterTextSplitter, sections: List[Dict[str, Any]]) -> Dict[str, int]:
+    """原有方式：每个章节分别按字符切分，重叠字节数 = 切分后总字节数 - 原文字节数"""
+    chunks = 0
+    total_bytes = 0
+    source_bytes = 0
+    for section in sections:
+        content = section.get('content') or ""
+        pieces = splitter.split_text(content)
+        chunks += len(pieces)
+        total_bytes += sum(len(piece.encode('utf-8')) for piece in pieces)
+        source_bytes += len(content.encode('utf-8')) if pieces else 0
+    return {'chunks': chunks, 'total_bytes': total_bytes, 'overlap_bytes': max(total_bytes - source_bytes, 0)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字符切分与按章节切分对比")
+    parser.add_argument('--json-dir', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                           'reports', 'json_reports'))
+    parser.add_argument('--synthetic-sections', type=int, default=200, help="无章节JSON时生成的模拟章节数量")
+    args = parser.parse_args()
+
+    reports = {os.path.basename(path): load_section_records(path)
+               for path in glob.glob(os.path.join(args.json_dir, "*_chapters.json"))}
+    if not reports:
+        reports = {"模拟章节": build_synthetic_sections(args.synthetic_sections)}
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=4000, chunk_overlap=400, length_function=len,
+        separators=["\n\n", "\n", "。", "！", "？", ".", "!", "?"]
+    )
+    chunker = SectionChunker(chunk_size=4000, max_overlap=100)
+
+    print(f"{'报告':<36}{'方式':<10}{'文本块':>8}{'总字节':>12}{'重叠字节':>12}")
+    for name, sections in reports.items():
+        for method, stats in (('splitter', splitter_stats(splitter, sections)),
+                              ('section', chunk_stats(chunker.chunk_sections(sections)))):
+            print(f"{name:<36}{method:<10}{stats['chunks']:>8}{stats['total_bytes']:>12}{stats['overlap_bytes']:>12}")
+
+
+if __name__ == '__main__':
+    main()
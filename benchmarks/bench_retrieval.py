@@ -0,0 +1,151 @@
+"""
+bench_retrieval.py
+
+对比纯向量检索与融合检索（BM25 + 向量）的延迟和 recall@k。
+以常见财务科目名称为查询，包含该科目原文的文本块视为相关结果。
+
+用法：
+python benchmarks/bench_retrieval.py                    # 使用 reports/json_reports 中的章节JSON，不存在时生成模拟语料
+python benchmarks/bench_retrieval.py --fake-embeddings  # 不加载 text2vec 模型，仅用于离线验证流程
+"""
+
+import os
+import sys
+import glob
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.report_store import ReportStore, parse_report_filename
+from LLM.section_chunker import SectionChunker
+from LLM.section_router import load_section_records
+
+FINANCIAL_TERMS = [
+    "经营活动产生的现金流量净额",
+    "归属于上市公司股东的净利润",
+    "研发投入",
+    "营业收入",
+    "应收账款",
+    "商誉",
+    "资产负债率",
+    "毛利率",
+    "非经常性损益",
+    "基本每股收益",
+]
+
+FILLER_SENTENCES = [
+    "公司坚持稳健经营，持续优化业务结构。",
+    "报告期内行业竞争加剧，公司积极应对市场变化。",
+    "公司不断完善内部控制体系，提升治理水平。",
+    "面对复杂的外部环境，公司管理层审慎决策。",
+    "公司持续推进数字化转型，提升运营效率。",
+]
+
+
+def load_json_corpus(json_dir: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """从章节JSON中按章节切分文本块（与入库时的切分方式一致）"""
+    chunker = SectionChunker()
+    texts, metadatas = [], []
+    for json_path in glob.glob(os.path.join(json_dir, "*_chapters.json")):
+        report_info = parse_report_filename(os.path.basename(json_path).replace("_chapters", ""))
+        for chunk in chunker.chunk_sections(load_section_records(json_path)):
+            texts.append(chunk['text'])
+            metadatas.append({**report_info, 'section_path': " > ".join(chunk['metadata']['section_path'])})
+    return texts, metadatas
+
+
+def build_synthetic_corpus(size: int, seed: int = 42) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """生成模拟语料：每个文本块由套话组成，约三分之一包含一个财务科目及数值"""
+    rng = random.Random(seed)
+    texts, metadatas = [], []
+    for i in range(size):
+        sentences = rng.sample(FILLER_SENTENCES, 3)
+        if i % 3 == 0:
+            term = rng.choice(FINANCIAL_TERMS)
+            sentences.insert(rng.randint(0, 3), f"{term}为{rng.randint(1, 99999):,}万元，同比变动{rng.randint(-30, 30)}%。")
+        texts.append("".join(sentences))
+        metadatas.append({
+            'stock_code': f"{i % 5:06d}", 'company_name': f"公司{i % 5}", 'year': 2020 + i % 4,
+            'report_type': "annual", 'section_path': "管理层讨论与分析",
+        })
+    return texts, metadatas
+
+
+def recall_at_k(retrieved: List[str], relevant: set, k: int) -> float:
+    """相关文本块在前k个结果中的召回比例（分母取 min(k, 相关数)）"""
+    hits = sum(1 for text in retrieved[:k] if text in relevant)
+    return hits / min(k, len(relevant))
+
+
+def run_benchmark(store: ReportStore, texts: List[str], k: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """对每个财务科目分别执行纯向量与融合检索，统计平均延迟与 recall@k"""
+    stats = {name: {'latency_ms': 0.0, 'recall': 0.0} for name in ('vector', 'hybrid')}
+    queries = 0
+    for term in FINANCIAL_TERMS:
+        relevant = {text for text in texts if term in text}
+        if not relevant:
+            continue
+        queries += 1
+        for name, search in (('vector', store.search), ('hybrid', store.hybrid_search)):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                results = search(term, k=k)
+            stats[name]['latency_ms'] += (time.perf_counter() - start) * 1000 / repeat
+            stats[name]['recall'] += recall_at_k([doc.page_content for doc, _ in results], relevant, k)
+
+    for values in stats.values():
+        values['latency_ms'] = round(values['latency_ms'] / max(queries, 1), 2)
+        values['recall'] = round(values['recall'] / max(queries, 1), 4)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量检索与融合检索对比基准")
+    parser.add_argument('--json-dir', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                           'reports', 'json_reports'))
+    parser.add_argument('--synthetic-size', type=int, default=600, help="无章节JSON时生成的模拟文本块数量")
+    parser.add_argument('-k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3, help="每个查询重复次数")
+    parser.add_argument('--fake-embeddings', action='store_true', help="使用确定性假向量，不加载模型")
+    args = parser.parse_args()
+
+    texts, metadatas = load_json_corpus(args.json_dir) if os.path.isdir(args.json_dir) else ([], [])
+    source = "章节JSON"
+    if not texts:
+        texts, metadatas = build_synthetic_corpus(args.synthetic_size)
+        source = "模拟语料"
+
+    if args.fake_embeddings:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        embeddings = DeterministicFakeEmbedding(size=768)
+    else:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(
+            model_name="shibing624/text2vec-base-chinese",
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True}
+        )
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        store = ReportStore(os.path.join(temp_dir, 'vector_store'), embeddings)
+        start = time.perf_counter()
+        store.add_chunks(texts, metadatas)
+        ingest_seconds = time.perf_counter() - start
+
+        stats = run_benchmark(store, texts, args.k, args.repeat)
+        print(f"语料: {source}, 文本块 {len(texts)} 个, 入库耗时 {ingest_seconds:.1f}s")
+        print(f"{'方式':<8}{'平均延迟(ms)':>14}{f'recall@{args.k}':>12}")
+        for name, values in stats.items():
+            print(f"{name:<8}{values['latency_ms']:>14.2f}{values['recall']:>12.4f}")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
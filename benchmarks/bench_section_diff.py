@@ -0,0 +1,146 @@
+"""
+bench_section_diff.py
+
+统计跨年章节差异（LLM/section_diff.py）为单年报分析节省的输入 token，不调用 LLM：
+对每家公司按年份排序的章节JSON，第一年送入全部路由章节，之后每年只送入相对上一年新增或变化的段落，
+两者都经 SectionRouter 在同一预算内路由并按单年报分析的方式装箱，输出每家公司的 token 与调用次数。
+
+没有章节JSON时生成模拟公司：首年由不重复的段落组成，之后每年按比例改写数字、插入新段落并更换年份。
+
+用法：
+python benchmarks/bench_section_diff.py                        # 使用 reports/json_reports 中的章节JSON
+python benchmarks/bench_section_diff.py --json-dir DIR --output diff.json
+python benchmarks/bench_section_diff.py --synthetic --years 5 --change-rate 0.15 --new-rate 0.05
+"""
+
+import os
+import sys
+import glob
+import json
+import random
+import argparse
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.report_store import parse_report_filename
+from LLM.section_chunker import SectionChunker
+from LLM.section_diff import diff_sections
+from LLM.section_router import SectionRouter, load_section_records
+from LLM.token_utils import estimate_tokens
+
+SECTION_PATHS = [
+    ["第三节 管理层讨论与分析", "一、报告期内公司所处行业情况"],
+    ["第三节 管理层讨论与分析", "二、报告期内公司从事的主要业务"],
+    ["第三节 管理层讨论与分析", "三、核心竞争力分析"],
+    ["第三节 管理层讨论与分析", "四、主营业务分析"],
+    ["第三节 管理层讨论与分析", "十一、公司未来发展的展望"],
+    ["第三节 管理层讨论与分析", "十二、可能面对的风险"],
+    ["第十节 财务报告", "七、合并财务报表项目注释"],
+]
+TOPICS = ["零售业务", "对公业务", "资产质量", "数字化转型", "风险管理", "渠道建设", "研发投入", "成本控制"]
+
+
+def build_synthetic_company(years: int, paragraphs_per_section: int, change_rate: float, new_rate: float,
+                            seed: int = 42) -> Dict[int, List[Dict[str, Any]]]:
+    """生成一家模拟公司逐年的章节记录：{年份: 章节列表}"""
+    rng = random.Random(seed)
+    first_year = 2024 - years
+    sections = [[f"{first_year}年，公司在{rng.choice(TOPICS)}方面开展第{index * 100 + i}项工作，"
+                 f"相关指标为{rng.randint(10, 999)}亿元，较上年变动{rng.randint(1, 30)}%。"
+                 for i in range(paragraphs_per_section)] for index in range(len(SECTION_PATHS))]
+
+    reports = {}
+    for year in range(first_year, 2024):
+        if year > first_year:
+            for index, paragraphs in enumerate(sections):
+                updated = []
+                for paragraph in paragraphs:
+                    paragraph = paragraph.replace(f"{year - 1}年", f"{year}年")
+                    if rng.random() < change_rate:
+                        paragraph = paragraph.split("相关指标为")[0] + \
+                            f"相关指标为{rng.randint(10, 999)}亿元，较上年变动{rng.randint(1, 30)}%。"
+                    updated.append(paragraph)
+                    if rng.random() < new_rate:
+                        updated.append(f"{year}年新增{rng.choice(TOPICS)}举措第{rng.randint(1000, 9999)}项。")
+                sections[index] = updated
+        reports[year] = [{'content': "\n".join(paragraphs), 'metadata': {'section_path': path}}
+                         for path, paragraphs in zip(SECTION_PATHS, sections)]
+    return reports
+
+
+def load_companies(json_dir: str) -> Dict[str, Dict[int, List[Dict[str, Any]]]]:
+    """按公司分组读取章节JSON：{公司代码: {年份: 章节列表}}"""
+    companies = defaultdict(dict)
+    for path in glob.glob(os.path.join(json_dir, "*_chapters.json")):
+        info = parse_report_filename(path.replace("_chapters.json", ".json"))
+        if info['year']:
+            companies[info['stock_code']][info['year']] = load_section_records(path)
+    return companies
+
+
+def bench_company(reports: Dict[int, List[Dict[str, Any]]], router: SectionRouter,
+                  chunker: SectionChunker) -> Dict[str, Any]:
+    """统计一家公司全文路由与按差异路由的单年报分析输入"""
+    result = {'years': sorted(reports), 'full_tokens': 0, 'sent_tokens': 0, 'full_calls': 0, 'sent_calls': 0,
+              'new': 0, 'changed': 0, 'unchanged': 0, 'diff_seconds': 0.0}
+    previous_year = None
+    for year in sorted(reports):
+        full_chunks = chunker.pack_sections(router.route(reports[year])['sections'])
+        result['full_tokens'] += sum(estimate_tokens(chunk) for chunk in full_chunks)
+        result['full_calls'] += len(full_chunks)
+        if previous_year is None:
+            sent_chunks = full_chunks
+        else:
+            start = time.perf_counter()
+            diff = diff_sections(reports[year], reports[previous_year], year, previous_year)
+            result['diff_seconds'] += time.perf_counter() - start
+            sent_chunks = chunker.pack_sections(router.route(diff['sections'])['sections'])
+            for name in ('new', 'changed', 'unchanged'):
+                result[name] += diff['stats'][name]
+        result['sent_tokens'] += sum(estimate_tokens(chunk) for chunk in sent_chunks)
+        result['sent_calls'] += len(sent_chunks)
+        previous_year = year
+    result['saved_ratio'] = round(1 - result['sent_tokens'] / result['full_tokens'], 4) if result['full_tokens'] else 0.0
+    result['diff_seconds'] = round(result['diff_seconds'], 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="跨年章节差异的单年报分析输入节省")
+    parser.add_argument('--json-dir', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                           'reports', 'json_reports'))
+    parser.add_argument('--synthetic', action='store_true', help="使用模拟公司（无章节JSON时自动使用）")
+    parser.add_argument('--years', type=int, default=5, help="模拟公司的年数")
+    parser.add_argument('--paragraphs', type=int, default=60, help="模拟公司每个章节的段落数")
+    parser.add_argument('--change-rate', type=float, default=0.15, help="模拟公司每年改写的段落比例")
+    parser.add_argument('--new-rate', type=float, default=0.05, help="模拟公司每年新增的段落比例")
+    parser.add_argument('--token-budget', type=int, default=12000, help="章节路由预算，同 SECTION_ROUTER_TOKEN_BUDGET")
+    parser.add_argument('--chunk-tokens', type=int, default=5000, help="单年报分析每次调用的文本 token 数")
+    parser.add_argument('--output', help="结果JSON的保存路径")
+    args = parser.parse_args()
+
+    companies = {} if args.synthetic else load_companies(args.json_dir)
+    if not companies:
+        companies = {"模拟公司": build_synthetic_company(args.years, args.paragraphs, args.change_rate, args.new_rate)}
+
+    router = SectionRouter(token_budget=args.token_budget)
+    chunker = SectionChunker(chunk_size=args.chunk_tokens, max_overlap=60)
+    results = {}
+    print(f"{'公司':<12}{'年数':>6}{'全文token':>12}{'差异token':>12}{'节省':>8}{'调用':>10}"
+          f"{'新增':>8}{'变化':>8}{'未变':>8}{'差异耗时(s)':>12}")
+    for code, reports in sorted(companies.items()):
+        stats = results[code] = bench_company(reports, router, chunker)
+        print(f"{code:<12}{len(stats['years']):>6}{stats['full_tokens']:>12}{stats['sent_tokens']:>12}"
+              f"{stats['saved_ratio']:>8.1%}{stats['full_calls']:>5}->{stats['sent_calls']:<4}"
+              f"{stats['new']:>8}{stats['changed']:>8}{stats['unchanged']:>8}{stats['diff_seconds']:>12.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
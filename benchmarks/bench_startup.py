@@ -0,0 +1,136 @@
+"""
+bench_startup.py
+
+统计模块的启动导入耗时：在独立进程中执行 python -X importtime -c "import 模块"，解析 stderr 中每个模块的
+自身耗时与累计耗时，多次运行取中位数。
+- 导入总耗时：import 语句引入的顶层模块累计耗时之和，不含解释器启动时已导入的模块（以 -c pass 为基线）
+- 模块数：import 语句新导入的模块数量
+- 最重的包：按顶层包名汇总自身耗时，列出耗时最多的几个，用于发现被提前导入的重量级依赖
+
+默认统计 LLM.app、reports.pdf_parser、analyze.strategies_buffett。
+导入 LLM.app 时 streamlit 以 bare 模式执行页面脚本（JOB_WORKERS=0，不启动后台任务线程），
+会在 results 下创建任务队列与对话历史的 SQLite 文件。
+
+用法：
+python benchmarks/bench_startup.py
+python benchmarks/bench_startup.py --repeat 10 --output startup.json
+python benchmarks/bench_startup.py --compare startup.json          # 与之前保存的结果对比
+python benchmarks/bench_startup.py --modules LLM.LLM_reports LLM.chat_store
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+from statistics import median
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ["LLM.app", "reports.pdf_parser", "analyze.strategies_buffett"]
+
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, str, int]]:
+    """
+    解析 -X importtime 的输出
+    :param stderr: 子进程的 stderr
+    :return: [(自身耗时us, 累计耗时us, 模块名, 嵌套深度)]，顺序与输出一致（子模块在父模块之前）
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # 跳过表头 "self [us] | cumulative | imported package"
+            continue
+        name_field = fields[2].rstrip()
+        depth = (len(name_field) - len(name_field.lstrip(" ")) - 1) // 2
+        entries.append((int(fields[0]), int(fields[1]), name_field.strip(), depth))
+    return entries
+
+
+def run_importtime(statement: str) -> List[Tuple[int, int, str, int]]:
+    """
+    在独立进程中执行语句并返回导入记录
+    模块执行中途出错时（如页面脚本创建分析器缺少依赖）importtime 仍会记录已完成的导入，此时输出警告并照常统计
+    """
+    env = dict(os.environ, JOB_WORKERS="0", LANGSMITH_TRACING="false", PYTHONDONTWRITEBYTECODE="1")
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT_DIR, env=env,
+                               capture_output=True, text=True)
+    entries = parse_importtime(completed.stderr)
+    if completed.returncode != 0:
+        if not entries:
+            raise RuntimeError(f"执行 {statement!r} 失败:\n{completed.stderr[-2000:]}")
+        error = completed.stderr.strip().splitlines()[-1]
+        print(f"警告：执行 {statement!r} 时出错（{error}），统计已完成的导入", file=sys.stderr)
+    return entries
+
+
+def summarize_import(entries: List[Tuple[int, int, str, int]], baseline: Set[str], top: int = 5) -> Dict[str, Any]:
+    """
+    汇总一次导入
+    :param entries: parse_importtime 的结果
+    :param baseline: 解释器启动时已导入的模块名
+    :param top: 列出的最重包数量
+    """
+    entries = [entry for entry in entries if entry[2] not in baseline]
+    package_self = defaultdict(int)
+    for self_us, _, name, _ in entries:
+        package_self[name.split(".")[0]] += self_us
+    heaviest = sorted(package_self.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        'total_ms': sum(entry[1] for entry in entries if entry[3] == 0) / 1000,
+        'modules': len(entries),
+        'heaviest': [(package, us / 1000) for package, us in heaviest],
+    }
+
+
+def bench_module(module: str, repeat: int, baseline: Set[str], top: int) -> Dict[str, Any]:
+    """多次导入取中位数，最重包取耗时中位数那一次的结果"""
+    runs = sorted((summarize_import(run_importtime(f"import {module}"), baseline, top) for _ in range(repeat)),
+                  key=lambda run: run['total_ms'])
+    middle = runs[len(runs) // 2]
+    return {
+        'total_ms': round(median(run['total_ms'] for run in runs), 1),
+        'min_ms': round(runs[0]['total_ms'], 1),
+        'modules': middle['modules'],
+        'heaviest': [[package, round(ms, 1)] for package, ms in middle['heaviest']],
+    }
+
+
+def load_previous(path: Optional[str]) -> Dict[str, Any]:
+    if not path:
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('modules', {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模块启动导入耗时（python -X importtime）")
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES, help="要统计的模块")
+    parser.add_argument('--repeat', type=int, default=5, help="每个模块的导入次数，取中位数")
+    parser.add_argument('--top', type=int, default=5, help="列出自身耗时最多的包的数量")
+    parser.add_argument('--output', help="结果JSON的保存路径")
+    parser.add_argument('--compare', help="之前保存的结果JSON，输出耗时变化")
+    args = parser.parse_args()
+
+    baseline = {entry[2] for entry in run_importtime("pass")}
+    previous = load_previous(args.compare)
+    results = {'python': sys.version.split()[0], 'repeat': args.repeat, 'modules': {}}
+
+    print(f"{'模块':<32}{'导入(ms)':>10}{'最快(ms)':>10}{'模块数':>8}{'变化(ms)':>10}  最重的包(自身耗时ms)")
+    for module in args.modules:
+        stats = results['modules'][module] = bench_module(module, args.repeat, baseline, args.top)
+        delta = f"{stats['total_ms'] - previous[module]['total_ms']:+.1f}" if module in previous else "-"
+        heaviest = ", ".join(f"{package} {ms:.0f}" for package, ms in stats['heaviest'])
+        print(f"{module:<32}{stats['total_ms']:>10.1f}{stats['min_ms']:>10.1f}{stats['modules']:>8}{delta:>10}  {heaviest}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+bench_vector_backend.py
+
+内存映射 IVF 向量索引（MmapVectorIndex）的规模测试：
+以带簇结构的随机向量模拟文本块向量，统计入库耗时、top-k 检索延迟（p50/p95）、
+相对精确检索的 recall@k 以及进程峰值内存。可选同时测试 Chroma 作为对照。
+
+用法：
+python benchmarks/bench_vector_backend.py --rows 1000000 --dim 768 --dtype int8
+python benchmarks/bench_vector_backend.py --rows 100000 --chroma
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+from typing import Callable, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.mmap_index import MmapVectorIndex
+
+
+def generate_batches(rows: int, dim: int, batch_size: int, clusters: int = 1000, seed: int = 42):
+    """按批生成带簇结构的向量，避免一次性占用内存"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    for start in range(0, rows, batch_size):
+        size = min(batch_size, rows - start)
+        noise = 0.5 * rng.normal(size=(size, dim)).astype(np.float32)
+        yield start, centers[rng.integers(clusters, size=size)] + noise
+
+
+def exact_top_k(index: MmapVectorIndex, query: np.ndarray, k: int) -> List[int]:
+    """在内存映射矩阵上分块计算精确 top-k，作为召回率基准"""
+    rows = index.count()
+    query = query / np.linalg.norm(query)
+    scores = np.concatenate([
+        index._decode(np.arange(start, min(start + 65536, rows)), rows) @ query
+        for start in range(0, rows, 65536)
+    ])
+    return np.argsort(-scores)[:k].tolist()
+
+
+def measure(search: Callable[[np.ndarray], List[int]], queries: np.ndarray,
+            gold: List[List[int]], k: int) -> Dict[str, float]:
+    """统计检索延迟分位数与 recall@k"""
+    latencies = []
+    recall = 0.0
+    for query, relevant in zip(queries, gold):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recall += len(set(found) & set(relevant)) / k
+    return {'p50_ms': float(np.percentile(latencies, 50)), 'p95_ms': float(np.percentile(latencies, 95)),
+            'recall': recall / len(queries)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="内存映射向量索引规模测试")
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--dtype', choices=["float16", "int8"], default="float16")
+    parser.add_argument('--nprobe', type=int, default=8)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--chroma', action='store_true', help="同时测试 Chroma（入库较慢）")
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        index = MmapVectorIndex(os.path.join(temp_dir, 'mmap'), None, dtype=args.dtype, nprobe=args.nprobe)
+        batch_size = 50000
+        start = time.perf_counter()
+        # 训练前先写入全部数据，只训练一次
+        index.train_threshold = args.rows + 1
+        for offset, vectors in generate_batches(args.rows, args.dim, batch_size):
+            index.add_vectors(vectors, [str(offset + i) for i in range(len(vectors))],
+                              [{'year': 2020 + i % 5} for i in range(len(vectors))])
+        written = time.perf_counter() - start
+        index._train(args.rows)
+        trained = time.perf_counter() - start - written
+
+        rng = np.random.default_rng(7)
+        query_rows = np.sort(rng.choice(args.rows, args.queries, replace=False))
+        queries = index._decode(query_rows, args.rows) + 0.05 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+        gold = [exact_top_k(index, query, args.k) for query in queries]
+
+        def mmap_search(query):
+            results = index.similarity_search_by_vector_with_relevance_scores(query.tolist(), k=args.k)
+            return [int(doc.page_content) for doc, _ in results]
+
+        stats = measure(mmap_search, queries, gold, args.k)
+        size_mb = os.path.getsize(os.path.join(index.directory, 'vectors.bin')) / 1024 / 1024
+        print(f"mmap({args.dtype}): {args.rows} 行 x {args.dim} 维, 向量文件 {size_mb:.0f}MB, "
+              f"写入 {written:.1f}s, 训练 {trained:.1f}s, 倒排列表 {len(index.centroids)}")
+        print(f"  p50 {stats['p50_ms']:.1f}ms, p95 {stats['p95_ms']:.1f}ms, recall@{args.k} {stats['recall']:.3f}")
+
+        if args.chroma:
+            import chromadb
+            client = chromadb.PersistentClient(path=os.path.join(temp_dir, 'chroma'))
+            collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+            start = time.perf_counter()
+            for offset, vectors in generate_batches(args.rows, args.dim, 5000):
+                collection.add(ids=[str(offset + i) for i in range(len(vectors))], embeddings=vectors.tolist())
+            written = time.perf_counter() - start
+
+            def chroma_search(query):
+                return [int(i) for i in collection.query(query_embeddings=[query.tolist()], n_results=args.k)['ids'][0]]
+
+            stats = measure(chroma_search, queries, gold, args.k)
+            print(f"chroma: 写入 {written:.1f}s")
+            print(f"  p50 {stats['p50_ms']:.1f}ms, p95 {stats['p95_ms']:.1f}ms, recall@{args.k} {stats['recall']:.3f}")
+
+        print(f"进程峰值内存 {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}MB")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,8 +4,15 @@ reports package
 This package contains report processing and analysis tools.
 """
 
-from .LLM_reports import ReportAnalyzer
-from .pdf_parser import process_pdf
-from .download_reports import ensure_stock_reports
+__all__ = ['process_pdf', 'ensure_stock_reports']
 
-__all__ = ['ReportAnalyzer', 'process_pdf', 'ensure_stock_reports'] 
\ No newline at end of file
+
+def __getattr__(name):
+    # 按需导入：import reports.pdf_parser 时不加载年报下载模块及 pandas
+    if name == 'process_pdf':
+        from .pdf_parser import process_pdf
+        return process_pdf
+    if name == 'ensure_stock_reports':
+        from .download_reports import ensure_stock_reports
+        return ensure_stock_reports
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}") 
\ No newline at end of file
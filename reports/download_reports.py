@@ -2,10 +2,7 @@ import requests
 import re
 import os
 import logging
-import pdfplumber
-import pandas as pd
 from datetime import datetime
-from fetch_reports import main as fetch_reports_main
 
 #下载pdf
 def download_pdf(pdf_url, pdf_file_path):
@@ -121,6 +118,8 @@ def process_stock_reports(stock_code, csv_file, delete_pdf=True):
 
     try:
         # 读取CSV文件
+        import pandas as pd
+
         df = pd.read_csv(csv_file)
         
         # 过滤指定股票的记录
@@ -159,7 +158,12 @@ def ensure_stock_reports(stock_code: str, results_dir: str, delete_pdf: bool = F
         csv_files = [f for f in os.listdir(results_dir) if f == csv_file_name]
         
         if not csv_files:
-            # 如果没有找到CSV文件，则下载
+            # 如果没有找到CSV文件，则下载（fetch_reports 依赖 pandas，只在需要下载时导入）
+            try:
+                from reports.fetch_reports import main as fetch_reports_main
+            except ImportError:
+                # 作为脚本直接运行时 reports 目录位于 sys.path 中
+                from fetch_reports import main as fetch_reports_main
             fetch_reports_main(start_year, end_year)
             csv_file = os.path.join(results_dir, f'{start_year}_{end_year}_年报汇总.csv')
         else:
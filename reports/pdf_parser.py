@@ -14,7 +14,6 @@ import json
 from typing import Dict, List, Tuple, Optional
 from pypdf import PdfReader
 import re
-import pdfplumber
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -95,11 +94,17 @@ class PdfParser:
         self.pdf_path = pdf_path
         self.reader = PdfReader(pdf_path)
         self.root_node = None  # 存储目录根节点
-        # 使用 pdfplumber 以支持更精细的文本/表格提取
+        # 使用 pdfplumber 以支持更精细的文本/表格提取（导入较慢，创建解析器时才导入）
+        self._plumber_pdf = None
         try:
-            self._plumber_pdf = pdfplumber.open(pdf_path)
-        except Exception:
-            self._plumber_pdf = None
+            import pdfplumber
+        except ImportError as e:
+            logging.warning(f"未安装 pdfplumber，只能提取纯文本，表格不会被识别: {str(e)}")
+        else:
+            try:
+                self._plumber_pdf = pdfplumber.open(pdf_path)
+            except Exception as e:
+                logging.warning(f"pdfplumber 无法打开 {pdf_path}，只能提取纯文本: {str(e)}")
 
     def extract_outline(self) -> PdfOutlineNode:
         """
@@ -673,6 +678,28 @@ class PdfParser:
         return cleaned_text
 
 
+def process_pdf(pdf_path: str) -> List[Dict]:
+    """
+    解析PDF并返回按目录拆分的章节列表
+    :param pdf_path: PDF文件路径
+    :return: 章节列表，每项包含 title、content 与 metadata（同 save_outline_to_json 中的 outline 项）
+    """
+    parser = PdfParser(pdf_path)
+    root_node = parser.extract_outline()
+
+    outline_items = []
+    parser._collect_leaf_nodes(root_node, outline_items)
+
+    return [
+        {
+            'title': item['metadata']['section_title'],
+            'content': item['content'] or "",
+            'metadata': item['metadata']
+        }
+        for item in outline_items
+    ]
+
+
 def main():
     """主函数"""
     try:
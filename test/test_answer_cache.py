@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话回答语义缓存测试
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from LLM.answer_cache import SemanticAnswerCache, is_context_dependent
+from LLM.LLM_reports import ReportAnalyzer
+from LLM.report_store import ReportStore
+
+
+def char_embedding(text):
+    """按字符计数的向量，字符重合度越高相似度越高"""
+    vector = [0.0] * 512
+    for char in text:
+        vector[ord(char) % 512] += 1.0
+    return vector
+
+
+class TestSemanticAnswerCache(unittest.TestCase):
+    """测试SemanticAnswerCache类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.embedded = []
+
+        def embed(text):
+            self.embedded.append(text)
+            return char_embedding(text)
+
+        self.cache = SemanticAnswerCache(os.path.join(self.temp_dir, 'answers.sqlite'), embed, threshold=0.9)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_similar_question_hits(self):
+        """测试相似问题命中，规范化后相同的问题不计算向量"""
+        self.cache.store("平安银行2023年营收情况", "营收1647亿元", "000001", 2023)
+        self.embedded.clear()
+
+        exact = self.cache.lookup("平安银行 2023年营收情况？", "000001", 2023)
+        self.assertEqual(exact['answer'], "营收1647亿元")
+        self.assertEqual(exact['similarity'], 1.0)
+        self.assertEqual(self.embedded, [])
+
+        similar = self.cache.lookup("平安银行 2023 营收情况", "000001", 2023)
+        self.assertEqual(similar['answer'], "营收1647亿元")
+        self.assertGreaterEqual(similar['similarity'], 0.9)
+
+        self.assertIsNone(self.cache.lookup("平安银行2023年分红方案", "000001", 2023))
+        self.assertEqual(self.cache.stats(), {'hits': 2, 'misses': 1})
+
+    def test_scope_isolation(self):
+        """测试不同公司、年份的分区互不命中"""
+        self.cache.store("2023年营收情况", "营收1647亿元", "000001", 2023)
+        self.assertIsNone(self.cache.lookup("2023年营收情况", "600519", 2023))
+        self.assertIsNone(self.cache.lookup("2023年营收情况", "000001", 2022))
+        self.assertIsNone(self.cache.lookup("2023年营收情况"))
+
+    def test_invalidate(self):
+        """测试入库新年报时清除该年份与不限年份的回答，其他年份保留"""
+        self.cache.store("平安银行2023年营收", "A", "000001", 2023)
+        self.cache.store("平安银行2022年营收", "B", "000001", 2022)
+        self.cache.store("平安银行的主营业务", "C", "000001")
+
+        self.assertEqual(self.cache.invalidate("000001", 2023), 2)
+        self.assertIsNone(self.cache.lookup("平安银行2023年营收", "000001", 2023))
+        self.assertIsNone(self.cache.lookup("平安银行的主营业务", "000001"))
+        self.assertEqual(self.cache.lookup("平安银行2022年营收", "000001", 2022)['answer'], "B")
+
+    def test_persistence_and_ttl(self):
+        """测试缓存在新实例中可用，过期后不再命中"""
+        self.cache.store("什么是ROE", "净资产收益率")
+        reopened = SemanticAnswerCache(self.cache.database_path, char_embedding)
+        self.assertEqual(reopened.lookup("什么是ROE？")['answer'], "净资产收益率")
+
+        expired = SemanticAnswerCache(self.cache.database_path, char_embedding, ttl_seconds=-1)
+        self.assertIsNone(expired.lookup("什么是ROE"))
+
+    def test_max_entries_per_scope(self):
+        """测试分区超出上限时删除最早的回答"""
+        cache = SemanticAnswerCache(os.path.join(self.temp_dir, 'small.sqlite'), char_embedding,
+                                    max_entries_per_scope=2)
+        for index, question in enumerate(["营业收入", "净利润", "现金流"]):
+            cache.store(question, str(index), "000001", 2023)
+        self.assertIsNone(cache.lookup("营业收入", "000001", 2023))
+        self.assertEqual(cache.lookup("现金流", "000001", 2023)['answer'], "2")
+
+    def test_context_dependent(self):
+        """测试识别依赖上下文的追问"""
+        self.assertTrue(is_context_dependent("总结一下刚才的结论"))
+        self.assertTrue(is_context_dependent("它2022年呢"))
+        self.assertFalse(is_context_dependent("平安银行2023年营收情况"))
+        self.assertTrue(is_context_dependent("其2022年的净利润是多少"))
+        self.assertTrue(is_context_dependent("分析一下其中的风险"))
+        for message in ("平安银行与其他银行相比如何", "尤其是零售业务", "茅台的其余费用", "贵州茅台及其子公司"):
+            self.assertFalse(is_context_dependent(message), message)
+
+    def test_scope_requires_stock_code(self):
+        """测试未识别出公司的问题不使用回答缓存"""
+        analyzer = ReportAnalyzer.__new__(ReportAnalyzer)
+        analyzer.answer_cache = self.cache
+        analyzer.report_store = ReportStore(os.path.join(self.temp_dir, 'vector_store'),
+                                              DeterministicFakeEmbedding(size=16), backend="mmap")
+        analyzer.report_store.add_chunks(["平安银行营收"], [{'stock_code': "000001", 'company_name': "平安银行",
+                                                          'year': 2023, 'report_type': "annual"}])
+        self.assertEqual(analyzer._answer_cache_scope("平安银行2023年营收情况"), ("000001", 2023))
+        self.assertEqual(analyzer._answer_cache_scope("600519 值得投资吗"), ("600519", None))
+        self.assertIsNone(analyzer._answer_cache_scope("贵州茅台值得投资吗"))
+        self.assertIsNone(analyzer._answer_cache_scope("比亚迪2023年值得投资吗"))
+        self.assertIsNone(analyzer._answer_cache_scope("营收300000元的公司值得投资吗"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多公司批量分析流水线测试
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.batch_runner import BatchRunner, STAGES
+
+
+class FakeStore:
+    def __init__(self):
+        self.index = {}
+
+
+class FakeAnalyzer:
+    """记录调用的模拟 ReportAnalyzer"""
+
+    def __init__(self, results_dir):
+        self.results_dir = results_dir
+        self.txt_dir = os.path.join(results_dir, 'txt_reports')
+        self.json_dir = os.path.join(results_dir, 'json_reports')
+        self.report_store = FakeStore()
+        self.stored = []
+        self.processed = []
+        self.lock = threading.Lock()
+
+    def store_sections(self, pdf_path, sections):
+        time.sleep(0.02)
+        with self.lock:
+            self.stored.append(os.path.basename(pdf_path))
+
+    def process_company(self, code):
+        time.sleep(0.05)
+        with self.lock:
+            self.processed.append(code)
+
+
+class TestBatchRunner(unittest.TestCase):
+    """测试BatchRunner类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_dir = os.path.join(self.temp_dir, 'pdf_reports')
+        os.makedirs(self.pdf_dir)
+        self.analyzer = FakeAnalyzer(self.temp_dir)
+        self.downloaded = []
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def downloader(self, code):
+        time.sleep(0.05)
+        self.downloaded.append(code)
+        if code == "000003":
+            return
+        for year in (2022, 2023):
+            open(os.path.join(self.pdf_dir, f"{code}_公司{code[-1]}_{year}.pdf"), 'w').close()
+
+    @staticmethod
+    def parser(pdf_path):
+        time.sleep(0.05)
+        if "_2022" in pdf_path and "000002" in pdf_path:
+            raise RuntimeError("解析失败")
+        return [{'content': "主营业务。", 'metadata': {'section_path': ["管理层讨论与分析"]}}]
+
+    def make_runner(self, **kwargs):
+        return BatchRunner(self.analyzer, downloader=self.downloader, parser=self.parser, pdf_dir=self.pdf_dir,
+                           parse_in_processes=False, monitor_interval=0.01, **kwargs)
+
+    def test_pipeline(self):
+        """测试各阶段依次完成，解析失败的年报不阻塞公司分析"""
+        report = self.make_runner(download_workers=2, parse_workers=2).run(["000001", "2", "000003"])
+
+        self.assertEqual(sorted(self.analyzer.processed), ["000001", "000002", "000003"])
+        self.assertEqual(len(self.analyzer.stored), 3)
+        self.assertEqual(report['stages']['parse']['errors'], 1)
+        self.assertEqual(report['stages']['download']['processed'], 3)
+        self.assertEqual(set(report['stages']), set(STAGES))
+        for stats in report['stages'].values():
+            self.assertIn('throughput', stats)
+            self.assertIn('max_queue_depth', stats)
+
+        # 解析结果保存为章节JSON与txt
+        with open(os.path.join(self.analyzer.json_dir, "000001_公司1_2023_chapters.json"), encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['outline'][0]['content'], "主营业务。")
+        self.assertTrue(os.path.exists(os.path.join(self.analyzer.txt_dir, "000001_公司1_2023.txt")))
+
+    def test_duplicate_codes(self):
+        """测试重复的股票代码只处理一次"""
+        report = self.make_runner(download_workers=2, parse_workers=2).run(["000001", "1", "000001"])
+
+        self.assertEqual(self.analyzer.processed, ["000001"])
+        self.assertEqual(self.downloaded, ["000001"])
+        self.assertEqual(report['stages']['analyze']['processed'], 1)
+
+    def test_stages_overlap(self):
+        """测试并发执行时总耗时小于各阶段串行耗时之和，各分析线程使用独立的分析器"""
+        codes = [f"{i:06d}" for i in range(10, 16)]
+        worker_analyzers = []
+
+        def factory():
+            analyzer = FakeAnalyzer(self.temp_dir)
+            worker_analyzers.append(analyzer)
+            return analyzer
+
+        report = self.make_runner(download_workers=3, parse_workers=3, analyze_workers=3,
+                                  analyzer_factory=factory).run(codes)
+        serial = sum(stats['busy_time'] for stats in report['stages'].values())
+        self.assertLess(report['wall_time'], serial)
+        self.assertEqual(self.analyzer.processed, [])
+        self.assertLessEqual(len(worker_analyzers), 3)
+        self.assertEqual(sorted(code for analyzer in worker_analyzers for code in analyzer.processed), codes)
+
+    def test_shared_analyzer_rejected(self):
+        """测试多个分析线程不能共用一个分析器"""
+        with self.assertRaises(ValueError):
+            self.make_runner(analyze_workers=2)
+
+    def test_skip_ingested_years(self):
+        """测试已有章节JSON与已入库年份时跳过解析和向量化"""
+        self.analyzer.report_store.index["000001"] = {'name': "公司1", 'years': [2022, 2023]}
+        self.make_runner().run(["000001"])
+        self.assertEqual(self.analyzer.stored, [])
+        self.assertEqual(self.analyzer.processed, ["000001"])
+
+
+if __name__ == '__main__':
+    unittest.main()
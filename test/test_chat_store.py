@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite 对话存储与后台压缩测试
+"""
+
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from LLM.chat_store import ChatStore, SQLiteChatMessageHistory
+from LLM.conversation_memory import TokenBudgetMemory, SUMMARY_PREFIX
+
+
+def count_chars(text):
+    """每个字符 1 个 token，便于计算预算"""
+    return len(text)
+
+
+class TestChatStore(unittest.TestCase):
+    """测试ChatStore与SQLiteChatMessageHistory"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.database_path = os.path.join(self.temp_dir, 'chat_history.sqlite')
+        self.store = ChatStore(self.database_path, token_counter=count_chars)
+        self.summaries = []
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def summarize(self, summary, messages):
+        self.summaries.append([message.content for message in messages])
+        return (summary + "|" if summary else "") + f"合并{len(messages)}条"
+
+    def make_history(self, session_id="s1", **kwargs):
+        history = SQLiteChatMessageHistory(self.store, session_id, **kwargs)
+        # 每条消息 10 + 4 个 token：保留 2 条原文，待压缩消息达到 2 条时压缩
+        history.configure_compaction(self.summarize, keep_tokens=28, batch_tokens=28, max_summary_tokens=100)
+        return history
+
+    def add_turns(self, history, count):
+        for index in range(count):
+            history.store.add_messages(history.session_id, [HumanMessage(content=f"问题{index:03d}".ljust(10, "。")),
+                                                            AIMessage(content=f"回答{index:03d}".ljust(10, "。"))])
+
+    def test_persist_and_share_between_instances(self):
+        """测试消息持久化，其他实例按会话ID读取同一段对话，会话之间互不影响"""
+        history = self.make_history()
+        history.add_messages([HumanMessage(content="平安银行怎么样"), AIMessage(content="经营稳健")])
+
+        other = SQLiteChatMessageHistory(ChatStore(self.database_path), "s1")
+        self.assertEqual([message.content for message in other.messages], ["平安银行怎么样", "经营稳健"])
+        self.assertEqual(SQLiteChatMessageHistory(self.store, "s2").messages, [])
+        self.assertEqual(self.store.list_sessions()[0]['message_count'], 2)
+
+        other.clear()
+        self.assertEqual(history.messages, [])
+
+    def test_compaction(self):
+        """测试较早消息压缩进摘要，未压缩部分不超过保留预算，界面仍可回看全部消息"""
+        history = self.make_history()
+        self.add_turns(history, 3)
+
+        self.assertEqual(history.compact(), 4)
+        self.assertEqual(self.summaries, [["问题000。。。。。", "回答000。。。。。", "问题001。。。。。", "回答001。。。。。"]])
+        self.assertEqual(history.summary, "合并4条")
+        self.assertEqual([message.content[:5] for message in history.messages], ["问题002", "回答002"])
+        self.assertEqual(len(history.display_messages()), 6)
+
+        # 待压缩的消息不足一批时不压缩
+        self.add_turns(history, 1)
+        self.assertEqual(history.compact(), 2)
+        self.assertEqual(history.summary, "合并4条|合并2条")
+        self.assertEqual(history.compact(), 0)
+
+    def test_concurrent_compaction_discarded(self):
+        """测试摘要期间其他进程已完成压缩时，本次结果作废"""
+        history = self.make_history()
+        self.add_turns(history, 3)
+        other = SQLiteChatMessageHistory(ChatStore(self.database_path, token_counter=count_chars), "s1")
+
+        def racing_summarize(summary, messages):
+            other.configure_compaction(self.summarize, 28, 28, 100)
+            other.compact()
+            return "被覆盖的摘要"
+
+        history.configure_compaction(racing_summarize, 28, 28, 100)
+        self.assertEqual(history.compact(), 0)
+        self.assertEqual(history.summary, "合并4条")
+
+    def test_background_compaction(self):
+        """测试写入消息后在后台压缩"""
+        history = self.make_history()
+        self.add_turns(history, 2)
+        history.add_messages([HumanMessage(content="问题".ljust(10, "。")), AIMessage(content="回答".ljust(10, "。"))])
+
+        deadline = time.time() + 5
+        while not history.summary and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(history.summary, "合并4条")
+
+    def test_recent_load_uses_index(self):
+        """测试读取最近消息走会话索引且读取量有界"""
+        history = self.make_history(max_messages=4)
+        history.configure_compaction(None, 0, 0, 0)
+        self.add_turns(history, 50)
+        self.assertEqual(len(history.messages), 4)
+        self.assertEqual(history.messages[-1].content[:5], "回答049")
+
+        with sqlite3.connect(self.database_path) as conn:
+            plan = " ".join(str(row) for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT message FROM messages WHERE session_id = ? AND compacted = 0 "
+                "ORDER BY id DESC LIMIT ?", ("s1", 4)))
+        self.assertIn("idx_messages_session", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_token_budget_memory_uses_history_summary(self):
+        """测试 TokenBudgetMemory 使用历史的摘要，不再自行摘要"""
+        history = self.make_history()
+        memory_summaries = []
+        memory = TokenBudgetMemory(chat_memory=history, max_tokens=60, summary_batch_tokens=1,
+                                   summarize_fn=lambda summary, messages: memory_summaries.append(1) or "",
+                                   token_counter=count_chars)
+        self.add_turns(history, 3)
+        history.compact()
+        memory.save_context({"input": "新问题"}, {"output": "新回答"})
+
+        messages = memory.load_memory_variables({})["chat_history"]
+        self.assertTrue(messages[0].content.startswith(SUMMARY_PREFIX))
+        self.assertIn("合并4条", messages[0].content)
+        self.assertEqual(messages[-1].content, "新回答")
+        self.assertEqual(memory_summaries, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
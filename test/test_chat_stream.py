@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话流式输出测试
+"""
+
+import os
+import sys
+import uuid
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from LLM.chat_stream import FinalAnswerExtractor, StreamEventHandler
+from LLM.LLM_reports import ReportAnalyzer
+
+
+def feed_all(extractor, tokens):
+    return "".join(extractor.feed(token) for token in tokens)
+
+
+class TestFinalAnswerExtractor(unittest.TestCase):
+    """测试Final Answer正文提取"""
+
+    def test_split_tokens_and_escapes(self):
+        """测试跨token的标记与转义字符"""
+        output = '```json\n{"action": "Final Answer", "action_input": "ROE\\u4e3a\\"净资产收益率\\"\\n完"}\n```'
+        tokens = [output[i:i + 3] for i in range(0, len(output), 3)]
+        self.assertEqual(feed_all(FinalAnswerExtractor(), tokens), 'ROE为"净资产收益率"\n完')
+
+    def test_tool_call_not_streamed(self):
+        """测试工具调用的JSON不输出"""
+        output = '{"action": "retrieve_report_content", "action_input": "000001 营业收入"}'
+        self.assertEqual(feed_all(FinalAnswerExtractor(), list(output)), "")
+
+
+class TestStreamEventHandler(unittest.TestCase):
+    """测试回调事件转换"""
+
+    def setUp(self):
+        self.events = []
+        self.handler = StreamEventHandler(self.events.append, max_output_chars=5)
+
+    def test_tokens_from_streaming_model(self):
+        """测试流式模型的token按答案增量输出"""
+        model = FakeListChatModel(responses=['{"action": "Final Answer", "action_input": "分析完成"}'])
+        list(model.stream("你好", config={"callbacks": [self.handler]}))
+        tokens = [event['text'] for event in self.events if event['type'] == 'token']
+        self.assertEqual("".join(tokens), "分析完成")
+        self.assertGreater(len(tokens), 1)
+
+    def test_tool_events(self):
+        """测试工具开始、结束与错误事件"""
+        run_id = uuid.uuid4()
+        self.handler.on_tool_start({'name': "download_reports"}, "000001", run_id=run_id)
+        self.handler.on_tool_end("下载完成，共3份年报", run_id=run_id)
+        self.handler.on_tool_start({'name': "search_wiki"}, "平安银行", run_id=uuid.uuid4())
+        self.handler.on_tool_error(ValueError("超时"), run_id=uuid.uuid4())
+        self.assertEqual(self.events[0], {'type': 'tool_start', 'name': "download_reports", 'input': "000001"})
+        self.assertEqual(self.events[1], {'type': 'tool_end', 'name': "download_reports", 'output': "下载完成，..."})
+        self.assertEqual(self.events[3]['type'], 'tool_error')
+
+
+class TestChatStream(unittest.TestCase):
+    """测试ReportAnalyzer.chat_stream"""
+
+    def test_events_and_final(self):
+        """测试事件按顺序产出，最后为完整回复与首token延迟"""
+        analyzer = ReportAnalyzer.__new__(ReportAnalyzer)
+        prepared = []
+
+        def fake_chat(message, callbacks=None):
+            handler = callbacks[0]
+            handler.on_tool_start({'name': "retrieve_report_content"}, message, run_id=uuid.uuid4())
+            run_id = uuid.uuid4()
+            for token in ['{"action": "Final Answer", ', '"action_input": "', '你', '好', '"}']:
+                handler.on_llm_new_token(token, run_id=run_id)
+            return "你好"
+
+        analyzer.chat = fake_chat
+        events = list(analyzer.chat_stream("问题", prepare_thread=prepared.append))
+
+        self.assertEqual(len(prepared), 1)
+        self.assertEqual([event['type'] for event in events], ['tool_start', 'token', 'token', 'final'])
+        self.assertEqual(events[-1]['text'], "你好")
+        self.assertIsNotNone(events[-1]['ttft'])
+        self.assertLessEqual(events[-1]['ttft'], events[-1]['elapsed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
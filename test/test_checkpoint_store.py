@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析检查点测试
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.checkpoint_store import CheckpointStore, file_digest
+from LLM.LLM_reports import ReportAnalyzer
+from LLM.section_router import SectionRouter
+from LLM.usage_tracker import UsageTracker
+from LLM.model_tiers import ModelTiers
+
+
+class TestCheckpointStore(unittest.TestCase):
+    """测试CheckpointStore类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = CheckpointStore(self.temp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_save_load_and_replace(self):
+        """测试按键读取，且同一阶段只保留最新检查点"""
+        key_v1 = CheckpointStore.make_key("comparison", ["1"], [{'year': "2023"}])
+        key_v2 = CheckpointStore.make_key("comparison", ["2"], [{'year': "2023"}])
+        self.assertNotEqual(key_v1, key_v2)
+
+        self.store.save("000001", "comparison", key_v1, "对比结果1")
+        self.assertEqual(self.store.load("000001", "comparison", key_v1), "对比结果1")
+        self.assertIsNone(self.store.load("000001", "comparison", key_v2))
+
+        self.store.save("000001", "comparison", key_v2, "对比结果2")
+        self.assertIsNone(self.store.load("000001", "comparison", key_v1))
+        self.assertEqual(len(os.listdir(os.path.join(self.temp_dir, "000001"))), 1)
+
+        self.store.clear("000001")
+        self.assertIsNone(self.store.load("000001", "comparison", key_v2))
+
+    def test_file_digest(self):
+        """测试文件内容哈希"""
+        path = os.path.join(self.temp_dir, "a.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("营业收入")
+        digest = file_digest(path)
+        self.assertEqual(len(digest), 64)
+        self.assertEqual(file_digest(os.path.join(self.temp_dir, "missing.txt")), "")
+        self.assertEqual(file_digest(None), "")
+
+
+class TestResumableProcessCompany(unittest.TestCase):
+    """测试process_company从检查点继续"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        for year in (2022, 2023):
+            with open(os.path.join(self.temp_dir, f"000001_平安银行_{year}.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"{year}年报内容")
+
+        # 不初始化模型，只设置 process_company 用到的属性
+        analyzer = ReportAnalyzer.__new__(ReportAnalyzer)
+        analyzer.txt_dir = self.temp_dir
+        analyzer.results_dir = self.temp_dir
+        analyzer.json_dir = os.path.join(self.temp_dir, 'json_reports')
+        analyzer.usage_tracker = UsageTracker()
+        analyzer.checkpoints = CheckpointStore(os.path.join(self.temp_dir, 'checkpoints'))
+        analyzer.model_tiers = ModelTiers({'heavy': "standin"})
+        analyzer.chunk_token_budget = 6000
+        analyzer.comparison_token_budget = 4000
+        analyzer.section_router = SectionRouter()
+        analyzer.section_diff = True
+        analyzer.diff_savings = {}
+        self.calls = []
+        self.previous_paths = []
+        self.final_fails = True
+
+        def analyze_single_report(file_path, previous_file_path=None):
+            self.calls.append(os.path.basename(file_path))
+            self.previous_paths.append(previous_file_path and os.path.basename(previous_file_path))
+            code, name, year = os.path.basename(file_path)[:-4].split('_')
+            return {'code': code, 'name': name, 'year': year, 'analysis': f"{year}分析"}
+
+        def extract_year_record(analysis):
+            self.calls.append(f"record:{analysis['year']}")
+            return {'year': analysis['year'], 'business': [analysis['analysis']]}
+
+        def compare_multiple_years(analyses, year_records):
+            self.calls.append("comparison")
+            return "对比结果"
+
+        def generate_final_summary(company_info, multi_year_analysis):
+            self.calls.append("final")
+            return "" if self.final_fails else "最终报告"
+
+        analyzer.analyze_single_report = analyze_single_report
+        analyzer.extract_year_record = extract_year_record
+        analyzer.compare_multiple_years = compare_multiple_years
+        analyzer.generate_final_summary = generate_final_summary
+        analyzer.save_analysis = lambda code, report: self.calls.append(f"save:{report}")
+        self.analyzer = analyzer
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_resume_after_final_failure(self):
+        """测试最终报告失败后重跑只重新执行最终报告阶段"""
+        self.analyzer.process_company("000001")
+        self.assertEqual(self.calls[:5], ["000001_平安银行_2022.txt", "000001_平安银行_2023.txt",
+                                          "record:2022", "record:2023", "comparison"])
+        # 第二年起与上一年的年报做差异分析
+        self.assertEqual(self.previous_paths, [None, "000001_平安银行_2022.txt"])
+
+        self.calls.clear()
+        self.final_fails = False
+        self.analyzer.process_company("000001")
+        self.assertEqual(self.calls, ["final", "save:最终报告"])
+
+        # 年报内容变化时，只有该年份重新分析；分析结果不变时结构化记录及下游阶段沿用检查点
+        self.calls.clear()
+        with open(os.path.join(self.temp_dir, "000001_平安银行_2023.txt"), 'a', encoding='utf-8') as f:
+            f.write("更正")
+        self.analyzer.process_company("000001")
+        self.assertEqual(self.calls, ["000001_平安银行_2023.txt", "save:最终报告"])
+
+        # 上一年的章节JSON变化时，该年与依赖它的下一年差异分析都重新执行
+        self.calls.clear()
+        os.makedirs(self.analyzer.json_dir, exist_ok=True)
+        with open(os.path.join(self.analyzer.json_dir, "000001_平安银行_2022_chapters.json"), 'w',
+                  encoding='utf-8') as f:
+            f.write('{"outline": []}')
+        self.analyzer.process_company("000001")
+        self.assertEqual(self.calls, ["000001_平安银行_2022.txt", "000001_平安银行_2023.txt", "save:最终报告"])
+
+    def test_no_resume(self):
+        """测试 resume=False 时全部重新执行"""
+        self.final_fails = False
+        self.analyzer.process_company("000001")
+        self.calls.clear()
+        self.analyzer.process_company("000001", resume=False)
+        self.assertEqual(len(self.calls), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
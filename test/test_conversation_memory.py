@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+token预算受限的对话记忆测试
+"""
+
+import os
+import sys
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import SystemMessage
+
+from LLM.conversation_memory import TokenBudgetMemory, SUMMARY_PREFIX
+from LLM.intent_classifier import IntentClassifier
+from LLM.LLM_reports import ReportAnalyzer
+from LLM.model_tiers import ModelTiers
+from LLM.token_utils import estimate_tokens, truncate_to_tokens
+from LLM.tool_cache import ToolResultCache
+from LLM.usage_tracker import UsageTracker
+
+FINAL_ANSWER = '```json\n{"action": "Final Answer", "action_input": "分析结论"}\n```'
+
+
+class TestTokenBudgetMemory(unittest.TestCase):
+    """测试TokenBudgetMemory类"""
+
+    def setUp(self):
+        self.summary_calls = []
+
+        def summarize(summary, messages):
+            self.summary_calls.append(len(messages))
+            return (summary + "|" if summary else "") + f"合并{len(messages)}条"
+
+        self.memory = TokenBudgetMemory(max_tokens=200, summary_batch_tokens=100,
+                                        max_summary_tokens=50, summarize_fn=summarize)
+
+    def prompt_tokens(self):
+        messages = self.memory.load_memory_variables({})['chat_history']
+        return sum(estimate_tokens(str(message.content)) + 4 for message in messages)
+
+    def test_prompt_size_bounded(self):
+        """测试多轮对话后注入的历史不超过预算，且保留最近一轮原文"""
+        for turn in range(30):
+            self.memory.save_context({'input': f"第{turn}轮问题：" + "营业收入" * 10},
+                                     {'output': f"第{turn}轮回答：" + "净利润" * 10})
+            self.assertLessEqual(self.prompt_tokens(), 200)
+
+        messages = self.memory.load_memory_variables({})['chat_history']
+        self.assertIsInstance(messages[0], SystemMessage)
+        self.assertTrue(messages[0].content.startswith(SUMMARY_PREFIX))
+        self.assertTrue(messages[-1].content.startswith("第29轮回答"))
+        self.assertEqual(len(self.memory.chat_memory.messages), 60)
+
+    def test_summary_incremental(self):
+        """测试摘要按批次增量更新，而非每轮都调用"""
+        for turn in range(30):
+            self.memory.save_context({'input': "问题" * 20}, {'output': "回答" * 20})
+        self.assertGreater(len(self.summary_calls), 0)
+        self.assertLess(len(self.summary_calls), 15)
+        # 每条消息只被合并一次
+        self.assertEqual(sum(self.summary_calls), self.memory.summarized_count)
+
+    def test_multi_input_agent(self):
+        """测试多输入agent选取用户输入写入记忆"""
+        self.memory.save_context({'company_info': "平安银行", 'multi_year_analysis': "", 'chat_history': []},
+                                 {'output': "建议持有"})
+        messages = self.memory.chat_memory.messages
+        self.assertEqual([message.content for message in messages], ["平安银行", "建议持有"])
+
+    def test_oversized_message_truncated_and_clear(self):
+        """测试超出预算的单条消息被截断，清空后摘要一并重置"""
+        self.memory.save_context({'input': "长" * 1000}, {'output': "回" * 1000})
+        self.assertLessEqual(self.prompt_tokens(), 200)
+        self.memory.summary = "旧摘要"
+        self.memory.clear()
+        self.assertEqual(self.memory.load_memory_variables({})['chat_history'], [])
+        self.assertEqual(self.memory.summarized_count, 0)
+
+    def test_truncate_to_tokens(self):
+        """测试按token截断"""
+        text = "营业收入" * 100
+        self.assertLessEqual(estimate_tokens(truncate_to_tokens(text, 30)), 30)
+        self.assertEqual(truncate_to_tokens("ROE", 30), "ROE")
+        self.assertEqual(truncate_to_tokens("ROE", 0), "")
+
+
+
+class TestAnalyzerMemory(unittest.TestCase):
+    """测试对话记忆只挂载在对话使用的 executor 上"""
+
+    def setUp(self):
+        # 不初始化向量库与模型，只设置 setup_agents 和对话用到的属性
+        analyzer = ReportAnalyzer.__new__(ReportAnalyzer)
+        analyzer.model_tiers = ModelTiers({'heavy': "standin"})
+        analyzer.llms = {'fast': FakeListChatModel(responses=[FINAL_ANSWER]),
+                         'heavy': FakeListChatModel(responses=[FINAL_ANSWER])}
+        analyzer.usage_tracker = UsageTracker()
+        analyzer.tool_cache = ToolResultCache()
+        analyzer.callback_handler = None
+        analyzer.token_counter = estimate_tokens
+        analyzer.chunk_token_budget = 6000
+        analyzer.memory = TokenBudgetMemory(chat_memory=InMemoryChatMessageHistory())
+        analyzer.setup_agents()
+        self.analyzer = analyzer
+
+    def test_analysis_executors_stateless(self):
+        """测试公司分析的文本块不写入对话记忆，对话照常写入"""
+        for executor in (self.analyzer.single_report_executor, self.analyzer.comparison_executor,
+                         self.analyzer.final_executor):
+            self.assertIsNone(executor.memory)
+
+        self.analyzer.single_report_executor.invoke({"text_chunk": "年报内容" * 100})
+        self.assertEqual(self.analyzer.memory.chat_memory.messages, [])
+
+        self.analyzer.intent_classifier = IntentClassifier()
+        self.assertEqual(self.analyzer._handle_message("平安银行值得投资吗"), "分析结论")
+        self.assertEqual([message.content for message in self.analyzer.memory.chat_memory.messages],
+                         ["平安银行值得投资吗", "分析结论"])
+
+
+if __name__ == '__main__':
+    unittest.main()
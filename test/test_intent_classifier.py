@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地意图分类器测试
+"""
+
+import os
+import sys
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.intent_classifier import IntentClassifier, normalize_message
+
+
+class KeywordEmbeddings:
+    """按关键词出现情况生成向量的模拟向量模型"""
+
+    VOCAB = ["年报", "对比", "投资", "下载", "筛选", "什么", "变化", "买", "意思", "股"]
+
+    def embed_query(self, text):
+        return [1.0 if word in text else 0.0 for word in self.VOCAB] + [0.1]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+class TestIntentClassifier(unittest.TestCase):
+    """测试IntentClassifier类"""
+
+    def setUp(self):
+        self.llm_calls = []
+
+        def fake_llm(message):
+            self.llm_calls.append(message)
+            return "COMPARE_REPORTS\n理由：用户关心多年变化"
+
+        self.classifier = IntentClassifier(embeddings=KeywordEmbeddings(), llm_fallback=fake_llm,
+                                           similarity_threshold=0.4)
+
+    def test_rule_fast_path(self):
+        """测试明确的关键词直接由规则判定"""
+        cases = {
+            "分析平安银行2023年报": "SINGLE_REPORT",
+            "对比平安银行近3年业绩": "COMPARE_REPORTS",
+            "平安银行值得投资吗": "INVESTMENT_ADVICE",
+            "下载平安银行的年报": "DOWNLOAD_REPORT",
+            "筛选白酒板块股票": "STOCK_SCREENING",
+            "什么是ROE": "GENERAL_QUERY",
+        }
+        for message, expected in cases.items():
+            decision = self.classifier.classify(message)
+            self.assertEqual(decision['intent'], expected, message)
+            self.assertEqual(decision['source'], 'rule')
+        self.assertEqual(self.llm_calls, [])
+
+    def test_embedding_match(self):
+        """测试规则未命中时使用向量最近中心"""
+        decision = self.classifier.classify("茅台营收的变化")
+        self.assertEqual(decision['source'], 'embedding')
+        self.assertEqual(decision['intent'], "COMPARE_REPORTS")
+        self.assertEqual(self.llm_calls, [])
+
+    def test_llm_fallback_and_cache(self):
+        """测试低置信度时回退LLM，且结果按规范化消息缓存"""
+        decision = self.classifier.classify("说说宁德时代")
+        self.assertEqual(decision['source'], 'llm')
+        self.assertEqual(decision['intent'], "COMPARE_REPORTS")
+
+        cached = self.classifier.classify(" 说说 宁德时代！")
+        self.assertEqual(cached['source'], 'cache')
+        self.assertEqual(cached['intent'], "COMPARE_REPORTS")
+        self.assertEqual(len(self.llm_calls), 1)
+
+    def test_without_embeddings(self):
+        """测试没有向量模型且无LLM时归为一般查询"""
+        classifier = IntentClassifier()
+        self.assertEqual(classifier.classify("说说宁德时代")['intent'], "GENERAL_QUERY")
+
+    def test_normalize_message(self):
+        """测试消息规范化"""
+        self.assertEqual(normalize_message(" 平安银行 2023 营收？"), "平安银行2023营收")
+        self.assertEqual(normalize_message("What is ROE?"), "whatisroe")
+
+
+if __name__ == '__main__':
+    unittest.main()
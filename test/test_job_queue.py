@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台任务队列测试
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.job_queue import JobQueue, build_default_handlers
+
+
+def wait_for(predicate, timeout=5.0):
+    """轮询直到条件成立或超时"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class TestJobQueue(unittest.TestCase):
+    """测试JobQueue类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.database_path = os.path.join(self.temp_dir, 'jobs.sqlite')
+        self.release = threading.Event()
+
+        def slow(params, progress):
+            progress(0.5, "处理中")
+            self.release.wait(5)
+            return {'value': params['x'] * 2}
+
+        def failing(params, progress):
+            raise ValueError("年报不存在")
+
+        self.handlers = {'slow': slow, 'failing': failing}
+        self.queues = []
+
+    def tearDown(self):
+        self.release.set()
+        for job_queue in self.queues:
+            job_queue.stop()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def make_queue(self, **kwargs):
+        job_queue = JobQueue(self.database_path, poll_interval=0.02, **kwargs)
+        self.queues.append(job_queue)
+        return job_queue
+
+    def test_progress_and_result(self):
+        """测试任务运行中可查询进度，完成后保存结果"""
+        job_queue = self.make_queue(handlers=self.handlers, workers=1).start()
+        job_id = job_queue.submit('slow', {'x': 21}, owner="analyst-a")
+
+        self.assertTrue(wait_for(lambda: job_queue.get(job_id)['progress'] == 0.5))
+        job = job_queue.get(job_id)
+        self.assertEqual((job['status'], job['message']), ('running', "处理中"))
+
+        self.release.set()
+        self.assertTrue(wait_for(lambda: job_queue.get(job_id)['status'] == 'done'))
+        self.assertEqual(job_queue.get(job_id)['result'], {'value': 42})
+        self.assertEqual([job['id'] for job in job_queue.list_jobs(owner="analyst-a")], [job_id])
+        self.assertEqual(job_queue.list_jobs(owner="analyst-b"), [])
+
+    def test_failure_recorded(self):
+        """测试处理函数出错时任务标记为失败并保存错误"""
+        job_queue = self.make_queue(handlers=self.handlers, workers=1).start()
+        job_id = job_queue.submit('failing', {})
+        self.assertTrue(wait_for(lambda: job_queue.get(job_id)['status'] == 'failed'))
+        self.assertIn("年报不存在", job_queue.get(job_id)['error'])
+
+    def test_duplicate_submit_and_cancel(self):
+        """测试重复提交返回已有任务，排队中的任务可取消"""
+        submitter = self.make_queue(workers=0)
+        first = submitter.submit('slow', {'x': 1})
+        self.assertEqual(submitter.submit('slow', {'x': 1}), first)
+        self.assertNotEqual(submitter.submit('slow', {'x': 2}), first)
+
+        self.assertTrue(submitter.cancel(first))
+        self.assertEqual(submitter.get(first)['status'], 'cancelled')
+        self.assertFalse(submitter.cancel(first))
+
+    def test_persisted_across_instances(self):
+        """测试只提交的进程与独立工作进程共用同一个队列"""
+        submitter = self.make_queue(workers=0).start()
+        job_id = submitter.submit('slow', {'x': 5})
+        time.sleep(0.1)
+        self.assertEqual(submitter.get(job_id)['status'], 'queued')
+
+        self.release.set()
+        self.make_queue(handlers=self.handlers, workers=2).start()
+        self.assertTrue(wait_for(lambda: submitter.get(job_id)['status'] == 'done'))
+        self.assertEqual(submitter.get(job_id)['result'], {'value': 10})
+
+    def test_recover_stale(self):
+        """测试心跳超时的运行中任务重新排队"""
+        job_queue = self.make_queue(handlers=self.handlers, workers=0, stale_after=0.05)
+        job_id = job_queue.submit('slow', {'x': 3})
+        self.assertEqual(job_queue._claim()['id'], job_id)
+        self.assertEqual(job_queue.get(job_id)['status'], 'running')
+
+        time.sleep(0.1)
+        self.assertEqual(job_queue.recover_stale(), 1)
+        self.assertEqual(job_queue.get(job_id)['status'], 'queued')
+
+    def test_default_handlers(self):
+        """测试内置任务类型调用分析器并转换进度"""
+        report_path = os.path.join(self.temp_dir, "000001_analysis.txt")
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write("最终报告")
+        created = []
+
+        class FakeAnalyzer:
+            results_dir = self.temp_dir
+
+            def __init__(self):
+                created.append(self)
+
+            def process_company(self, stock_code, resume=True, progress=None):
+                progress(0.5, "正在进行多年对比分析")
+                return report_path if stock_code == "000001" else None
+
+        handlers = build_default_handlers(FakeAnalyzer)
+        updates = []
+        result = handlers['process_company']({'stock_code': "1", 'download': False},
+                                             lambda fraction, message: updates.append((fraction, message)))
+        self.assertEqual(result, {'report_path': report_path, 'report': "最终报告"})
+        self.assertIn((0.05 + 0.95 * 0.5, "正在进行多年对比分析"), updates)
+
+        with self.assertRaises(RuntimeError):
+            handlers['process_company']({'stock_code': "600519", 'download': False}, lambda *args: None)
+        self.assertEqual(len(created), 1)
+
+        # 其他工作线程使用各自的分析器
+        worker = threading.Thread(target=handlers['process_company'],
+                                  args=({'stock_code': "000001", 'download': False}, lambda *args: None))
+        worker.start()
+        worker.join()
+        self.assertEqual(len(created), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+延迟导入测试：导入各入口模块时不加载较重的依赖
+"""
+
+import os
+import sys
+import json
+import subprocess
+import unittest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, ROOT_DIR)
+
+HEAVY_MODULES = ["langchain_openai", "langchain_huggingface", "langchain_community", "langchain.agents",
+                 "chromadb", "pandas", "pdfplumber", "akshare", "reports.download_reports"]
+
+
+def loaded_modules(statement):
+    """在独立进程中执行语句，返回其中已加载的较重依赖"""
+    code = (f"import sys, json\n{statement}\n"
+            f"print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))")
+    env = dict(os.environ, JOB_WORKERS="0", LANGSMITH_TRACING="false")
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, env=env,
+                               capture_output=True, text=True, timeout=120)
+    if completed.returncode != 0:
+        raise AssertionError(completed.stderr[-2000:])
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+class TestLazyImports(unittest.TestCase):
+    """测试入口模块的导入开销"""
+
+    def test_llm_reports(self):
+        """测试导入 LLM_reports 不加载 agent、向量模型、向量库、pandas 与年报下载模块"""
+        self.assertEqual(loaded_modules("import LLM.LLM_reports"), [])
+
+    def test_light_modules(self):
+        """测试导入 LLM 包中的轻量模块不再连带导入 LLM_reports"""
+        statement = "import LLM.chat_store, LLM.token_utils\nassert 'LLM.LLM_reports' not in sys.modules"
+        self.assertEqual(loaded_modules(statement), [])
+
+    def test_pdf_parser(self):
+        """测试导入 pdf_parser 不加载年报下载模块与 pandas"""
+        self.assertEqual(loaded_modules("import reports.pdf_parser"), [])
+
+    def test_strategies(self):
+        """测试导入选股策略时 akshare 在请求数据时才导入"""
+        self.assertEqual(loaded_modules("import analyze.strategies_buffett"), ["pandas"])
+
+    def test_package_attributes(self):
+        """测试包级名称按需导入后仍可使用"""
+        from LLM import ReportAnalyzer
+        from reports import process_pdf, ensure_stock_reports
+        from LLM.LLM_reports import ReportAnalyzer as analyzer_class
+        self.assertIs(ReportAnalyzer, analyzer_class)
+        self.assertTrue(callable(process_pdf) and callable(ensure_stock_reports))
+
+
+if __name__ == '__main__':
+    unittest.main()
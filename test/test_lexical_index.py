@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BM25倒排索引与融合检索测试
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from LLM.lexical_index import LexicalIndex, tokenize, reciprocal_rank_fusion
+from LLM.report_store import ReportStore
+
+
+class TestTokenize(unittest.TestCase):
+    """测试检索分词"""
+
+    def test_cjk_bigrams_and_numbers(self):
+        """测试中文二元组、英文小写与数字归一化"""
+        tokens = tokenize("研发投入 1,234.56万元 ROE")
+        self.assertIn("研发", tokens)
+        self.assertIn("发投", tokens)
+        self.assertIn("1234.56", tokens)
+        self.assertIn("roe", tokens)
+        self.assertEqual(tokenize("元"), ["元"])
+
+
+class TestLexicalIndex(unittest.TestCase):
+    """测试LexicalIndex类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'lexical_index.sqlite')
+        self.index = LexicalIndex(self.db_path)
+        self.index.add_documents(
+            ["a", "b", "c"],
+            [
+                "经营活动产生的现金流量净额为1,234万元，同比增长。",
+                "公司持续加大研发投入，研发投入占营业收入比例提升。",
+                "营业收入同比增长，净利润稳步提升。",
+            ],
+            [
+                {'stock_code': "000001", 'year': 2023, 'report_type': "annual"},
+                {'stock_code': "000001", 'year': 2022, 'report_type': "annual"},
+                {'stock_code': "600519", 'year': 2023, 'report_type': "annual"},
+            ]
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_exact_term_ranked_first(self):
+        """测试财务科目名称精确命中"""
+        results = self.index.search("经营活动产生的现金流量净额", k=3)
+        self.assertEqual(results[0][0].id, "a")
+        self.assertEqual(self.index.search("研发投入", k=1)[0][0].id, "b")
+        self.assertEqual(self.index.search("1234", k=1)[0][0].id, "a")
+
+    def test_filters(self):
+        """测试按公司与年份过滤"""
+        results = self.index.search("营业收入", k=3, stock_code="600519")
+        self.assertEqual([doc.id for doc, _ in results], ["c"])
+        self.assertEqual(self.index.search("营业收入", k=3, year=2021), [])
+
+    def test_incremental_and_persistent(self):
+        """测试增量写入与重新打开"""
+        self.index.add_documents(["d"], ["商誉减值准备"], [{'stock_code': "000002", 'year': 2023}])
+        reopened = LexicalIndex(self.db_path)
+        self.assertEqual(reopened.count(), 4)
+        self.assertEqual(reopened.search("商誉减值", k=1)[0][0].metadata['stock_code'], "000002")
+
+
+class TestHybridSearch(unittest.TestCase):
+    """测试融合检索"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = ReportStore(os.path.join(self.temp_dir, 'vector_store'), DeterministicFakeEmbedding(size=16))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_rrf(self):
+        """测试两路都排名靠前的文档融合后排第一"""
+        a, b, c = (Document(id=i, page_content=i) for i in "abc")
+        fused = reciprocal_rank_fusion([[a, b, c], [b, c]], k=3)
+        self.assertEqual(fused[0][0].id, "b")
+        self.assertEqual(len(fused), 3)
+
+    def test_lexical_index_built_at_ingestion(self):
+        """测试入库时同步写入倒排索引，且融合检索能命中精确科目"""
+        texts = ["营业收入增长" + str(i) for i in range(20)] + ["经营活动产生的现金流量净额大幅改善"]
+        metadatas = [{'stock_code': "000001", 'company_name': "平安银行", 'year': 2023,
+                      'report_type': "annual", 'section_path': "管理层讨论与分析"} for _ in texts]
+        self.store.add_chunks(texts, metadatas)
+
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, 'lexical_index.sqlite')))
+        self.assertEqual(self.store.lexical_index.count(), 21)
+
+        results = self.store.hybrid_search("经营活动产生的现金流量净额", k=3, stock_code="000001")
+        self.assertIn("经营活动产生的现金流量净额大幅改善", [doc.page_content for doc, _ in results])
+
+
+if __name__ == '__main__':
+    unittest.main()
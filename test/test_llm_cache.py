@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM响应缓存测试
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.outputs import Generation
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from LLM.llm_cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+    """测试ResponseCache类"""
+
+    def setUp(self):
+        """创建临时缓存数据库"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'llm_cache.sqlite')
+
+    def tearDown(self):
+        """清理临时文件"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_lookup_and_update(self):
+        """测试写入后可以命中"""
+        cache = ResponseCache(self.db_path)
+        self.assertIsNone(cache.lookup("prompt", "model-a"))
+
+        cache.update("prompt", "model-a", [Generation(text="答案")])
+        result = cache.lookup("prompt", "model-a")
+        self.assertEqual(result[0].text, "答案")
+
+        # 模型配置不同不应命中
+        self.assertIsNone(cache.lookup("prompt", "model-b"))
+
+    def test_persistence(self):
+        """测试缓存在重新打开后仍然有效"""
+        ResponseCache(self.db_path).update("prompt", "model", [Generation(text="持久化")])
+        self.assertEqual(ResponseCache(self.db_path).lookup("prompt", "model")[0].text, "持久化")
+
+    def test_prompt_version_isolation(self):
+        """测试提示词模板版本变化后旧缓存失效"""
+        ResponseCache(self.db_path, prompt_version="1").update("prompt", "model", [Generation(text="v1")])
+        self.assertIsNone(ResponseCache(self.db_path, prompt_version="2").lookup("prompt", "model"))
+
+    def test_ttl_expiry(self):
+        """测试过期条目不会被命中"""
+        cache = ResponseCache(self.db_path, ttl_seconds=0.05)
+        cache.update("prompt", "model", [Generation(text="短期")])
+        time.sleep(0.1)
+        self.assertIsNone(cache.lookup("prompt", "model"))
+        self.assertEqual(cache.size(), 0)
+
+    def test_size_eviction(self):
+        """测试超出容量时淘汰最久未访问的条目"""
+        cache = ResponseCache(self.db_path, max_entries=2)
+        cache.update("p1", "model", [Generation(text="1")])
+        time.sleep(0.01)
+        cache.update("p2", "model", [Generation(text="2")])
+        time.sleep(0.01)
+        cache.lookup("p1", "model")  # 访问p1，使p2成为最久未访问
+        time.sleep(0.01)
+        cache.update("p3", "model", [Generation(text="3")])
+
+        self.assertEqual(cache.size(), 2)
+        self.assertIsNotNone(cache.lookup("p1", "model"))
+        self.assertIsNone(cache.lookup("p2", "model"))
+
+    def test_chat_model_integration(self):
+        """测试作为聊天模型缓存时，相同消息只调用一次模型"""
+        cache = ResponseCache(self.db_path)
+        llm = FakeListChatModel(responses=["第一次", "第二次"], cache=cache)
+
+        self.assertEqual(llm.invoke("分析平安银行").content, "第一次")
+        self.assertEqual(llm.invoke("分析平安银行").content, "第一次")
+        self.assertEqual(llm.invoke("分析比亚迪").content, "第二次")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地LLM替身服务测试
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_openai import ChatOpenAI
+
+from LLM.llm_standin import ScriptedResponder, StandinServer
+
+
+class TestScriptedResponder(unittest.TestCase):
+    """测试回复脚本"""
+
+    def setUp(self):
+        self.responder = ScriptedResponder([
+            {'name': "intent", 'match': "意图", 'responses': ["SINGLE_REPORT", "GENERAL_QUERY"]},
+            {'name': "tool", 'match': "Observation:", 'scope': "last", 'responses': ["最终回答"]},
+        ], default="默认回复")
+
+    def test_rules_cycle_and_reset(self):
+        """测试规则按顺序匹配、多个回复轮换、重置后重放"""
+        messages = [{'role': "system", 'content': "识别意图"}, {'role': "user", 'content': "你好"}]
+        self.assertEqual(self.responder.respond(messages), ("intent", "SINGLE_REPORT"))
+        self.assertEqual(self.responder.respond(messages), ("intent", "GENERAL_QUERY"))
+        self.assertEqual(self.responder.respond(messages), ("intent", "SINGLE_REPORT"))
+        self.responder.reset()
+        self.assertEqual(self.responder.respond(messages)[1], "SINGLE_REPORT")
+
+    def test_scope_last_and_default(self):
+        """测试只匹配最后一条消息的规则与默认回复"""
+        history = [{'role': "user", 'content': "Observation: 旧记录"}, {'role': "user", 'content': "新问题"}]
+        self.assertEqual(self.responder.respond(history), ("default", "默认回复"))
+        parts = [{'role': "user", 'content': [{'type': "text", 'text': "Observation: 检索结果"}]}]
+        self.assertEqual(self.responder.respond(parts), ("tool", "最终回答"))
+
+    def test_from_file(self):
+        """测试从JSON脚本加载"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, 'script.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'rules': [{'match': "ROE", 'responses': ["净资产收益率"]}], 'default': "无"}, f)
+            responder = ScriptedResponder.from_file(path)
+            self.assertEqual(responder.respond([{'role': "user", 'content': "什么是ROE"}]), ("rule_0", "净资产收益率"))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class TestStandinServer(unittest.TestCase):
+    """测试OpenAI兼容接口"""
+
+    def setUp(self):
+        responder = ScriptedResponder([{'name': "greet", 'match': "你好", 'responses': ["你好，我是替身 model v1"]}],
+                                      default="默认回复")
+        self.server = StandinServer(responder, latency=0.2, tokens_per_second=100)
+        self.server.start()
+        self.llm = ChatOpenAI(openai_api_key="standin", openai_api_base=self.server.base_url, model="standin",
+                              streaming=True, stream_usage=True, max_retries=0)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_streaming_latency_and_usage(self):
+        """测试流式输出分片返回、首token延迟与用量"""
+        start = time.perf_counter()
+        chunks = []
+        first_token = None
+        for chunk in self.llm.stream("你好"):
+            if chunk.content and first_token is None:
+                first_token = time.perf_counter() - start
+            chunks.append(chunk)
+        self.assertEqual("".join(chunk.content for chunk in chunks), "你好，我是替身 model v1")
+        self.assertGreaterEqual(first_token, 0.2)
+        self.assertGreater(len([chunk for chunk in chunks if chunk.content]), 3)
+        self.assertTrue(any(chunk.usage_metadata for chunk in chunks))
+
+    def test_non_streaming_and_stats(self):
+        """测试非流式请求与请求统计"""
+        llm = ChatOpenAI(openai_api_key="standin", openai_api_base=self.server.base_url, model="standin",
+                         max_retries=0)
+        message = llm.invoke("其他问题")
+        self.assertEqual(message.content, "默认回复")
+        self.assertGreater(message.usage_metadata['output_tokens'], 0)
+
+        stats = self.server.stats()
+        self.assertEqual(stats['calls'], 1)
+        self.assertEqual(stats['by_rule'], {'default': 1})
+        self.assertGreaterEqual(stats['server_seconds'], 0.2)
+        self.server.reset()
+        self.assertEqual(self.server.stats()['calls'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
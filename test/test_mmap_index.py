@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存映射向量索引测试
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from LLM.mmap_index import MmapVectorIndex
+from LLM.report_store import ReportStore
+
+
+def clustered_vectors(rows, dim=32, clusters=20, seed=0):
+    """生成带簇结构的随机向量"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return centers[rng.integers(clusters, size=rows)] + 0.3 * rng.normal(size=(rows, dim))
+
+
+class TestMmapVectorIndex(unittest.TestCase):
+    """测试MmapVectorIndex类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.vectors = clustered_vectors(3000)
+        self.texts = [f"t{i}" for i in range(len(self.vectors))]
+        self.metadatas = [{'year': 2021 + i % 3, 'report_type': "annual"} for i in range(len(self.vectors))]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def build(self, dtype="float16", train_threshold=1000):
+        index = MmapVectorIndex(os.path.join(self.temp_dir, dtype), None, dtype=dtype,
+                                nprobe=8, train_threshold=train_threshold)
+        for start in range(0, len(self.vectors), 1000):
+            index.add_vectors(self.vectors[start:start + 1000], self.texts[start:start + 1000],
+                              self.metadatas[start:start + 1000])
+        return index
+
+    def recall_at_10(self, index, queries=20):
+        normalized = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        total = 0.0
+        for q in range(queries):
+            gold = set(np.argsort(-(normalized @ normalized[q]))[:10].tolist())
+            results = index.similarity_search_by_vector_with_relevance_scores(self.vectors[q].tolist(), k=10)
+            total += len({int(doc.page_content[1:]) for doc, _ in results} & gold) / 10
+        return total / queries
+
+    def test_brute_force_exact(self):
+        """测试未训练时暴力检索，自身为最近邻且距离接近 0"""
+        index = self.build(train_threshold=10 ** 9)
+        self.assertIsNone(index.centroids)
+        doc, distance = index.similarity_search_by_vector_with_relevance_scores(self.vectors[7].tolist(), k=1)[0]
+        self.assertEqual(doc.page_content, "t7")
+        self.assertAlmostEqual(distance, 0.0, places=2)
+
+    def test_ivf_recall(self):
+        """测试训练IVF后的召回率"""
+        for dtype, minimum in (("float16", 0.95), ("int8", 0.85)):
+            index = self.build(dtype)
+            self.assertIsNotNone(index.centroids)
+            self.assertGreaterEqual(self.recall_at_10(index), minimum, dtype)
+
+    def test_filter(self):
+        """测试按年份过滤"""
+        index = self.build()
+        results = index.similarity_search_by_vector_with_relevance_scores(
+            self.vectors[0].tolist(), k=5, filter={"$and": [{"year": 2022}, {"report_type": "annual"}]}
+        )
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(doc.metadata['year'] == 2022 for doc, _ in results))
+
+    def test_reopen_and_repair(self):
+        """测试重新打开索引，以及截断未提交的向量"""
+        index = self.build()
+        with open(os.path.join(index.directory, 'vectors.bin'), 'ab') as f:
+            f.write(b"\0" * index.dim * 2 * 3)
+        reopened = MmapVectorIndex(index.directory, None)
+        self.assertEqual(reopened.count(), 3000)
+        self.assertEqual(os.path.getsize(os.path.join(index.directory, 'vectors.bin')), 3000 * index.dim * 2)
+        doc, _ = reopened.similarity_search_by_vector_with_relevance_scores(self.vectors[42].tolist(), k=1)[0]
+        self.assertEqual(doc.page_content, "t42")
+
+    def test_concurrent_search_during_ingest(self):
+        """测试入库（含重新训练）时并发检索，只返回已提交的行"""
+        index = MmapVectorIndex(os.path.join(self.temp_dir, "concurrent"), None, train_threshold=1000)
+        index.add_vectors(self.vectors[:200], self.texts[:200], self.metadatas[:200])
+        errors = []
+
+        def search():
+            try:
+                for q in range(200):
+                    for doc, _ in index.similarity_search_by_vector_with_relevance_scores(
+                            self.vectors[q % 50].tolist(), k=3, filter={'year': 2021 + q % 3}):
+                        self.assertEqual(doc.metadata['year'], 2021 + q % 3)
+            except Exception as e:
+                errors.append(e)
+
+        searchers = [threading.Thread(target=search) for _ in range(3)]
+        for thread in searchers:
+            thread.start()
+        for start in range(200, len(self.vectors), 100):
+            index.add_vectors(self.vectors[start:start + 100], self.texts[start:start + 100],
+                              self.metadatas[start:start + 100])
+        for thread in searchers:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertIsNotNone(index.centroids)
+        indexes = {name for (name,) in index._conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertIn("idx_rows_year", indexes)
+
+    def test_dimension_mismatch(self):
+        """测试向量维度不一致时报错"""
+        index = self.build(train_threshold=10 ** 9)
+        with self.assertRaises(ValueError):
+            index.add_vectors(np.ones((1, 8)), ["x"])
+
+
+class TestReportStoreMmapBackend(unittest.TestCase):
+    """测试ReportStore使用mmap后端"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_hybrid_search(self):
+        """测试mmap后端下的入库与融合检索"""
+        store = ReportStore(os.path.join(self.temp_dir, 'vector_mmap'), DeterministicFakeEmbedding(size=16),
+                            backend="mmap")
+        texts = ["营业收入增长", "净利润下降", "研发投入加大"]
+        metadatas = [{'stock_code': "000001", 'company_name': "平安银行", 'year': 2023,
+                      'report_type': "annual", 'section_path': "管理层讨论与分析"} for _ in texts]
+        store.add_chunks(texts, metadatas)
+
+        self.assertIsInstance(store.get_collection("000001"), MmapVectorIndex)
+        results = store.hybrid_search("研发投入", k=2, stock_code="000001", year=2023)
+        self.assertEqual(results[0][0].page_content, "研发投入加大")
+        self.assertEqual(len(store.search("净利润下降", k=3, stock_code="000001")), 3)
+
+    def test_unknown_backend(self):
+        """测试不支持的后端报错"""
+        with self.assertRaises(ValueError):
+            ReportStore(os.path.join(self.temp_dir, 'x'), DeterministicFakeEmbedding(size=16), backend="faiss")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型档位配置测试
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.model_tiers import (ModelTiers, DEFAULT_MODEL, parse_price, parse_component_tiers,
+                             estimate_cost)
+
+
+class TestModelTiers(unittest.TestCase):
+    """测试ModelTiers类与配置解析"""
+
+    def test_default_routing(self):
+        """测试默认档位：高频步骤使用 fast，最终综合使用 heavy"""
+        tiers = ModelTiers({'heavy': "large", 'fast': "small"})
+        self.assertEqual(tiers.model_for("intent_chain"), "small")
+        self.assertEqual(tiers.model_for("single_report_executor"), "small")
+        self.assertEqual(tiers.model_for("final_executor"), "large")
+        self.assertEqual(tiers.tier_for("unknown_component"), "heavy")
+
+    def test_from_env(self):
+        """测试从环境变量读取模型、单价与组件档位"""
+        env = {
+            'LLM_MODEL_HEAVY': "large", 'LLM_MODEL_FAST': "small",
+            'LLM_PRICE_FAST': "0.04,0.10", 'LLM_COMPONENT_TIERS': "single_report_executor=heavy",
+        }
+        with mock.patch.dict(os.environ, env):
+            tiers = ModelTiers.from_env()
+        self.assertEqual(tiers.models, {'fast': "small", 'heavy': "large"})
+        self.assertEqual(tiers.prices['fast'], (0.04, 0.10))
+        self.assertEqual(tiers.prices['heavy'], (0.0, 0.0))
+        self.assertEqual(tiers.model_for("single_report_executor"), "large")
+
+    def test_fast_defaults_to_heavy(self):
+        """测试未配置 fast 模型时两档使用同一模型"""
+        with mock.patch.dict(os.environ, {}, clear=True):
+            tiers = ModelTiers.from_env()
+        self.assertEqual(tiers.models, {'fast': DEFAULT_MODEL, 'heavy': DEFAULT_MODEL})
+
+    def test_parsing(self):
+        """测试单价与组件档位的解析，忽略无效配置"""
+        self.assertEqual(parse_price("0.27,1.10"), (0.27, 1.10))
+        self.assertEqual(parse_price(""), (0.0, 0.0))
+        self.assertEqual(parse_price("abc"), (0.0, 0.0))
+        self.assertEqual(parse_component_tiers("intent_chain=heavy, final_executor=medium"),
+                         {'intent_chain': "heavy"})
+        self.assertAlmostEqual(estimate_cost(1_000_000, 500_000, (0.27, 1.10)), 0.82)
+
+
+if __name__ == '__main__':
+    unittest.main()
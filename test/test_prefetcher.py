@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话中提到公司时的预取测试
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.prefetcher import ReportPrefetcher, resolve_stock_mentions
+from LLM.profile_store import ProfileStore
+
+
+class TestResolveStockMentions(unittest.TestCase):
+    """测试resolve_stock_mentions函数"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.profile_store = ProfileStore(os.path.join(self.temp_dir, 'profiles.sqlite'))
+        self.profile_store.upsert_company({'code': "600519", 'name': "贵州茅台"}, 'stock_detail')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_codes_and_names(self):
+        """测试识别股票代码、已入库公司简称与资料库中的公司名称"""
+        index = {"000001": {'name': "平安银行", 'years': [2023]}}
+        self.assertEqual(resolve_stock_mentions("对比平安银行、贵州茅台与002594", index, self.profile_store),
+                         ["002594", "000001", "600519"])
+        self.assertEqual(resolve_stock_mentions("平安银行 000001 怎么样", index, self.profile_store), ["000001"])
+        self.assertEqual(resolve_stock_mentions("什么是ROE", index), [])
+
+    def test_numbers_are_not_codes(self):
+        """测试金额、数量等6位数字不视为股票代码"""
+        index = {"000001": {'name': "平安银行", 'years': [2023]}}
+        for message in ("营收100000元", "2023年净利润123456万元", "营收300000元", "员工300750人", "增长1.300750"):
+            self.assertEqual(resolve_stock_mentions(message, index, self.profile_store), [], message)
+        self.assertEqual(resolve_stock_mentions("300750 和 688981 哪个好", index), ["300750", "688981"])
+        # 已入库或资料库中收录的代码不受前缀限制
+        self.assertEqual(resolve_stock_mentions("123456 怎么样", {"123456": {'name': "", 'years': []}}), ["123456"])
+        self.assertEqual(resolve_stock_mentions("600519股价", index, self.profile_store), ["600519"])
+
+
+class TestReportPrefetcher(unittest.TestCase):
+    """测试ReportPrefetcher类"""
+
+    def setUp(self):
+        self.ready = {"000001"}
+        self.calls = []
+        self.release = threading.Event()
+
+        def ingest(code):
+            self.calls.append(f"ingest:{code}")
+            self.release.wait(5)
+            self.ready.add(code)
+
+        self.prefetcher = ReportPrefetcher(
+            is_ready=lambda code: code in self.ready, ingest=ingest,
+            warm=lambda code: self.calls.append(f"warm:{code}"), cooldown=60, wait_timeout=5
+        )
+
+    def tearDown(self):
+        self.release.set()
+        self.prefetcher.shutdown()
+
+    def test_warm_and_ingest(self):
+        """测试已入库公司只预热，未入库公司在后台入库，检索可等待入库完成"""
+        futures = self.prefetcher.prefetch(["000001", "600519"])
+        self.assertEqual(futures[0].result(timeout=5), 'warmed')
+        self.assertFalse(futures[1].done())
+
+        self.release.set()
+        self.assertEqual(self.prefetcher.wait("600519"), 'ingested')
+        self.assertIn("600519", self.ready)
+        self.assertEqual(sorted(self.calls), ["ingest:600519", "warm:000001"])
+        self.assertIsNone(self.prefetcher.wait("002594"))
+
+    def test_in_flight_and_cooldown(self):
+        """测试进行中的预取被复用，完成后冷却时间内不再重复"""
+        first = self.prefetcher.prefetch(["600519"])[0]
+        second = self.prefetcher.prefetch(["600519"])[0]
+        self.assertIs(first, second)
+
+        self.release.set()
+        first.result(timeout=5)
+        self.assertEqual(self.prefetcher.prefetch(["600519"]), [])
+        self.assertEqual(self.calls, ["ingest:600519"])
+        self.assertEqual(self.prefetcher.stats['skipped'], 1)
+
+    def test_errors_are_contained(self):
+        """测试预取出错时只记录错误"""
+        prefetcher = ReportPrefetcher(is_ready=lambda code: False,
+                                      ingest=lambda code: (_ for _ in ()).throw(RuntimeError("下载失败")))
+        self.assertEqual(prefetcher.prefetch(["600519"])[0].result(timeout=5), 'errors')
+        self.assertEqual(prefetcher.stats['errors'], 1)
+        prefetcher.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
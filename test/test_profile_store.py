@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地公司与行业资料库测试
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.profile_store import (ProfileStore, OfflineProfileSource, profile_from_report,
+                               profile_from_stock_detail, format_profile)
+from LLM.LLM_reports import ReportAnalyzer
+
+OFFLINE_DATA = {
+    'companies': {
+        "000858": {'股票简称': "五粮液", '行业': "酿酒行业", '上市时间': "19980427", '总市值': "4.6e11"},
+    },
+    'entries': {"证券交易所": "证券交易所是证券买卖的场所。"},
+}
+
+
+class TestProfileStore(unittest.TestCase):
+    """测试ProfileStore类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'profiles.sqlite')
+        self.store = ProfileStore(self.db_path)
+        self.store.upsert_company({'code': "600519", 'name': "贵州茅台", 'industry': "酿酒行业"}, 'stock_detail')
+        self.store.upsert_company({'code': "000001", 'name': "平安银行", 'industry': "银行"}, 'stock_detail')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_fuzzy_lookup(self):
+        """测试代码、全称、简称、句中名称与相近名称的查找"""
+        self.assertEqual(self.store.lookup("600519")['name'], "贵州茅台")
+        self.assertEqual(self.store.lookup("贵州茅台")['code'], "600519")
+        self.assertEqual(self.store.lookup("茅台")['code'], "600519")
+        self.assertEqual(self.store.lookup("平安银行的主营业务是什么")['code'], "000001")
+        self.assertEqual(self.store.lookup("贵州茅台股份")['code'], "600519")
+        self.assertIsNone(self.store.lookup("宁德时代"))
+
+    def test_find_companies(self):
+        """测试找出文本中提到的公司"""
+        self.store.upsert_entry("证券交易所", "证券交易所是证券买卖的场所。", 'wiki')
+        found = self.store.find_companies("对比贵州茅台和000001在证券交易所的表现")
+        self.assertEqual([profile['code'] for profile in found], ["000001", "600519"])
+        self.assertEqual(self.store.find_companies("什么是ROE"), [])
+
+    def test_industry_profile(self):
+        """测试按行业汇总已收录公司"""
+        profile = self.store.lookup("酿酒行业")
+        self.assertEqual(profile['kind'], 'industry')
+        self.assertEqual(profile['companies'], [("600519", "贵州茅台")])
+        self.assertIn("贵州茅台(600519)", format_profile(profile))
+
+    def test_merge_persist_and_expiry(self):
+        """测试多来源合并、重新打开后可查、过期视为未命中"""
+        report_profile = profile_from_report(
+            {'stock_code': "600519", 'company_name': "贵州茅台", 'year': 2023},
+            [{'content': "公司主要业务是茅台酒及系列酒的生产与销售。",
+              'metadata': {'section_path': ["管理层讨论与分析", "报告期内公司从事的主要业务"]}}]
+        )
+        self.store.upsert_company(report_profile, 'report')
+        older = dict(report_profile, intro="旧简介", report_year="2021")
+        self.store.upsert_company(older, 'report')
+
+        reopened = ProfileStore(self.db_path)
+        profile = reopened.lookup("茅台")
+        self.assertEqual(profile['industry'], "酿酒行业")
+        self.assertEqual(profile['report_year'], "2023")
+        self.assertIn("茅台酒", profile['intro'])
+        self.assertEqual(profile['source'], "report,stock_detail")
+
+        self.assertIsNone(ProfileStore(self.db_path, max_age_days=0).lookup("贵州茅台"))
+
+    def test_profile_from_stock_detail(self):
+        """测试股票详细信息转换"""
+        profile = profile_from_stock_detail({'股票代码': 1, '股票简称': "平安银行", '行业': "银行", '总市值': None})
+        self.assertEqual(profile, {'code': "000001", 'name': "平安银行", 'industry': "银行"})
+        self.assertIsNone(profile_from_stock_detail({'股票简称': "无代码"}))
+
+
+class TestWikiSearchTool(unittest.TestCase):
+    """测试wiki_search工具的本地优先查找"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        analyzer = ReportAnalyzer.__new__(ReportAnalyzer)
+        analyzer.profile_store = ProfileStore(os.path.join(self.temp_dir, 'profiles.sqlite'))
+        analyzer.profile_source = OfflineProfileSource(data=OFFLINE_DATA)
+        analyzer.profile_store.upsert_company({'code': "000001", 'name': "平安银行", 'industry': "银行"}, 'report')
+        self.source = analyzer.profile_source
+        self.profile_store = analyzer.profile_store
+        self.tool = analyzer.create_wiki_search_tool()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_local_first_then_fallback(self):
+        """测试本地命中不访问外部来源，未命中时回退并写回本地"""
+        self.assertIn("平安银行（000001）", self.tool.invoke("平安银行"))
+        self.assertEqual(self.source.calls, 0)
+
+        self.assertIn("所属行业：酿酒行业", self.tool.invoke("000858"))
+        self.assertIn("五粮液", self.tool.invoke("五粮液"))
+        self.assertEqual(self.source.calls, 1)
+
+        self.assertIn("证券买卖", self.tool.invoke("证券交易所"))
+        self.assertIn("证券买卖", self.tool.invoke("证券交易所"))
+        self.assertEqual(self.source.calls, 2)
+
+        self.assertIn("未找到", self.tool.invoke("不存在的条目"))
+
+    def test_thin_profile_falls_through(self):
+        """测试只有代码和名称的本地资料不算命中，继续查询股票详细信息并合并"""
+        profile = profile_from_report({'stock_code': "000858", 'company_name': "五粮液", 'year': 2023}, [])
+        self.assertEqual(set(profile), {'code', 'name', 'report_year'})
+        self.profile_store.upsert_company(profile, 'report')
+
+        result = self.tool.invoke("000858")
+        self.assertIn("所属行业：酿酒行业", result)
+        self.assertEqual(self.source.calls, 1)
+        self.assertEqual(self.profile_store.lookup("五粮液")['report_year'], "2023")
+        self.assertIn("本地资料", self.tool.invoke("五粮液"))
+        self.assertEqual(self.source.calls, 1)
+
+        # 外部来源也没有资料时返回本地已有的代码与名称
+        self.profile_store.upsert_company({'code': "000002", 'name': "万科A"}, 'report')
+        self.assertIn("万科A（000002）", self.tool.invoke("万科A"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按公司分片的年报向量存储测试
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from LLM.report_store import ReportStore, parse_report_filename
+
+
+def make_metadata(stock_code, name, year, section_path):
+    return {
+        'stock_code': stock_code,
+        'company_name': name,
+        'year': year,
+        'report_type': "annual",
+        'section_path': section_path,
+    }
+
+
+class TestReportStore(unittest.TestCase):
+    """测试ReportStore类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = ReportStore(self.temp_dir, DeterministicFakeEmbedding(size=16))
+        self.store.add_chunks(
+            texts=["平安银行零售业务增长", "平安银行信用风险", "平安银行2022年营收"],
+            metadatas=[
+                make_metadata("000001", "平安银行", 2023, "第三节 管理层讨论与分析 > 经营情况"),
+                make_metadata("000001", "平安银行", 2023, "第三节 管理层讨论与分析 > 可能面对的风险"),
+                make_metadata("000001", "平安银行", 2022, "第三节 管理层讨论与分析 > 经营情况"),
+            ]
+        )
+        self.store.add_chunks(
+            texts=["茅台酒销量"],
+            metadatas=[make_metadata("600519", "贵州茅台", 2023, "第三节 管理层讨论与分析")]
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_partitioned_by_company(self):
+        """测试每家公司写入独立的collection，并记录索引"""
+        self.assertEqual(set(self.store.index), {"000001", "600519"})
+        self.assertEqual(self.store.index["000001"]['years'], [2022, 2023])
+        results = self.store.search("销量", k=10, stock_code="600519")
+        self.assertEqual([doc.page_content for doc, _ in results], ["茅台酒销量"])
+
+    def test_year_and_section_filters(self):
+        """测试年份与章节过滤"""
+        results = self.store.search("营收", k=10, stock_code="000001", year=2022)
+        self.assertEqual([doc.metadata['year'] for doc, _ in results], [2022])
+
+        results = self.store.search("风险", k=10, stock_code="000001", section="风险")
+        self.assertEqual([doc.page_content for doc, _ in results], ["平安银行信用风险"])
+
+    def test_search_without_company_filter(self):
+        """测试无公司过滤时按年份只搜索相关分片"""
+        results = self.store.search("业务", k=10, year=2022)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(len(self.store.search("业务", k=10)), 4)
+        self.assertEqual(self.store.search("业务", stock_code="000002"), [])
+
+    def test_index_reloaded(self):
+        """测试重新打开后索引仍然可用"""
+        reopened = ReportStore(self.temp_dir, DeterministicFakeEmbedding(size=16))
+        self.assertEqual(len(reopened.search("业务", k=10, stock_code="000001")), 3)
+
+    def test_shared_directory(self):
+        """测试共用目录的多个实例并发入库时不覆盖彼此的索引条目，并使对方的检索缓存失效"""
+        other = ReportStore(self.temp_dir, DeterministicFakeEmbedding(size=16))
+        self.assertEqual(self.store.search("业务", k=10, stock_code="300750"), [])
+
+        def ingest(store, codes):
+            for code in codes:
+                store.add_chunks(texts=[f"公司{code}主营业务"],
+                                 metadatas=[make_metadata(code, f"公司{code}", 2023, "经营情况")])
+
+        threads = [threading.Thread(target=ingest, args=(store, codes)) for store, codes in (
+            (self.store, ["002594", "000002", "000004"]), (other, ["300750", "000005", "000006"]),
+            (self.store, ["000007", "000008"])
+        )]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = {"000001", "600519", "002594", "000002", "000004", "300750", "000005", "000006", "000007", "000008"}
+        with open(os.path.join(self.temp_dir, 'index.json'), encoding='utf-8') as f:
+            self.assertEqual(set(json.load(f)), expected)
+        self.assertEqual(set(self.store.index), expected)
+        self.assertEqual(set(other.index), expected)
+        # 另一个实例入库后，本实例此前缓存的空结果失效
+        self.assertEqual(len(self.store.search("业务", k=10, stock_code="002594")), 1)
+        self.assertEqual(len(self.store.search("业务", k=10, stock_code="300750")), 1)
+
+    def test_parse_query_filters(self):
+        """测试从查询中解析过滤条件"""
+        text, filters = self.store.parse_query_filters("code=000001 year=2023 section=风险 主要风险")
+        self.assertEqual(text, "主要风险")
+        self.assertEqual(filters, {'stock_code': "000001", 'year': 2023, 'section': "风险"})
+
+        _, filters = self.store.parse_query_filters("贵州茅台2023年的营收情况")
+        self.assertEqual(filters, {'stock_code': "600519", 'year': 2023})
+
+        _, filters = self.store.parse_query_filters("公司的主营业务是什么")
+        self.assertEqual(filters, {})
+
+        # 金额等普通6位数字不是股票代码，仍可按简称识别公司
+        _, filters = self.store.parse_query_filters("营收300000元的公司值得投资吗")
+        self.assertEqual(filters, {})
+        _, filters = self.store.parse_query_filters("贵州茅台营收123456万元")
+        self.assertEqual(filters, {'stock_code': "600519"})
+        _, filters = self.store.parse_query_filters("601318的主要风险")
+        self.assertEqual(filters, {'stock_code': "601318"})
+
+    def test_parse_report_filename(self):
+        """测试从文件名解析报告信息"""
+        info = parse_report_filename("/data/1_平安银行_2023.pdf")
+        self.assertEqual(info, {'stock_code': "000001", 'company_name': "平安银行", 'year': 2023,
+                                'report_type': "annual"})
+
+
+if __name__ == '__main__':
+    unittest.main()
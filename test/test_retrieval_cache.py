@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检索结果缓存测试
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from LLM.retrieval_cache import RetrievalCache
+from LLM.report_store import ReportStore
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """统计查询向量计算次数的模拟向量模型"""
+
+    query_calls: int = 0
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        return super().embed_query(text)
+
+
+class TestRetrievalCache(unittest.TestCase):
+    """测试RetrievalCache类"""
+
+    def test_lru_and_generation(self):
+        """测试结果按LRU淘汰、代数变化时失效"""
+        cache = RetrievalCache(max_entries=2)
+        calls = []
+
+        def compute(name):
+            return lambda: calls.append(name) or [name]
+
+        key_a = RetrievalCache.make_key('vector', "营业收入", {'year': 2023}, 3)
+        key_b = RetrievalCache.make_key('vector', "净利润", {}, 3)
+        key_c = RetrievalCache.make_key('vector', "商誉", {}, 3)
+
+        self.assertEqual(cache.get_or_compute(key_a, 0, compute("a")), ["a"])
+        self.assertEqual(cache.get_or_compute(key_a, 0, compute("a")), ["a"])
+        cache.get_or_compute(key_b, 0, compute("b"))
+        cache.get_or_compute(key_c, 0, compute("c"))
+        cache.get_or_compute(key_a, 0, compute("a"))
+        self.assertEqual(calls, ["a", "b", "c", "a"])
+
+        cache.get_or_compute(key_a, 1, compute("a"))
+        self.assertEqual(calls, ["a", "b", "c", "a", "a"])
+
+    def test_key_normalization(self):
+        """测试近似相同的查询与空过滤条件共享缓存键"""
+        self.assertEqual(
+            RetrievalCache.make_key('hybrid', "营业收入 情况？", {'year': 2023, 'section': None}, 3),
+            RetrievalCache.make_key('hybrid', "营业收入情况", {'year': 2023}, 3)
+        )
+        self.assertNotEqual(
+            RetrievalCache.make_key('hybrid', "营业收入", {'year': 2023}, 3),
+            RetrievalCache.make_key('hybrid', "营业收入", {'year': 2022}, 3)
+        )
+
+
+class TestReportStoreCache(unittest.TestCase):
+    """测试ReportStore的检索缓存"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.embeddings = CountingEmbeddings(size=16)
+        self.store = ReportStore(os.path.join(self.temp_dir, 'vector_store'), self.embeddings)
+        self.metadata = {'stock_code': "000001", 'company_name': "平安银行", 'year': 2023,
+                         'report_type': "annual", 'section_path': "管理层讨论与分析"}
+        self.store.add_chunks(["营业收入同比增长"], [self.metadata])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_repeated_query_hits_cache(self):
+        """测试重复检索不再计算向量"""
+        first = self.store.hybrid_search("营业收入", k=3, stock_code="000001")
+        second = self.store.hybrid_search("营业收入？", k=3, stock_code="000001")
+        self.assertEqual([doc.id for doc, _ in first], [doc.id for doc, _ in second])
+        self.assertEqual(self.embeddings.query_calls, 1)
+        self.assertEqual(self.store.cache.stats()['hits'], 1)
+
+    def test_ingestion_invalidates_results(self):
+        """测试入库后重新检索能看到新文本块，且查询向量仍复用"""
+        self.assertEqual(len(self.store.hybrid_search("营业收入", k=3, stock_code="000001")), 1)
+        self.store.add_chunks(["营业收入构成"], [self.metadata])
+        self.assertEqual(len(self.store.hybrid_search("营业收入", k=3, stock_code="000001")), 2)
+        self.assertEqual(self.embeddings.query_calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按章节切分测试
+"""
+
+import os
+import sys
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.section_chunker import SectionChunker, split_sentences, chunk_stats
+
+
+def make_section(path, content, page=1):
+    return {'content': content, 'metadata': {'section_id': "1", 'section_title': path[-1],
+                                             'section_path': path, 'page': page}}
+
+
+class TestSectionChunker(unittest.TestCase):
+    """测试SectionChunker类"""
+
+    def setUp(self):
+        self.chunker = SectionChunker(chunk_size=50, max_overlap=10)
+
+    def test_split_sentences(self):
+        """测试按句末标点切分并保留标点"""
+        self.assertEqual(split_sentences("营收增长。利润下降！\n风险？"), ["营收增长。", "利润下降！", "\n", "风险？"])
+        self.assertEqual(split_sentences(""), [])
+
+    def test_small_sections_not_merged_or_split(self):
+        """测试小章节各自成块，不跨越章节边界"""
+        chunks = self.chunker.chunk_sections([
+            make_section(["管理层讨论与分析", "主营业务"], "公司主营白酒。"),
+            make_section(["管理层讨论与分析", "风险"], "原材料价格波动。"),
+        ])
+        self.assertEqual([c['text'] for c in chunks], ["公司主营白酒。", "原材料价格波动。"])
+        self.assertEqual(chunks[1]['metadata']['section_path'], ["管理层讨论与分析", "风险"])
+        self.assertEqual(chunks[1]['metadata']['chunk_count'], 1)
+
+    def test_oversized_section_sentence_cuts(self):
+        """测试超长章节按句子边界切分，且只重叠短句"""
+        content = "".join(f"第{i}句内容描述公司经营情况。" for i in range(10)) + "短句。" + "后续内容说明未来的发展计划。" * 3
+        chunks = self.chunker.chunk_sections([make_section(["未来发展"], content)])
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk['text']), 50)
+            self.assertTrue(chunk['text'].endswith("。"))
+        overlapped = [c for c in chunks if c['metadata']['overlap_bytes']]
+        for chunk in overlapped:
+            self.assertLessEqual(chunk['metadata']['overlap_bytes'], len("短句。".encode('utf-8')) * 4)
+        stats = chunk_stats(chunks)
+        self.assertEqual(stats['chunks'], len(chunks))
+        self.assertEqual(stats['overlap_bytes'], sum(c['metadata']['overlap_bytes'] for c in chunks))
+
+    def test_no_overlap(self):
+        """测试 max_overlap=0 时切分结果拼接等于原文"""
+        chunker = SectionChunker(chunk_size=20, max_overlap=0)
+        content = "营收增长。利润下降。现金流改善。负债率下降。" * 3
+        chunks = chunker.chunk_sections([make_section(["财务"], content)])
+        self.assertEqual("".join(c['text'] for c in chunks), content)
+        self.assertEqual(chunk_stats(chunks)['overlap_bytes'], 0)
+
+    def test_long_sentence_hard_split(self):
+        """测试超长单句按长度硬切分"""
+        chunks = self.chunker.chunk_sections([make_section(["表格"], "数" * 120)])
+        self.assertEqual([len(c['text']) for c in chunks], [50, 50, 20])
+
+    def test_pack_sections(self):
+        """测试装箱时整章节不被拆开，并带章节标题"""
+        sections = [make_section(["A"], "甲" * 20), make_section(["B"], "乙" * 20), make_section(["C"], "丙" * 20)]
+        packed = self.chunker.pack_sections(sections)
+        self.assertEqual(len(packed), 2)
+        self.assertTrue(packed[0].startswith("【A】"))
+        self.assertIn("【B】", packed[0])
+        self.assertTrue(packed[1].startswith("【C】"))
+
+    def test_pack_sections_budget(self):
+        """测试前缀、章节标题与分隔符都计入预算，装箱结果不超过 chunk_size"""
+        sections = [make_section(["管理层讨论与分析", "主营业务"], "营收增长。利润下降。现金流改善。" * 6),
+                    make_section(["风险"], "原材料价格波动。"), make_section(["展望"], "数" * 120)]
+        for prefix in ("", "以下是新增或变化的段落：\n"):
+            packed = self.chunker.pack_sections(sections, prefix=prefix)
+            self.assertGreater(len(packed), 3)
+            for text in packed:
+                self.assertLessEqual(len(text), 50)
+                self.assertTrue(text.startswith(prefix + "【"))
+            body = "".join(text[len(prefix):] for text in packed)
+            self.assertEqual(body.count("数"), 120)
+
+
+if __name__ == '__main__':
+    unittest.main()
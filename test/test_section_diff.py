@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨年章节差异测试
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.section_diff import diff_sections, normalize_title, split_paragraphs, paragraph_hash
+from LLM.section_chunker import SectionChunker
+from LLM.section_router import SectionRouter, find_section_json, load_section_records
+from LLM.token_utils import estimate_tokens
+from LLM.year_records import format_year_record
+from LLM.LLM_reports import ReportAnalyzer
+
+BUSINESS = "公司主营业务为商业银行业务，\n坚持稳健经营的发展理念。"
+RISK = "公司面临信用风险、市场风险和操作风险，\n已建立全面风险管理体系。"
+
+
+def section(path, *paragraphs):
+    return {'content': "\n".join(paragraphs), 'metadata': {'section_path': path}}
+
+
+class TestSectionDiff(unittest.TestCase):
+    """测试diff_sections及辅助函数"""
+
+    def test_split_paragraphs(self):
+        """测试按版面换行的行拼回段落，超长段落按句子切分"""
+        self.assertEqual(split_paragraphs("公司主营业务为\n商业银行业务。\n\n营业收入\n100亿元"),
+                         ["公司主营业务为商业银行业务。", "营业收入100亿元"])
+        self.assertEqual(split_paragraphs("第一句。第二句。", max_chars=5), ["第一句。", "第二句。"])
+
+    def test_normalize_title_and_year(self):
+        """测试章节编号与报告年份不影响对齐和哈希"""
+        self.assertEqual(normalize_title("第三节 管理层讨论与分析"), normalize_title("第四节管理层讨论与分析"))
+        self.assertEqual(normalize_title("（一）主营业务"), "主营业务")
+        self.assertEqual(paragraph_hash("2023年营业收入较2022年增长。", 2023),
+                         paragraph_hash("2022年营业收入较2021年增长。", 2022))
+        self.assertNotEqual(paragraph_hash("营业收入100亿元。"), paragraph_hash("营业收入120亿元。"))
+
+    def test_new_changed_unchanged(self):
+        """测试只输出新增或变化的段落，未变化的章节整体省略"""
+        previous = [
+            section(["第三节 管理层讨论与分析", "一、主营业务"], BUSINESS, "2022年实现营业收入100亿元，同比增长5%。"),
+            section(["第三节 管理层讨论与分析", "二、可能面对的风险"], RISK),
+        ]
+        current = [
+            section(["第四节 管理层讨论与分析", "一、主营业务"], BUSINESS, "2023年实现营业收入120亿元，同比增长20%。",
+                    "报告期内新设三家分行。"),
+            section(["第四节 管理层讨论与分析", "二、可能面对的风险"], RISK),
+        ]
+        result = diff_sections(current, previous, 2023, 2022)
+
+        self.assertEqual(len(result['sections']), 1)
+        delta = result['sections'][0]
+        self.assertEqual(delta['metadata']['section_path'], ["第四节 管理层讨论与分析", "一、主营业务"])
+        self.assertEqual(delta['content'], "（变化）2023年实现营业收入120亿元，同比增长20%。\n（新增）报告期内新设三家分行。")
+        self.assertEqual(delta['metadata']['diff'], {'new': 1, 'changed': 1, 'unchanged': 1})
+        stats = result['stats']
+        self.assertEqual((stats['sections'], stats['changed_sections'], stats['unchanged'], stats['removed']),
+                         (2, 1, 2, 0))
+        self.assertLess(stats['delta_tokens'], stats['total_tokens'])
+
+    def test_moved_and_removed(self):
+        """测试在章节间移动的段落视为未变，上年独有的段落计为删除"""
+        previous = [section(["主营业务"], BUSINESS, "公司积极拓展零售业务。"), section(["风险"], RISK)]
+        current = [section(["主营业务"], BUSINESS), section(["风险"], RISK, "公司积极拓展零售业务。")]
+        result = diff_sections(current, previous)
+        self.assertEqual(result['sections'], [])
+        self.assertEqual(result['stats']['unchanged'], 3)
+
+        result = diff_sections([section(["主营业务"], BUSINESS)], previous)
+        self.assertEqual(result['stats']['removed'], 2)
+
+
+class TestDiffAnalysis(unittest.TestCase):
+    """测试ReportAnalyzer按差异分析单年报"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.json_dir = os.path.join(self.temp_dir, 'json_reports')
+        os.makedirs(self.json_dir)
+        self.chunks = []
+
+        # 不初始化模型，只设置 analyze_single_report 用到的属性
+        analyzer = ReportAnalyzer.__new__(ReportAnalyzer)
+        analyzer.json_dir = self.json_dir
+        analyzer.section_router = SectionRouter()
+        analyzer.token_counter = estimate_tokens
+        analyzer.analysis_chunker = SectionChunker(chunk_size=4000, max_overlap=60)
+        analyzer.diff_savings = {}
+        analyzer._run_config = lambda component, callbacks=None: {}
+
+        class FakeExecutor:
+            def invoke(executor, inputs, config=None):
+                self.chunks.append(inputs['text_chunk'])
+                return {'output': "分析"}
+
+        analyzer.single_report_executor = FakeExecutor()
+        self.analyzer = analyzer
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def write_report(self, year, sections):
+        stem = f"000001_平安银行_{year}"
+        txt_path = os.path.join(self.temp_dir, f"{stem}.txt")
+        with open(txt_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(item['content'] for item in sections))
+        with open(os.path.join(self.json_dir, f"{stem}_chapters.json"), 'w', encoding='utf-8') as f:
+            json.dump({'outline': sections}, f, ensure_ascii=False)
+        return txt_path
+
+    def test_analyze_changes_only(self):
+        """测试只把变化的段落送入单年报分析，并汇总节省的 token"""
+        boilerplate = [f"公司持续完善第{i}项内部管理制度，提升经营管理水平。" for i in range(30)]
+        previous = self.write_report(2022, [
+            section(["管理层讨论与分析", "主营业务"], BUSINESS, *boilerplate, "2022年营业收入100亿元。"),
+            section(["管理层讨论与分析", "可能面对的风险"], RISK),
+        ])
+        current = self.write_report(2023, [
+            section(["管理层讨论与分析", "主营业务"], BUSINESS, *boilerplate, "2023年营业收入150亿元，大幅增长。"),
+            section(["管理层讨论与分析", "可能面对的风险"], RISK),
+        ])
+
+        analysis = self.analyzer.analyze_single_report(current, previous_file_path=previous)
+        self.assertEqual(len(self.chunks), 1)
+        self.assertIn("相对2022年年报新增或变化的段落", self.chunks[0])
+        self.assertIn("（变化）2023年营业收入150亿元，大幅增长。", self.chunks[0])
+        self.assertNotIn("内部管理制度", self.chunks[0])
+        self.assertEqual(analysis['diff']['baseline_year'], 2022)
+        self.assertEqual((analysis['diff']['changed'], analysis['diff']['new']), (1, 0))
+        self.assertLess(analysis['diff']['sent_tokens'], analysis['diff']['full_tokens'] / 4)
+
+        savings = self.analyzer._log_diff_savings("000001", [{'year': "2022"}, analysis])
+        self.assertEqual((savings['reports'], savings['diffed_reports']), (2, 1))
+        self.assertGreater(self.analyzer.diff_savings["000001"]['saved_ratio'], 0.75)
+
+        # 相关章节没有变化时不调用LLM
+        self.chunks.clear()
+        analysis = self.analyzer.analyze_single_report(previous, previous_file_path=previous)
+        self.assertEqual(self.chunks, [])
+        self.assertIn("没有新增或变化", analysis['analysis'])
+
+    def test_savings_use_token_counter(self):
+        """测试节省统计的全文与差异 token 都按分析器的计数器计算"""
+        self.analyzer.token_counter = len
+        self.analyzer.section_router = SectionRouter(token_counter=len)
+        self.analyzer.analysis_chunker = SectionChunker(chunk_size=4000, max_overlap=60, length_function=len)
+        previous = self.write_report(2022, [section(["管理层讨论与分析", "主营业务"], BUSINESS, "2022年营业收入100亿元。")])
+        current = self.write_report(2023, [section(["管理层讨论与分析", "主营业务"], BUSINESS, "2023年营业收入150亿元。")])
+
+        diff = self.analyzer.analyze_single_report(current, previous_file_path=previous)['diff']
+        self.assertEqual(diff['sent_tokens'], sum(len(chunk) for chunk in self.chunks))
+        self.assertEqual(diff['full_tokens'], len(self.analyzer.section_router.route(
+            load_section_records(find_section_json(current, self.json_dir)))['text']))
+        self.assertEqual(diff['full_calls'], 1)
+
+    def test_routing_savings_without_full_split(self):
+        """测试章节路由节省的日志沿用路由器的 token 数，不再对全文切分"""
+        class NoSplit:
+            def split_text(splitter, text):
+                raise AssertionError("不应切分全文")
+
+        self.analyzer.token_counter = len
+        self.analyzer.section_router = SectionRouter(token_counter=len)
+        self.analyzer.analysis_chunker = SectionChunker(chunk_size=100, max_overlap=10, length_function=len)
+        self.analyzer.text_splitter = NoSplit()
+        current = self.write_report(2023, [section(["管理层讨论与分析", "主营业务"], BUSINESS),
+                                           section(["第十节 财务报告"], *(f"应收账款明细第{i}项。" for i in range(100)))])
+
+        with self.assertLogs(level='INFO') as logs:
+            self.analyzer.analyze_single_report(current)
+        message = next(line for line in logs.output if "章节路由节省" in line)
+        route = self.analyzer.section_router.route(load_section_records(find_section_json(current, self.json_dir)))
+        self.assertIn(f"token {route['total_tokens']} -> {route['selected_tokens']}", message)
+        self.assertIn(f"LLM调用 {-(-route['total_tokens'] // 100)} -> {len(self.chunks)} 次", message)
+
+    def test_prompts_within_budget(self):
+        """测试装箱后的完整提示词（模板 + 差异说明 + 章节标题 + 内容）不超过预算"""
+        def render(text_chunk):
+            return "请从主营业务、发展计划与主要风险三方面分析以下年报内容：\n" * 10 + text_chunk
+
+        self.analyzer.token_counter = estimate_tokens
+        self.analyzer.chunk_token_budget = estimate_tokens(render("")) + 600
+        self.analyzer._init_analysis_splitters(render)
+        paths = [["管理层讨论与分析", "主营业务"], ["管理层讨论与分析", "核心竞争力分析"], ["管理层讨论与分析", "可能面对的风险"]]
+        previous = self.write_report(2022, [section(path, *(f"2022年{path[-1]}第{i}项指标为{i * 3}亿元。"
+                                                            for i in range(40))) for path in paths])
+        current = self.write_report(2023, [section(path, *(f"2023年{path[-1]}第{i}项新增举措已完成{i * 7}项。"
+                                                           for i in range(40))) for path in paths])
+
+        for previous_path in (previous, None):
+            self.chunks.clear()
+            self.analyzer.analyze_single_report(current, previous_file_path=previous_path)
+            self.assertGreater(len(self.chunks), 1)
+            for chunk in self.chunks:
+                self.assertLessEqual(estimate_tokens(render(chunk)), self.analyzer.chunk_token_budget)
+
+    def test_comparison_input_marks_diff_years(self):
+        """测试按差异分析的年份在多年对比输入中标注基准年份"""
+        def unavailable(component):
+            raise RuntimeError("模型不可用")
+
+        # 抽取失败回退为分析原文摘录时同样保留基准年份
+        self.analyzer._llm_for = unavailable
+        record = self.analyzer.extract_year_record({'year': "2023", 'analysis': "新设三家分行。",
+                                                    'diff': {'baseline_year': 2022}})
+        self.assertEqual(record['baseline_year'], 2022)
+        self.assertTrue(format_year_record(record).startswith("【2023年】（相对2022年的新增与变化）"))
+        self.assertEqual(format_year_record({'year': 2022, 'business': ["稳健经营"]}).split("\n")[0], "【2022年】")
+
+
+if __name__ == '__main__':
+    unittest.main()
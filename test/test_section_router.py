@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+章节路由测试
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.section_router import SectionRouter, load_section_records, find_section_json
+from LLM.token_utils import estimate_tokens
+
+
+def make_section(path, content):
+    """构造与 pdf_parser 输出一致的章节记录"""
+    return {
+        'content': content,
+        'metadata': {
+            'section_id': "",
+            'section_title': path[-1],
+            'section_path': path,
+            'page': 1
+        }
+    }
+
+
+class TestSectionRouter(unittest.TestCase):
+    """测试SectionRouter类"""
+
+    def setUp(self):
+        """构造模拟年报章节"""
+        self.sections = [
+            make_section(["第一节 重要提示、目录和释义"], "董事会保证年报内容真实。" * 20),
+            make_section(["第三节 管理层讨论与分析", "一、报告期内公司所处行业情况"], "行业持续增长。" * 50),
+            make_section(["第三节 管理层讨论与分析", "十一、公司未来发展的展望"], "明年计划扩产。" * 50),
+            make_section(["第三节 管理层讨论与分析", "可能面对的风险"], "原材料价格波动风险。" * 50),
+            make_section(["第十节 财务报告", "七、合并财务报表项目注释"], "应收账款明细。" * 500),
+        ]
+
+    def test_score_section(self):
+        """测试章节相关度打分"""
+        router = SectionRouter()
+        self.assertGreater(router.score_section(["第三节 管理层讨论与分析"]), 0)
+        self.assertEqual(router.score_section(["第十节 财务报告", "风险"]), 0)
+        self.assertEqual(router.score_section(["第六节 重要事项"]), 0)
+
+    def test_route_selects_relevant_sections(self):
+        """测试只选择相关章节并保持原文顺序"""
+        route = SectionRouter(token_budget=100000).route(self.sections)
+        self.assertEqual(len(route['selected_paths']), 3)
+        self.assertEqual(route['selected_paths'][0][1], "一、报告期内公司所处行业情况")
+        self.assertNotIn("应收账款明细", route['text'])
+        self.assertLess(route['selected_tokens'], route['total_tokens'])
+
+    def test_route_respects_token_budget(self):
+        """测试选中内容不超过token预算"""
+        budget = 200
+        route = SectionRouter(token_budget=budget).route(self.sections)
+        self.assertTrue(route['selected_paths'])
+        # 章节标题前缀会带来少量额外token
+        self.assertLessEqual(route['selected_tokens'], budget + 50)
+
+    def test_route_prefers_higher_scores(self):
+        """测试预算不足时优先保留高权重章节"""
+        single = estimate_tokens("原材料价格波动风险。" * 50)
+        route = SectionRouter(token_budget=single).route(self.sections)
+        self.assertEqual(route['selected_paths'], [["第三节 管理层讨论与分析", "可能面对的风险"]])
+
+    def test_route_uses_token_counter(self):
+        """测试预算按传入的token计数器计算，截断时退回到完整句子"""
+        router = SectionRouter(token_budget=100, token_counter=len)
+        route = router.route(self.sections)
+        self.assertEqual(route['total_tokens'], sum(len(section['content']) for section in self.sections))
+        self.assertEqual(sum(len(section['content']) for section in route['sections']), 100)
+        self.assertTrue(all(section['content'].endswith("。") for section in route['sections']))
+
+
+class TestSectionJson(unittest.TestCase):
+    """测试章节JSON读取"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_find_and_load(self):
+        """测试根据txt文件名找到对应的章节JSON"""
+        json_path = os.path.join(self.temp_dir, "000001_平安银行_2023_chapters.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({'pdf_metadata': {}, 'outline': [make_section(["风险因素"], "内容")]}, f, ensure_ascii=False)
+
+        found = find_section_json("/data/txt/000001_平安银行_2023.txt", self.temp_dir)
+        self.assertEqual(found, json_path)
+        self.assertEqual(len(load_section_records(found)), 1)
+        self.assertIsNone(find_section_json("/data/txt/600519_贵州茅台_2023.txt", self.temp_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
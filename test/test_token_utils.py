@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+token 计数工具测试
+"""
+
+import os
+import re
+import sys
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.token_utils import (TokenEstimator, build_token_counter, estimate_tokens,
+                             CALIBRATION_SAMPLES, CJK_TOKENS_PER_CHAR, OTHER_TOKENS_PER_CHAR)
+from LLM.section_chunker import SectionChunker
+
+
+class TestTokenEstimator(unittest.TestCase):
+    """测试TokenEstimator类"""
+
+    def test_default_matches_estimate_tokens(self):
+        """测试默认系数与 estimate_tokens 一致"""
+        estimator = TokenEstimator()
+        for text in CALIBRATION_SAMPLES + ["", "ROE"]:
+            self.assertEqual(estimator(text), estimate_tokens(text))
+
+    def test_calibrate_recovers_coefficients(self):
+        """测试最小二乘校准能还原分词器的字符系数"""
+        def fake_tokenizer(text):
+            cjk = len(re.findall(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]', text))
+            return round(cjk * 1.1 + (len(text) - cjk) * 0.25)
+
+        estimator = TokenEstimator.calibrate(CALIBRATION_SAMPLES, fake_tokenizer)
+        self.assertAlmostEqual(estimator.cjk_per_char, 1.1, delta=0.05)
+        self.assertAlmostEqual(estimator.other_per_char, 0.25, delta=0.05)
+
+    def test_calibrate_degenerate_samples(self):
+        """测试样本无法拟合时回退为默认系数"""
+        estimator = TokenEstimator.calibrate([], len)
+        self.assertEqual((estimator.cjk_per_char, estimator.other_per_char),
+                         (CJK_TOKENS_PER_CHAR, OTHER_TOKENS_PER_CHAR))
+
+
+class TestBuildTokenCounter(unittest.TestCase):
+    """测试build_token_counter函数"""
+
+    def test_unknown_spec_falls_back_to_estimator(self):
+        """测试未知或不可用的分词器回退为估算器"""
+        self.assertIsInstance(build_token_counter("estimate"), TokenEstimator)
+        self.assertIsInstance(build_token_counter("unknown"), TokenEstimator)
+        self.assertIsInstance(build_token_counter("calibrated:unknown"), TokenEstimator)
+
+    def test_token_budgeted_chunks(self):
+        """测试按 token 计量时每个文本块不超过预算"""
+        counter = build_token_counter("estimate")
+        chunker = SectionChunker(chunk_size=100, max_overlap=10, length_function=counter)
+        content = "报告期内公司营业收入同比增长12.34%。" * 40
+        chunks = chunker.chunk_sections([{'content': content, 'metadata': {'section_path': ["经营情况"]}}])
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(counter(chunk['text']), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工具结果缓存测试
+"""
+
+import os
+import sys
+import time
+import threading
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.tools import Tool
+
+from LLM.tool_cache import ToolResultCache, parse_ttl_spec, is_error_result
+
+
+class TestToolResultCache(unittest.TestCase):
+    """测试ToolResultCache类"""
+
+    def setUp(self):
+        self.now = 0.0
+        self.calls = []
+        self.cache = ToolResultCache(ttls={'wiki_search': 100, 'report_retriever': 0},
+                                     clock=lambda: self.now)
+
+    def wiki(self, query):
+        self.calls.append(query)
+        return f"找到相关信息：{query}"
+
+    def test_ttl(self):
+        """测试有效期内命中、过期后重新执行"""
+        self.assertEqual(self.cache.call('wiki_search', "贵州茅台", self.wiki), "找到相关信息：贵州茅台")
+        self.assertEqual(self.cache.call('wiki_search', " 贵州茅台 ", self.wiki), "找到相关信息：贵州茅台")
+        self.assertEqual(len(self.calls), 1)
+
+        self.now = 101
+        self.cache.call('wiki_search', "贵州茅台", self.wiki)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_zero_ttl_and_errors_not_cached(self):
+        """测试有效期为0的工具与出错结果不缓存"""
+        self.cache.call('report_retriever', "营收", self.wiki)
+        self.cache.call('report_retriever', "营收", self.wiki)
+        self.assertEqual(len(self.calls), 2)
+
+        failing = lambda query: self.calls.append(query) or "维基百科搜索出错：超时"
+        self.cache.call('wiki_search', "白酒", failing)
+        self.cache.call('wiki_search', "白酒", failing)
+        self.assertEqual(len(self.calls), 4)
+
+        download_failed = lambda code: self.calls.append(code) or "错误：下载年报汇总CSV文件失败"
+        self.cache.call('download_stock_reports', "000001", download_failed)
+        self.cache.call('download_stock_reports', "000001", download_failed)
+        self.assertEqual(len(self.calls), 6)
+        self.assertTrue(is_error_result("错误：无效的操作。请使用 'analyze' 或 'screen'。"))
+        self.assertFalse(is_error_result("筛选结果：错误率较低的公司"))
+
+        def raising(query):
+            raise ConnectionError("网络错误")
+        with self.assertRaises(ConnectionError):
+            self.cache.call('wiki_search', "银行", raising)
+        self.assertEqual(self.cache.call('wiki_search', "银行", self.wiki), "找到相关信息：银行")
+
+    def test_single_flight(self):
+        """测试相同输入的并发调用只执行一次"""
+        started = threading.Event()
+
+        def slow(query):
+            self.calls.append(query)
+            started.set()
+            time.sleep(0.2)
+            return "下载完成"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.cache.call('wiki_search', "000001", slow)))
+                   for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, ["000001"])
+        self.assertEqual(results, ["下载完成"] * 5)
+        self.assertEqual(self.cache.stats()['shared'], 4)
+
+    def test_wrap_tool(self):
+        """测试包装后的工具保留名称与描述且结果被缓存"""
+        tool = self.cache.wrap(Tool(name="wiki_search", func=self.wiki, description="维基百科搜索"))
+        self.assertEqual((tool.name, tool.description), ("wiki_search", "维基百科搜索"))
+        tool.invoke("平安银行")
+        tool.invoke("平安银行")
+        self.assertEqual(self.calls, ["平安银行"])
+        self.cache.invalidate('wiki_search')
+        tool.invoke("平安银行")
+        self.assertEqual(len(self.calls), 2)
+
+    def test_parse_ttl_spec(self):
+        """测试有效期配置解析"""
+        self.assertEqual(parse_ttl_spec("wiki_search=60, stock_screening=0,bad"),
+                         {'wiki_search': 60.0, 'stock_screening': 0.0})
+        self.assertEqual(parse_ttl_spec(""), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用量统计回调测试
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_openai import ChatOpenAI
+from openai import DefaultHttpxClient
+from langchain.tools import Tool
+
+from LLM.usage_tracker import UsageTracker
+
+
+class TestUsageTracker(unittest.TestCase):
+    """测试UsageTracker类"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.tracker = UsageTracker()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_llm_calls_grouped_by_component(self):
+        """测试LLM调用按组件标签聚合"""
+        llm = FakeListChatModel(responses=["SINGLE_REPORT", "分析结果"])
+        with self.tracker.scope("chat:1"):
+            llm.invoke("分析平安银行", config={"callbacks": [self.tracker], "tags": ["intent_chain"]})
+            llm.invoke("年报内容", config={"callbacks": [self.tracker], "tags": ["single_report_executor"]})
+
+        summary = self.tracker.summarize("chat:1")
+        self.assertEqual(summary['components']['intent_chain']['calls'], 1)
+        self.assertEqual(summary['components']['single_report_executor']['calls'], 1)
+        self.assertEqual(self.tracker.current_scope, "default")
+
+    def test_scope_per_thread(self):
+        """测试不同线程的作用域互不影响"""
+        llm = FakeListChatModel(responses=["结果"] * 4)
+
+        def worker(code):
+            with self.tracker.scope(f"company:{code}"):
+                llm.invoke(code, config={"callbacks": [self.tracker], "tags": ["final_executor"]})
+
+        threads = [threading.Thread(target=worker, args=(code,)) for code in ("000001", "600519")]
+        with self.tracker.scope("chat:1"):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(self.tracker.current_scope, "chat:1")
+
+        self.assertEqual(sorted(r['scope'] for r in self.tracker.get_records()),
+                         ["company:000001", "company:600519"])
+
+    def test_streaming_records_ttft(self):
+        """测试流式输出时记录首token延迟"""
+        llm = FakeListChatModel(responses=["流式输出"])
+        for _ in llm.stream("你好", config={"callbacks": [self.tracker], "tags": ["final_executor"]}):
+            pass
+        record = self.tracker.get_records()[0]
+        self.assertIsNotNone(record['ttft'])
+        self.assertLessEqual(record['ttft'], record['wall_time'])
+
+    def test_tool_calls_and_errors(self):
+        """测试工具耗时与错误统计"""
+        def failing(query: str) -> str:
+            raise ValueError("网络错误")
+
+        ok_tool = Tool(name="wiki_search", func=lambda q: "结果", description="搜索")
+        bad_tool = Tool(name="download_stock_reports", func=failing, description="下载")
+
+        ok_tool.invoke("贵州茅台", config={"callbacks": [self.tracker]})
+        with self.assertRaises(ValueError):
+            bad_tool.invoke("600519", config={"callbacks": [self.tracker]})
+
+        tools = self.tracker.summarize()['tools']
+        self.assertEqual(tools['wiki_search']['calls'], 1)
+        self.assertEqual(tools['wiki_search']['errors'], 0)
+        self.assertEqual(tools['download_stock_reports']['errors'], 1)
+
+    def test_export_jsonl(self):
+        """测试导出JSONL并清除已导出的作用域记录"""
+        llm = FakeListChatModel(responses=["a", "b"])
+        with self.tracker.scope("company:000001"):
+            llm.invoke("x", config={"callbacks": [self.tracker]})
+        with self.tracker.scope("chat:1"):
+            llm.invoke("y", config={"callbacks": [self.tracker]})
+
+        output_path = os.path.join(self.temp_dir, "usage.jsonl")
+        self.tracker.export_jsonl(output_path, scope="company:000001")
+
+        with open(output_path, 'r', encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[-1]['type'], 'summary')
+        self.assertEqual(lines[-1]['components']['other']['calls'], 1)
+
+        # 只清除已导出的作用域
+        self.assertEqual([r['scope'] for r in self.tracker.get_records()], ["chat:1"])
+
+    def test_tier_summary_and_cost(self):
+        """测试按模型档位汇总调用与费用"""
+        tracker = UsageTracker(prices={'fast': (1.0, 2.0), 'heavy': (10.0, 20.0)})
+        llm = FakeListChatModel(responses=["结果"] * 3)
+        llm.invoke("a", config={"callbacks": [tracker], "tags": ["intent_chain", "tier:fast"]})
+        llm.invoke("b", config={"callbacks": [tracker], "tags": ["single_report_executor", "tier:fast"]})
+        llm.invoke("c", config={"callbacks": [tracker], "tags": ["final_executor", "tier:heavy"]})
+        for record in tracker.records:
+            record.update(prompt_tokens=1000, completion_tokens=500)
+
+        tiers = tracker.summarize()['tiers']
+        self.assertEqual(tiers['fast']['calls'], 2)
+        self.assertEqual(tiers['heavy']['calls'], 1)
+        self.assertAlmostEqual(tiers['fast']['cost'], 2 * (1000 * 1.0 + 500 * 2.0) / 1_000_000)
+        self.assertAlmostEqual(tiers['heavy']['cost'], (1000 * 10.0 + 500 * 20.0) / 1_000_000)
+        self.assertIn('avg_latency', tiers['fast'])
+
+    def test_sdk_retries_counted(self):
+        """测试通过请求钩子统计OpenAI SDK内部的重试"""
+        responses = [httpx.Response(429, headers={'retry-after-ms': "1"}, json={'error': {'message': "限流"}}),
+                     httpx.Response(200, json={
+                         'id': "1", 'object': "chat.completion", 'created': 0, 'model': "mock",
+                         'choices': [{'index': 0, 'finish_reason': "stop",
+                                      'message': {'role': "assistant", 'content': "结果"}}],
+                         'usage': {'prompt_tokens': 5, 'completion_tokens': 2, 'total_tokens': 7}})]
+        client = DefaultHttpxClient(transport=httpx.MockTransport(lambda request: responses.pop(0)),
+                                    event_hooks=self.tracker.http_event_hooks())
+        llm = ChatOpenAI(openai_api_key="mock", openai_api_base="http://mock/v1", model="mock",
+                         max_retries=2, http_client=client)
+
+        self.assertEqual(llm.invoke("你好", config={"callbacks": [self.tracker], "tags": ["final_executor"]}).content,
+                         "结果")
+        self.assertEqual(self.tracker.summarize()['components']['final_executor']['retries'], 1)
+
+        FakeListChatModel(responses=["缓存"]).invoke("x", config={"callbacks": [self.tracker]})
+        self.assertEqual(self.tracker.summarize()['components']['other']['retries'], 0)
+
+    def test_unscoped_records_capped(self):
+        """测试未设置作用域的记录只保留最近若干条"""
+        tracker = UsageTracker(max_unscoped_records=3)
+        llm = FakeListChatModel(responses=[str(i) for i in range(6)])
+        with tracker.scope("chat:1"):
+            llm.invoke("对话", config={"callbacks": [tracker]})
+        for _ in range(5):
+            llm.invoke("后台", config={"callbacks": [tracker], "tags": ["memory_summary"]})
+
+        self.assertEqual(len(tracker.get_records("default")), 3)
+        self.assertEqual(len(tracker.get_records("chat:1")), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单年报结构化记录与多年分层对比测试
+"""
+
+import os
+import sys
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LLM.year_records import (parse_year_record, fallback_year_record, format_year_record,
+                              merge_pairwise, MAX_ITEMS_PER_FIELD, MAX_ITEM_CHARS)
+from LLM.token_utils import estimate_tokens
+
+
+class TestYearRecord(unittest.TestCase):
+    """测试结构化记录的解析与渲染"""
+
+    def test_parse_fenced_json(self):
+        """测试解析代码块中的JSON并限制条目数与长度"""
+        output = '```json\n{"metrics": {"营业收入": "1797亿元，+8%"}, "business": ["零售转型"], ' \
+                 '"plans": ["计划' + "扩张" * 50 + '"], "risks": ' + str([f"风险{i}" for i in range(20)]).replace("'", '"') + '}\n```'
+        record = parse_year_record(output, 2023)
+        self.assertEqual(record['year'], "2023")
+        self.assertEqual(record['metrics'], ["营业收入: 1797亿元，+8%"])
+        self.assertEqual(len(record['plans'][0]), MAX_ITEM_CHARS)
+        self.assertEqual(len(record['risks']), MAX_ITEMS_PER_FIELD)
+
+        text = format_year_record(record)
+        self.assertTrue(text.startswith("【2023年】"))
+        self.assertIn("关键指标：营业收入: 1797亿元，+8%", text)
+
+    def test_parse_failures_and_fallback(self):
+        """测试无法解析时返回None，回退记录取分析原文前几句"""
+        self.assertIsNone(parse_year_record("分析完成", 2023))
+        self.assertIsNone(parse_year_record('{"metrics": {}}', 2023))
+        record = fallback_year_record("营收增长。利润下降\n" + "。".join(f"句子{i}" for i in range(30)), 2022)
+        self.assertEqual(record['business'][:2], ["营收增长", "利润下降"])
+        self.assertEqual(len(record['business']), MAX_ITEMS_PER_FIELD)
+        self.assertEqual(record['risks'], [])
+
+
+class TestMergePairwise(unittest.TestCase):
+    """测试相邻年份两两合并"""
+
+    def test_within_budget_unchanged(self):
+        """测试未超预算时不合并"""
+        texts = ["【2022年】a", "【2023年】b"]
+        self.assertEqual(merge_pairwise(texts, lambda a, b: a + b, 1000), texts)
+
+    def test_hierarchical_merge(self):
+        """测试十年记录逐层合并，合并次数线性、最终输入不超过预算"""
+        calls = []
+
+        def merge(earlier, later):
+            calls.append((earlier, later))
+            return f"【{earlier[1:5]}-{later[-9:-5]}】" + "小结" * 20
+
+        texts = [f"【{year}年】" + "记录" * 100 for year in range(2014, 2024)]
+        merged = merge_pairwise(texts, merge, 300)
+        self.assertLessEqual(sum(estimate_tokens(text) for text in merged), 300)
+        self.assertLess(len(calls), len(texts))
+        # 只合并相邻时期，保持年份顺序
+        self.assertTrue(calls[0][0].startswith("【2014年】") and calls[0][1].startswith("【2015年】"))
+        self.assertTrue(merged[0].startswith("【2014"))
+
+
+if __name__ == '__main__':
+    unittest.main()